@@ -0,0 +1,286 @@
+"""End to end benchmark of PLDude's own overhead, driven by stub vendor tools.
+
+Every scenario generates a project in a temporary directory, puts the stubs
+from benchmarks/stubs first on PATH and runs pldude on it a few times (cold,
+unchanged, one edit). For every step the wall time, PLDude's own CPU time
+(the tools' CPU is accounted separately and left out) and PLDude's peak RSS
+are reported. Results can be written to a JSON file and compared against a
+previous one to guard against regressions.
+
+    python benchmarks/e2e.py [-s|--scenario <name>] [-a|--all] [-o|--output <json>]
+                             [-b|--baseline <json>] [-t|--tolerance <percent>]
+"""
+
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+STUB = os.path.join(ROOT, 'benchmarks', 'stubs', 'tool.py')
+
+TOOLS = ('vivado.bat', 'hw_server.bat', 'xvhdl.bat', 'xvlog.bat', 'xelab.bat', 'xsim.bat',
+         'quartus_map', 'quartus_fit', 'quartus_asm', 'quartus_sta', 'quartus_stp', 'quartus_pgm', 'quartus_cpf')
+
+# runs pldude in this interpreter and reports its own resource usage on exit
+RUNNER = '''
+import sys, json, atexit, runpy, resource
+out = sys.argv.pop(1)
+def Report():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss survives exec on Linux, the high water mark of this process is in /proc
+    rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    try:
+        with open('/proc/self/status', 'r') as f:
+            rss = [int(i.split()[1]) * 1024 for i in f if i.startswith('VmHWM:')][0]
+    except (OSError, IndexError):
+        pass
+    with open(out, 'w') as f:
+        json.dump({'cpu': usage.ru_utime + usage.ru_stime, 'maxrss': rss}, f)
+atexit.register(Report)
+sys.argv[0] = 'pldude'
+runpy.run_module('pldude', run_name='__main__', alter_sys=True)
+'''
+
+class Project():
+    def __init__(self, directory : str):
+        self.dir = directory
+        self.env = {}
+
+    def Write(self, path : str, content : str):
+        path = os.path.join(self.dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def Config(self, settings : dict, pins : dict):
+        lines = []
+        for key, value in settings.items():
+            lines.append(key + ': ' + json.dumps(value))
+        self.Write('pldprj.yml', '\n'.join(lines) + '\n')
+        lines = []
+        for pinset, entries in pins.items():
+            lines.append(pinset + ':')
+            for port, pin in entries.items():
+                lines.append('  ' + port + ': ' + json.dumps(pin))
+        self.Write('pinprj.yml', '\n'.join(lines) + '\n')
+
+def Entity(name : str, child : str = None) -> str:
+    body = 'library ieee;\nuse ieee.std_logic_1164.all;\n\n'
+    body += 'entity ' + name + ' is\n    port (clk : in std_logic);\nend entity;\n\n'
+    body += 'architecture rtl of ' + name + ' is\nbegin\n'
+    if child:
+        body += '    u0 : entity work.' + child + ' port map (clk => clk);\n'
+    body += 'end architecture;\n'
+    return body
+
+def Sources(project : Project, count : int, depth : int = 64):
+    # a chain of `depth` modules below top, the rest is never instantiated
+    project.Write('src/top.vhd', Entity('top', 'm0'))
+    for i in range(count - 1):
+        child = 'm' + str(i + 1) if i + 1 < depth else None
+        project.Write('src/d%03d/m%d.vhd' % (i % 256, i), Entity('m' + str(i), child))
+
+def Testbenches(project : Project, count : int):
+    for i in range(count):
+        project.Write('src/tb/tb_%d.vhd' % i, Entity('tb_' + str(i), 'm0'))
+
+def Edit(project : Project, path : str):
+    with open(os.path.join(project.dir, path), 'a') as f:
+        f.write('-- edited ' + str(time.time()) + '\n')
+
+def Xilinx(files : int, pins : int = 1, **settings):
+    def Setup(project : Project):
+        Sources(project, files)
+        project.Config(dict({'device': 'XC7A35TCPG236-1', 'top': 'top'}, **settings), {'Xilinx7': dict([('p%d' % i, {'pkg': 'A%d' % i, 'iostd': 'LVCMOS33'}) for i in range(pins)])})
+    return Setup
+
+def Altera(files : int):
+    def Setup(project : Project):
+        Sources(project, files)
+        project.Config({'device': '10M08SAE144C8G', 'top': 'top'}, {'Altera': {'clk': 'PIN_27'}})
+        project.env['PLDUDE_STUB_PART'] = '10M08SA(.|ES)/10M08SC'
+    return Setup
+
+def Simulation(files : int, tests : int):
+    def Setup(project : Project):
+        Sources(project, files)
+        Testbenches(project, tests)
+        project.env['PLDUDE_STUB_LOG_MB'] = '0.01'
+        project.Config({'device': 'XC7A35TCPG236-1', 'top': 'top'}, {'Xilinx7': {'clk': 'W5'}})
+    return Setup
+
+def Targets(count : int):
+    def Setup(project : Project):
+        Xilinx(10)(project)
+        project.env['PLDUDE_STUB_TARGETS'] = str(count)
+        project.env['PLDUDE_STUB_LOG_MB'] = '0.01'
+        project.Config({'device': 'XC7A35TCPG236-1', 'top': 'top', 'program_jobs': 16, 'scan_ttl': 0}, {'Xilinx7': {'clk': 'W5'}})
+    return Setup
+
+def Logs(megabytes : int):
+    def Setup(project : Project):
+        Xilinx(10)(project)
+        project.env['PLDUDE_STUB_LOG_MB'] = str(megabytes)
+    return Setup
+
+COMPILE = [('cold', ['-c'], None), ('unchanged', ['-c'], None), ('edit', ['-c'], 'src/d000/m0.vhd')]
+
+# name -> (setup, steps of (step, pldude arguments, file edited before the step), large)
+SCENARIOS = {
+    'sources-10': (Xilinx(10), COMPILE, False),
+    'sources-1k': (Xilinx(1000), COMPILE, False),
+    'sources-10k': (Xilinx(10000), COMPILE, False),
+    'sources-50k': (Xilinx(50000), COMPILE, True),
+    'session-1k': (Xilinx(1000, session=True, checkpoints=True), COMPILE, False),
+    'pins-50k': (Xilinx(10, 50000), COMPILE, False),
+    'altera-1k': (Altera(1000), COMPILE, False),
+    'logs-64m': (Logs(64), COMPILE[:1], False),
+    'logs-2g': (Logs(2048), COMPILE[:1], True),
+    'targets-64': (Targets(64), [('program-all', ['-a'], None)], False),
+    'simulate-50': (Simulation(100, 50), [('cold', ['-S', '^tb_'], None), ('unchanged', ['-S', '^tb_'], None), ('edit', ['-S', '^tb_'], 'src/tb/tb_0.vhd')], False),
+    'simulate-500': (Simulation(1000, 500), [('cold', ['-S', '^tb_'], None), ('unchanged', ['-S', '^tb_'], None), ('edit', ['-S', '^tb_'], 'src/tb/tb_0.vhd')], True),
+}
+
+def Stubs(directory : str) -> str:
+    bin_dir = os.path.join(directory, 'bin')
+    os.makedirs(bin_dir)
+    for i in TOOLS:
+        path = os.path.join(bin_dir, i)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\nexec "' + sys.executable + '" "' + STUB + '" ' + i + ' "$@"\n')
+        os.chmod(path, 0o755)
+    return bin_dir
+
+def Run(project : Project, bin_dir : str, args : list) -> dict:
+    usage = os.path.join(project.dir, 'usage.json')
+    account = os.path.join(project.dir, 'account.txt')
+    if os.path.exists(account):
+        os.remove(account)
+    env = dict(os.environ, **project.env)
+    env['PATH'] = bin_dir + os.pathsep + env.get('PATH', '')
+    env['PYTHONPATH'] = ROOT
+    env['PLDUDE_STUB_ACCOUNT'] = account
+    env.pop('PLDUDE_CACHE', None)
+
+    # the console output of large logs would otherwise pile up in this process
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', RUNNER, usage] + args, cwd=project.dir, env=env, stdout=subprocess.DEVNULL, stderr=stderr)
+        wall = time.perf_counter() - start
+        stderr.seek(max(0, stderr.seek(0, os.SEEK_END) - 2000))
+        errors = stderr.read().decode(errors='replace')
+
+    try:
+        with open(usage, 'r') as f:
+            own = json.load(f)
+    except (OSError, ValueError):
+        own = {'cpu': 0.0, 'maxrss': 0}
+    tools = 0.0
+    if os.path.exists(account):
+        with open(account, 'r') as f:
+            tools = sum([float(i) for i in f.read().split()])
+    return {'wall': wall, 'cpu': own['cpu'], 'rss': own['maxrss'] / (1 << 20), 'tools': tools, 'exitcode': result.returncode, 'stderr': errors}
+
+def Scenario(name : str, keep : bool) -> list:
+    setup, steps, large = SCENARIOS[name]
+    directory = tempfile.mkdtemp(prefix='pldude-bench-')
+    try:
+        project = Project(os.path.join(directory, 'project'))
+        os.makedirs(project.dir)
+        start = time.perf_counter()
+        setup(project)
+        print('%-14s generated in %.1fs' % (name, time.perf_counter() - start))
+        bin_dir = Stubs(directory)
+
+        results = []
+        for step, args, edit in steps:
+            if edit:
+                Edit(project, edit)
+            result = Run(project, bin_dir, args)
+            result.update({'scenario': name, 'step': step})
+            results.append(result)
+            print('%-14s %-12s %9.1f ms wall %9.1f ms cpu %8.1f MB rss %9.1f ms tools%s' % (
+                name, step, result['wall'] * 1000, result['cpu'] * 1000, result['rss'], result['tools'] * 1000,
+                '' if result['exitcode'] == 0 else '  FAILED (%d)' % result['exitcode']))
+            if result['exitcode'] != 0:
+                print(result['stderr'])
+        return results
+    finally:
+        if keep:
+            print('Kept ' + directory)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def Compare(results : list, baseline : list, tolerance : float) -> list:
+    previous = dict([((i['scenario'], i['step']), i) for i in baseline])
+    regressions = []
+    for i in results:
+        old = previous.get((i['scenario'], i['step']), None)
+        if old is None:
+            continue
+        for metric in ('wall', 'cpu'):
+            # a few milliseconds of noise on tiny steps is not a regression
+            if i[metric] > old[metric] * (1 + tolerance / 100) and i[metric] - old[metric] > 0.02:
+                regressions.append('%s %s %s: %.1f ms -> %.1f ms' % (i['scenario'], i['step'], metric, old[metric] * 1000, i[metric] * 1000))
+    return regressions
+
+def main():
+    selected = []
+    large = False
+    output = None
+    baseline = None
+    tolerance = 25.0
+    keep = False
+    try:
+        arg, opt = getopt.getopt(sys.argv[1:], "s:ao:b:t:k", ['scenario=', 'all', 'output=', 'baseline=', 'tolerance=', 'keep'])
+    except getopt.GetoptError as err:
+        print(err)
+        sys.exit(2)
+    for o, a in arg:
+        if o in ('-s', '--scenario'):
+            selected.append(a)
+        elif o in ('-a', '--all'):
+            large = True
+        elif o in ('-o', '--output'):
+            output = a
+        elif o in ('-b', '--baseline'):
+            baseline = a
+        elif o in ('-t', '--tolerance'):
+            tolerance = float(a)
+        elif o in ('-k', '--keep'):
+            keep = True
+
+    if selected:
+        # an exact name, or every scenario of a family such as 'sources'
+        names = [i for i in SCENARIOS if [x for x in selected if i == x or not x in SCENARIOS and i.startswith(x)]]
+    else:
+        names = [i for i in SCENARIOS if large or not SCENARIOS[i][2]]
+    if not names:
+        print('Unknown scenario, available: ' + ', '.join(SCENARIOS))
+        sys.exit(2)
+
+    results = []
+    for i in names:
+        results.extend(Scenario(i, keep))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = [i for i in results if i['exitcode'] != 0]
+    regressions = []
+    if baseline:
+        with open(baseline, 'r') as f:
+            regressions = Compare(results, json.load(f), tolerance)
+        for i in regressions:
+            print('Regression: ' + i)
+    if failed or regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
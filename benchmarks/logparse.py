@@ -0,0 +1,99 @@
+"""Throughput benchmark for the streaming tool log parsers.
+
+Writes a synthetic Vivado and Quartus log of the requested size to a temporary
+file and parses it through the same path PrintLogs uses.
+
+    python benchmarks/logparse.py [-s|--size <MB>] [-m|--min <MB/s>]
+"""
+
+import os
+import sys
+import time
+import getopt
+import random
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pldude.utils.logparse import VivadoLog, QuartusLog
+
+IGNORE = ['Synth 8-%d' % i for i in range(3300, 3320)] + ['Place 30-.*', 'Route 35-4.*']
+
+VIVADO_LINES = [
+    b'INFO: [Synth 8-3331] design top has unconnected port led[%d]',
+    b'INFO: [Common 17-83] Releasing license: Synthesis',
+    b'WARNING: [Synth 8-3301] Unused top level parameter/generic WIDTH_%d',
+    b'WARNING: [Synth 8-327] inferring latch for variable \'state_reg\'',
+    b'CRITICAL WARNING: [Constraints 18-%d] Cannot set property',
+    b'Phase 1.%d Physical Synthesis Initialization | Checksum: 1d3a5e',
+    b'---------------------------------------------------------------------------------',
+    b'Time (s): cpu = 00:00:%d ; elapsed = 00:00:05 . Memory (MB): peak = 1042.121'
+]
+
+QUARTUS_LINES = [
+    b'Info (12021): Found 2 design units, including %d entities, in source file top.vhd',
+    b'Info: *******************************************************************',
+    b'Warning (10540): VHDL Signal Declaration warning at top.vhd(%d): used explicit default value',
+    b'Critical Warning (169085): No exact pin location assignment(s) for %d pins',
+    b'Info (332146): Worst-case setup slack is %d.000',
+    b'    Info (12023): Found entity 1: top'
+]
+
+def Generate(path : str, lines : list, size : int):
+    rng = random.Random(0)
+    written = 0
+    with open(path, 'wb') as f:
+        while written < size:
+            chunk = []
+            for i in range(4096):
+                line = rng.choice(lines)
+                if b'%d' in line:
+                    line = line % rng.randint(0, 9999)
+                chunk.append(line + (b'\r\n' if rng.random() < 0.5 else b'\n'))
+            data = b''.join(chunk)
+            f.write(data)
+            written += len(data)
+    return written
+
+def Measure(parser, path : str, size : int) -> float:
+    start = time.perf_counter()
+    messages = 0
+    with open(path, 'rb') as f:
+        for i in parser.Parse(f):
+            messages += 1
+    elapsed = time.perf_counter() - start
+    throughput = size / (1 << 20) / elapsed
+    print('%-10s %8.1f MB %10d messages %8.2f s %8.1f MB/s' % (parser.__class__.__name__, size / (1 << 20), messages, elapsed, throughput))
+    return throughput
+
+def main():
+    size = 256
+    minimum = 0.0
+    try:
+        arg, opt = getopt.getopt(sys.argv[1:], "s:m:", ['size=', 'min='])
+    except getopt.GetoptError as err:
+        print(err)
+        sys.exit(2)
+    for o, a in arg:
+        if o in ('-s', '--size'):
+            size = int(a)
+        elif o in ('-m', '--min'):
+            minimum = float(a)
+
+    worst = None
+    for parser, lines in ((VivadoLog(IGNORE), VIVADO_LINES), (QuartusLog(IGNORE), QUARTUS_LINES)):
+        fd, path = tempfile.mkstemp(suffix='.log')
+        os.close(fd)
+        try:
+            written = Generate(path, lines, size << 20)
+            throughput = Measure(parser, path, written)
+            worst = throughput if worst is None else min(worst, throughput)
+        finally:
+            os.remove(path)
+
+    if worst < minimum:
+        print('Throughput regression: %.1f MB/s < %.1f MB/s' % (worst, minimum))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
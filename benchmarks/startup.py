@@ -0,0 +1,78 @@
+"""Startup time benchmark for the pldude command line.
+
+Times fresh interpreters running `pldude --help` and importing the build
+configuration, the part every real run pays before a tool is launched, and
+lists the modules a help run imports so eager imports show up in review.
+
+    python benchmarks/startup.py [-n|--runs <count>] [-m|--max <ms>]
+"""
+
+import os
+import sys
+import time
+import getopt
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CASES = (
+    ('help', [sys.executable, '-m', 'pldude', '--help']),
+    ('buildconf', [sys.executable, '-c', 'import pldude.bconfigs.buildconf']),
+    ('xilinx7', [sys.executable, '-c', 'import pldude.bconfigs.xilinx7']),
+    ('altera', [sys.executable, '-c', 'import pldude.bconfigs.altera']),
+    ('interpreter', [sys.executable, '-c', 'pass']),
+)
+
+# a help run should never get to these
+HEAVY = ('yaml', 'asyncio', 'concurrent.futures', 'pldude.bconfigs.buildconf', 'pldude.bconfigs.xilinx7', 'pldude.bconfigs.altera')
+
+def Measure(args : list, runs : int) -> float:
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+def Imported(args : list) -> list:
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([args[0], '-X', 'importtime'] + args[1:], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    modules = []
+    for line in result.stderr.decode(errors='replace').splitlines():
+        if line.startswith('import time:') and line.count('|') == 2:
+            modules.append(line.split('|')[2].strip())
+    return modules
+
+def main():
+    runs = 10
+    maximum = 0.0
+    try:
+        arg, opt = getopt.getopt(sys.argv[1:], "n:m:", ['runs=', 'max='])
+    except getopt.GetoptError as err:
+        print(err)
+        sys.exit(2)
+    for o, a in arg:
+        if o in ('-n', '--runs'):
+            runs = int(a)
+        elif o in ('-m', '--max'):
+            maximum = float(a)
+
+    results = {}
+    for name, args in CASES:
+        results[name] = Measure(args, runs)
+    for name, args in CASES:
+        print('%-12s %8.1f ms %8.1f ms over the bare interpreter' % (name, results[name], results[name] - results['interpreter']))
+
+    heavy = [i for i in Imported(CASES[0][1]) if i in HEAVY]
+    if heavy:
+        print('Imported by --help: ' + ', '.join(heavy))
+
+    overhead = results['help'] - results['interpreter']
+    if heavy or (maximum and overhead > maximum):
+        print('Startup regression: %.1f ms over the interpreter (limit %.1f ms)' % (overhead, maximum))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
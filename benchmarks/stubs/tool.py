@@ -0,0 +1,219 @@
+"""Stand-in for the vendor executables PLDude launches, used by benchmarks/e2e.py.
+
+Invoked as `tool.py <tool name> <arguments>`. It writes a synthetic (or
+recorded) log in the tool's format and creates the artifacts the real tool
+would, so every PLDude flow runs end to end without a vendor install.
+
+Environment:
+    PLDUDE_STUB_LOG_MB   size of the log written by every long running tool (default 1)
+    PLDUDE_STUB_LOG      recorded log replayed instead of the synthetic one
+    PLDUDE_STUB_RATE     log rate in MB/s, 0 writes as fast as the pipe takes it (default 0)
+    PLDUDE_STUB_DELAY    seconds every long running tool works besides writing its log (default 0)
+    PLDUDE_STUB_TARGETS  number of JTAG targets on the chain scan (default 1)
+    PLDUDE_STUB_PART     device reported on every target (default xc7a35t)
+    PLDUDE_STUB_ACCOUNT  file the CPU seconds of every stub run are appended to
+"""
+
+import os
+import re
+import sys
+import time
+import random
+
+LINES = {
+    'vivado': [
+        'INFO: [Synth 8-3331] design top has unconnected port led[%d]',
+        'WARNING: [Synth 8-3301] Unused top level parameter/generic WIDTH_%d',
+        'CRITICAL WARNING: [Constraints 18-%d] Cannot set property',
+        'Phase 1.%d Physical Synthesis Initialization | Checksum: 1d3a5e',
+        'Time (s): cpu = 00:00:%d ; elapsed = 00:00:05 . Memory (MB): peak = 1042.121',
+    ],
+    'quartus': [
+        'Info (12021): Found 2 design units, including %d entities, in source file top.vhd',
+        'Warning (10540): VHDL Signal Declaration warning at top.vhd(%d): used explicit default value',
+        'Info (332146): Worst-case setup slack is %d.000',
+        '    Info (12023): Found entity 1: top',
+    ],
+    'xsim': [
+        'Time: %d ps  Iteration: 0  Process: /tb/stimulus',
+        'INFO: [VRFC 10-163] Analyzing VHDL file "/src/m%d.vhd" into library work',
+    ],
+}
+
+def Flavor(tool : str) -> str:
+    if tool.startswith('quartus'):
+        return 'quartus'
+    return 'xsim' if tool == 'xsim.bat' else 'vivado'
+
+def Emit(tool : str):
+    size = float(os.environ.get('PLDUDE_STUB_LOG_MB', '1')) * (1 << 20)
+    rate = float(os.environ.get('PLDUDE_STUB_RATE', '0')) * (1 << 20)
+    recorded = os.environ.get('PLDUDE_STUB_LOG', '')
+    out = sys.stdout.buffer
+    start = time.monotonic()
+    written = 0
+
+    if recorded:
+        with open(recorded, 'rb') as f:
+            while True:
+                chunk = f.read(1 << 16)
+                if not chunk:
+                    break
+                out.write(chunk)
+                written += len(chunk)
+                Throttle(written, rate, start)
+        out.flush()
+        return
+
+    rng = random.Random(len(tool))
+    lines = [i.encode() for i in LINES[Flavor(tool)]]
+    while written < size:
+        chunk = []
+        for i in range(1024):
+            line = rng.choice(lines)
+            if b'%d' in line:
+                line = line % rng.randint(0, 9999)
+            chunk.append(line + b'\n')
+        chunk = b''.join(chunk)
+        out.write(chunk)
+        written += len(chunk)
+        Throttle(written, rate, start)
+    out.flush()
+
+def Throttle(written : int, rate : float, start : float):
+    if rate > 0:
+        ahead = written / rate - (time.monotonic() - start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+def Work(tool : str):
+    time.sleep(float(os.environ.get('PLDUDE_STUB_DELAY', '0')))
+    Emit(tool)
+
+def Touch(path : str, content : str = ''):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+def RunScript(tool : str, script : str):
+    # the Vivado commands that leave files behind
+    Work(tool)
+    with open(script, 'r') as f:
+        for line in f:
+            line = line.strip()
+            target = re.match(r'(?:write_checkpoint|write_bitstream|write_cfgmem|write_vhdl|write_verilog)\b.*\s(\S+)$', line)
+            if target:
+                Touch(target.group(1))
+            timing = re.match(r'set \w+ \[open (\S+) w\]', line)
+            if timing:
+                Touch(timing.group(1), '0.100 0.000\n')
+
+def Targets() -> list:
+    part = os.environ.get('PLDUDE_STUB_PART', 'xc7a35t')
+    return [('localhost:3121/xilinx_tcf/Digilent/%06d' % i, part + '_0') for i in range(int(os.environ.get('PLDUDE_STUB_TARGETS', '1')))]
+
+def Session(tool : str):
+    # commands arrive wrapped in catch blocks and end with the sentinel line
+    block = []
+    sys.stdout.write('Vivado% ')
+    sys.stdout.flush()
+    for line in sys.stdin:
+        sentinel = re.match(r'puts "PLDUDE:END (\d+) \$pldude_rc"', line)
+        if not sentinel:
+            if line.strip() == 'exit':
+                return
+            block.append(line)
+            continue
+
+        command = ''.join(block)
+        block = []
+        if 'get_hw_targets' in command:
+            print('PLDUDE:BEGIN')
+            for target, device in Targets():
+                print('PLDUDE:TARGET ' + target)
+                print('PLDUDE:DEVICE ' + device)
+            print('PLDUDE:END')
+        elif 'program_hw_devices' in command:
+            Work(tool)
+            print('INFO: [Labtools 27-3164] End of startup status: HIGH')
+        for script in re.findall(r'source (\S+?\.tcl)', command):
+            RunScript(tool, script)
+        print('PLDUDE:END %s 0' % sentinel.group(1))
+        sys.stdout.write('Vivado% ')
+        sys.stdout.flush()
+
+def Vivado(tool : str, args : list):
+    if args == ['-version']:
+        print('Vivado v2023.1 (64-bit)\nSW Build 3865809 on Sun May  7 15:05:29 MDT 2023')
+    elif '-mode' in args and args[args.index('-mode') + 1] == 'batch':
+        RunScript(tool, args[args.index('-source') + 1])
+    else:
+        Session(tool)
+
+def HwServer(tool : str):
+    sys.stdout.write('****** Xilinx hw_server v2023.1\n  **** Build date : Jan  1 2023\n')
+    sys.stdout.flush()
+    # runs until PLDude terminates its process group
+    while True:
+        time.sleep(60)
+
+def Quartus(tool : str, args : list):
+    if tool == 'quartus_stp':
+        part = os.environ.get('PLDUDE_STUB_PART', '10M08SA')
+        print('PLDUDE:BEGIN')
+        for i in range(int(os.environ.get('PLDUDE_STUB_TARGETS', '1'))):
+            print('PLDUDE:TARGET USB-Blaster [USB-%d]' % i)
+            print('PLDUDE:DEVICE @1: %s (0x031820DD)' % part)
+        print('PLDUDE:END')
+        return
+    if args == ['--version']:
+        print('Quartus Prime Analysis & Synthesis\nVersion 22.1std.0 Build 915 10/25/2022 SC Lite Edition')
+        return
+
+    Work(tool)
+    outputs = {
+        'quartus_map': 'project.map.rpt',
+        'quartus_fit': 'project.fit.rpt',
+        'quartus_asm': 'project.sof',
+        'quartus_sta': 'project.sta.rpt'
+    }
+    if tool in outputs:
+        Touch(outputs[tool])
+    elif tool == 'quartus_cpf':
+        Touch(args[-1])
+
+def Simulator(tool : str, args : list):
+    if tool == 'xelab.bat':
+        snapshot = args[args.index('-s') + 1]
+        os.makedirs('xsim.dir/' + snapshot, exist_ok=True)
+    Work(tool)
+
+def Account():
+    path = os.environ.get('PLDUDE_STUB_ACCOUNT', '')
+    if not path:
+        return
+    times = os.times()
+    with open(path, 'a') as f:
+        f.write('%f\n' % (times.user + times.system))
+
+def main():
+    tool = sys.argv[1]
+    args = sys.argv[2:]
+    try:
+        if tool == 'vivado.bat':
+            Vivado(tool, args)
+        elif tool == 'hw_server.bat':
+            HwServer(tool)
+        elif tool.startswith('quartus'):
+            Quartus(tool, args)
+        else:
+            Simulator(tool, args)
+    except BrokenPipeError:
+        pass
+    finally:
+        Account()
+
+if __name__ == '__main__':
+    main()
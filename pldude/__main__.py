@@ -1,5 +1,5 @@
-from pldude.bconfigs.buildconf import BuildConfig
 from pldude.utils.error import PLDudeError
+import os
 import sys
 import getopt
 
@@ -16,35 +16,331 @@ v0.9.0
 
 usage = """
 Usage:
-    pldude [-c|--compile] [-p|--program] [-v|--verbosity <DEBUG|INFO|WARNING|ERROR|NONE>] [-s|--simulate <module>] [-h|--help] [-x|--clean]
+    pldude [-c|--compile] [-p|--program] [-v|--verbosity <DEBUG|INFO|WARNING|ERROR|NONE>] [-s|--simulate <module>] [-S|--simulate-all <regex>] [-h|--help] [-x|--clean] [-w|--watch] [-t|--trace <file>] [-a|--program-all] [-f|--filter <regex>] [-r|--farm] [-d|--device <device>] [-F|--flash]
 
 Options:
     -c | --compile              Synthesize all hdl files
     -p | --program              Upload synthesized hdl files to PLD, will synthesize if files are not already
     -v | --verbosity            Set verbosity level (INFO|WARNING|ERROR|NONE)
     -s | --simulate             Simulate the specified module
+    -S | --simulate-all         Run every testbench whose name matches <regex> headless and in parallel
     -h | --help                 Display this message
     -x | --clean                Clean all tool-generated files
+    -w | --watch                Rebuild whenever sources or configuration files change
+    -t | --trace                Write a Chrome trace of the build phases and tool runs to <file>
+    -a | --program-all          Program every attached board of the project's part in parallel
+    -f | --filter               Only program the targets whose name or serial matches <regex>, implies -a
+    -r | --farm                 Run the compile or -S simulation on the least loaded build worker from workers
+    -d | --device               Only build <device> of the matrix
+    -F | --flash                Program the configuration flash with an image from program_files, implies -p
 
+    pldude logs [list|show|diff|history] ...  Query the archived messages of past builds, see pldude logs -h
+    pldude worker [<options>]                  Serve builds for -r, see pldude worker -h
+    pldude workspace [<options>] [<root>]      Build every out of date project under <root>, see pldude workspace -h
+
+"""
+
+logs_usage = """
+Usage:
+    pldude logs [list]                          List the archived builds
+    pldude logs show [<build>] [<filters>]      Print the messages of a build (defaults to the last one)
+    pldude logs diff [<old> [<new>]]            Message ids whose count changed between two builds (defaults to prev and last)
+    pldude logs history <id>                    Count of a message id in every archived build and where it first appeared
+
+Options:
+    -b | --build-dir            Archive to read, <backend> or <backend>/<variant> for matrix builds
+    -i | --id                   Only messages with this id, eg. "Synth 8-327"
+    -s | --severity             Only messages with this tool severity, eg. WARNING
+    -g | --stage                Only messages of this stage, eg. synth
+    -m | --match                Only messages whose text matches <regex>
+    -n | --ignored              Include the warnings on the ignore list
+    -h | --help                 Display this message
+
+A build is a build number, last, prev or an offset from the last build such as -3. Ids, severities and stages may be
+repeated or comma separated.
+"""
+
+def logs(argv : list):
+    from pldude.utils.logarchive import LogArchive
+    import time
+
+    try:
+        arg, opt = getopt.gnu_getopt(argv, "b:i:s:g:m:nh", ['build-dir=', 'id=', 'severity=', 'stage=', 'match=', 'ignored', 'help'])
+    except getopt.GetoptError as err:
+        print(err)
+        print(logs_usage)
+        sys.exit(2)
+
+    directory = None
+    filters = {'ids': [], 'severities': [], 'stages': [], 'pattern': None, 'ignored': False}
+    for o, a in arg:
+        if o in ('-h', '--help'):
+            print(logs_usage)
+            sys.exit(0)
+        elif o in ('-b', '--build-dir'):
+            directory = a
+        elif o in ('-i', '--id'):
+            filters['ids'] += [i.strip() for i in a.split(',')]
+        elif o in ('-s', '--severity'):
+            filters['severities'] += [i.strip() for i in a.split(',')]
+        elif o in ('-g', '--stage'):
+            filters['stages'] += [i.strip() for i in a.split(',')]
+        elif o in ('-m', '--match'):
+            filters['pattern'] = a
+        elif o in ('-n', '--ignored'):
+            filters['ignored'] = True
+
+    found = LogArchive.Find('./gen')
+    if not found:
+        raise PLDudeError('No build logs archived under ./gen', 2)
+    if directory is None:
+        if len(found) > 1:
+            raise PLDudeError('Several archives found, select one with -b: ' + ', '.join(found.keys()), 2)
+        directory = list(found.keys())[0]
+    if not directory in found:
+        raise PLDudeError('No archive for ' + directory + ', found: ' + ', '.join(found.keys()), 2)
+    archive = LogArchive(found[directory])
+
+    command = opt[0] if opt else 'list'
+    refs = opt[1:]
+    def Date(seconds : float) -> str:
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seconds))
+
+    try:
+        if command == 'list':
+            print('%6s  %-19s  %-9s  %8s  %9s  %7s  %8s  %9s' % ('Build', 'Started', 'Status', 'Time', 'Messages', 'Errors', 'Warnings', 'Size'))
+            for build in archive.Builds():
+                index = archive.Index(build)
+                levels = index['levels']
+                errors = sum([v['count'] for k, v in index['severities'].items() if levels.get(k, 0) >= 40])
+                warnings = sum([v['count'] for k, v in index['severities'].items() if levels.get(k, 0) == 30]) - index['ignored']
+                print('%6d  %-19s  %-9s  %7.1fs  %9d  %7d  %8d  %6d KB' % (build, Date(index['started']), index['status'], index['finished'] - index['started'], index['records'], errors, warnings, archive.Size(build) // 1024))
+        elif command == 'show':
+            build = archive.Resolve(refs[0] if refs else 'last')
+            count = 0
+            for stage, severity, id, text, ignored in archive.Query(build, **filters):
+                print('[' + stage + '] ' + severity + ': ' + ('[' + id + '] ' if id else '') + text + (' (ignored)' if ignored else ''))
+                count += 1
+            print(str(count) + ' messages in build ' + str(build))
+        elif command == 'diff':
+            new = archive.Resolve(refs[1] if len(refs) > 1 else 'last')
+            old = archive.Resolve(refs[0] if refs else 'prev')
+            changes = archive.Diff(old, new)
+            print('Build ' + str(old) + ' -> ' + str(new) + ': ' + str(len(changes)) + ' message ids changed')
+            for id, severity, before, after, text in changes:
+                print('%+7d  %-16s  %-24s  %6d -> %-6d  %s' % (after - before, severity, id, before, after, text))
+        elif command == 'history':
+            if len(refs) != 1:
+                raise PLDudeError('pldude logs history needs exactly one message id', 2)
+            history = archive.History(refs[0])
+            for build, started, count in history:
+                print('%6d  %-19s  %8d' % (build, Date(started), count))
+            seen = [i for i in history if i[2]]
+            if not seen:
+                print(refs[0] + ' does not appear in any archived build')
+            else:
+                print(refs[0] + ' first seen in build ' + str(seen[0][0]) + ' (' + Date(seen[0][1]) + '), last seen in build ' + str(seen[-1][0]) + ' (' + Date(seen[-1][1]) + ')')
+        else:
+            print(logs_usage)
+            sys.exit(2)
+    except (OSError, ValueError, KeyError) as err:
+        raise PLDudeError('Cannot read the build log archive: ' + str(err), 2)
+
+worker_usage = """
+Usage:
+    pldude worker [-l|--listen <host:port>] [-j|--slots <count>] [-L|--licenses <brand=count,...>] [-d|--dir <path>]
+
+Options:
+    -l | --listen               Address to serve on (defaults to 127.0.0.1:7878)
+    -j | --slots                Builds running at once (defaults to 1)
+    -L | --licenses             Builds of a brand running at once, eg. Xilinx7=1,Altera=2, 0 refuses the brand
+    -d | --dir                  Object store and project workspaces (defaults to ~/.pldude/worker)
+    -h | --help                 Display this message
+
+Set PLDUDE_FARM_TOKEN on the workers and the clients to only accept clients knowing the token.
 """
 
+def worker(argv : list):
+    from pldude.utils.worker import FarmWorker
+    from pldude.bconfigs.buildconf import CustomFormatter
+    import logging
+
+    try:
+        arg, opt = getopt.getopt(argv, "l:j:L:d:h", ['listen=', 'slots=', 'licenses=', 'dir=', 'help'])
+    except getopt.GetoptError as err:
+        print(err)
+        print(worker_usage)
+        sys.exit(2)
+
+    listen = '127.0.0.1:7878'
+    slots = 1
+    licenses = {}
+    directory = os.path.expanduser('~/.pldude/worker')
+    try:
+        for o, a in arg:
+            if o in ('-h', '--help'):
+                print(worker_usage)
+                sys.exit(0)
+            elif o in ('-l', '--listen'):
+                listen = a
+            elif o in ('-j', '--slots'):
+                slots = int(a)
+            elif o in ('-L', '--licenses'):
+                for i in a.split(','):
+                    brand, _, count = i.partition('=')
+                    licenses[brand.strip()] = int(count)
+            elif o in ('-d', '--dir'):
+                directory = a
+    except ValueError as err:
+        raise PLDudeError('Invalid worker option: ' + str(err), 2)
+
+    logger = logging.getLogger()
+    handler = logging.StreamHandler()
+    handler.setFormatter(CustomFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        FarmWorker(directory, slots, licenses, logger).Serve(listen)
+    except OSError as err:
+        raise PLDudeError('Cannot serve on ' + listen + ': ' + str(err), 2)
+    except KeyboardInterrupt:
+        logger.warning('Worker stopped')
+
+workspace_usage = """
+Usage:
+    pldude workspace [-j|--jobs <count>] [-P|--processors <count>] [-L|--licenses <brand=count,...>] [-f|--filter <regex>] [-a|--all] [-l|--list] [-v|--verbosity <level>] [<root>]
+
+Options:
+    -j | --jobs                 Devices built at once over all projects (defaults to a quarter of the processors)
+    -P | --processors           Threads shared by every running tool (defaults to every core)
+    -L | --licenses             Builds of a brand running at once, eg. Xilinx7=1,Altera=2
+    -f | --filter               Only the projects whose path below <root> matches <regex>
+    -a | --all                  Also build the projects that are up to date
+    -l | --list                 List the projects and whether they are out of date, without building
+    -v | --verbosity            Set verbosity level (DEBUG|INFO|WARNING|ERROR|NONE)
+    -h | --help                 Display this message
+
+<root> defaults to the current directory, every directory below it holding a pldprj.yml is a project.
+"""
+
+def workspace(argv : list):
+    from pldude.bconfigs.workspace import Workspace
+    from pldude.bconfigs.buildconf import CustomFormatter
+    import logging
+
+    try:
+        arg, rest = getopt.gnu_getopt(argv, "j:P:L:f:alv:h", ['jobs=', 'processors=', 'licenses=', 'filter=', 'all', 'list', 'verbosity=', 'help'])
+    except getopt.GetoptError as err:
+        print(err)
+        print(workspace_usage)
+        sys.exit(2)
+    if len(rest) > 1:
+        print(workspace_usage)
+        sys.exit(2)
+
+    logger = logging.getLogger()
+    handler = logging.StreamHandler()
+    handler.setFormatter(CustomFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    options = {'licenses': {}}
+    listing = False
+    try:
+        for o, a in arg:
+            if o in ('-h', '--help'):
+                print(workspace_usage)
+                sys.exit(0)
+            elif o in ('-j', '--jobs'):
+                options['jobs'] = int(a)
+            elif o in ('-P', '--processors'):
+                options['processors'] = int(a)
+            elif o in ('-L', '--licenses'):
+                for i in a.split(','):
+                    brand, _, count = i.partition('=')
+                    options['licenses'][brand.strip()] = int(count)
+            elif o in ('-f', '--filter'):
+                options['pattern'] = a
+            elif o in ('-a', '--all'):
+                options['everything'] = True
+            elif o in ('-l', '--list'):
+                listing = True
+            elif o in ('-v', '--verbosity'):
+                level = a.upper()
+                if not level in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'NONE'):
+                    raise PLDudeError('Verbosity expected to be: (DEBUG | INFO | WARNING | ERROR | NONE)', 2)
+                logger.setLevel(logging.ERROR if level == 'NONE' else getattr(logging, level))
+    except ValueError as err:
+        raise PLDudeError('Invalid workspace option: ' + str(err), 2)
+
+    ws = Workspace(rest[0] if rest else '.', logger, **options)
+    try:
+        if listing:
+            ws.List()
+        else:
+            ws.run()
+    except PLDudeError as err:
+        logger.log(err.level, err.reason)
+        sys.exit(err.ecode)
+    except KeyboardInterrupt:
+        logger.warning('User termination')
+        sys.exit(0)
+
 def main():
     try:
         try:
-            print(splash)
+            # build worker jobs report through their worker, without the banner
+            if not os.environ.get('PLDUDE_WORKER_JOB'):
+                print(splash)
+            else:
+                # stopped with SIGTERM by the worker or workspace, the tools go down as on Ctrl-C
+                import signal
+                signal.signal(signal.SIGTERM, signal.default_int_handler)
 
             if len(sys.argv[1:]) == 0:
                 print(usage)
                 sys.exit(0)
 
+            if sys.argv[1] == 'logs':
+                try:
+                    logs(sys.argv[2:])
+                except PLDudeError as err:
+                    print(err.reason)
+                    sys.exit(err.ecode)
+                sys.exit(0)
+
+            if sys.argv[1] == 'workspace':
+                try:
+                    workspace(sys.argv[2:])
+                except PLDudeError as err:
+                    print(err.reason)
+                    sys.exit(err.ecode)
+                sys.exit(0)
+
+            if sys.argv[1] == 'worker':
+                try:
+                    worker(sys.argv[2:])
+                except PLDudeError as err:
+                    print(err.reason)
+                    sys.exit(err.ecode)
+                sys.exit(0)
+
             try:
-                arg, opt = getopt.getopt(sys.argv[1:], "cpv:s:hx", ['compile', 'program', 'verbosity=', 'simulate=', 'help', 'clean'])
+                arg, opt = getopt.getopt(sys.argv[1:], "cpv:s:S:hxwt:af:rd:F", ['compile', 'program', 'verbosity=', 'simulate=', 'simulate-all=', 'help', 'clean', 'watch', 'trace=', 'program-all', 'filter=', 'farm', 'device=', 'flash'])
             except getopt.GetoptError as err:
                 print(err)
                 print(usage)
                 sys.exit(2)
 
+            if [o for o, a in arg if o in ('-h', '--help')]:
+                print(usage)
+                sys.exit(0)
+
+            # the build configuration and its backends are only imported for actual work
+            from pldude.bconfigs.buildconf import BuildConfig
             bconf = BuildConfig()
+            watch = False
+            device = None
             for o, a in arg:
                 if o in ('-c', '--compile'):
                     bconf.SetCompile(True)
@@ -54,15 +350,42 @@ def main():
                     bconf.SetVerbosity(a)
                 elif o in ('-s', '--simulate'):
                     bconf.SetSimulate(True, a)
+                elif o in ('-S', '--simulate-all'):
+                    bconf.SetSimulateAll(a)
                 elif o in ('-x', '--clean'):
                     bconf.Clean(True)
-                elif o in ('-h', '--help'):
-                    print(usage)
-                    sys.exit(0)
+                elif o in ('-w', '--watch'):
+                    watch = True
+                elif o in ('-t', '--trace'):
+                    bconf.SetTrace(a)
+                elif o in ('-a', '--program-all'):
+                    bconf.SetProgramAll(True)
+                elif o in ('-f', '--filter'):
+                    bconf.SetProgramAll(True, a)
+                elif o in ('-r', '--farm'):
+                    bconf.SetFarm(True)
+                elif o in ('-d', '--device'):
+                    device = a
+                elif o in ('-F', '--flash'):
+                    bconf.SetProgramFlash(True)
 
-            bconf.LoadConfig()
+            with bconf.Phase('load config'):
+                bconf.LoadConfig()
+            if device is not None:
+                bconf.SetDevice(device)
 
-            bconf.GetSpecific().run()
+            if watch:
+                if bconf.GetMatrix():
+                    raise PLDudeError("Watch mode needs a single device, remove the matrix from pldprj.yml", 2)
+                bconf.GetSpecific().Watch()
+            elif bconf.GetMatrix():
+                from pldude.bconfigs.matrix import BuildMatrix
+                BuildMatrix(bconf).run()
+            else:
+                try:
+                    bconf.GetSpecific().run()
+                finally:
+                    bconf.WriteTrace()
         except PLDudeError as err:
             bconf._logging.log(err.level, err.reason)
             sys.exit(err.ecode)
@@ -0,0 +1,191 @@
+import os
+import time
+
+from pldude.utils.error import PLDudeError
+from pldude.utils.logparse import QuartusLog
+from pldude.bconfigs.stages import Stage
+from pldude.bconfigs.buildconf import BuildConfig, Device
+
+class AlteraDevice(Device):...
+
+class Altera(BuildConfig):
+    LOG_PARSER = QuartusLog
+    # JTAG only loads the .sof, .rbf images are for passive serial and processor loaders
+    PROGRAM_FORMATS = {'sof': 'jtag', 'jic': 'flash', 'rbf': None}
+
+    # device part number prefix, the longest matching prefix wins
+    FAMILIES = (
+        ('EP4CGX', 'Cyclone IV GX'),
+        ('EP4CE', 'Cyclone IV E'),
+        ('EP4SGX', 'Stratix IV'),
+        ('EP3C', 'Cyclone III'),
+        ('EP2C', 'Cyclone II'),
+        ('EPM', 'MAX II'),
+        ('10CL', 'Cyclone 10 LP'),
+        ('10CX', 'Cyclone 10 GX'),
+        ('10AX', 'Arria 10'),
+        ('10AS', 'Arria 10'),
+        ('10AT', 'Arria 10'),
+        ('10M', 'MAX 10'),
+        ('5CE', 'Cyclone V'),
+        ('5CG', 'Cyclone V'),
+        ('5CS', 'Cyclone V'),
+        ('5AG', 'Arria V'),
+        ('5AS', 'Arria V'),
+        ('5AT', 'Arria V'),
+        ('5AGZ', 'Arria V GZ'),
+        ('5SG', 'Stratix V'),
+        ('5SE', 'Stratix V'),
+        ('5M', 'MAX V')
+    )
+
+    def GetToolVersion(self) -> str:
+        return self.ToolRelease('quartus_map', ['--version'], r'^Version .*$')
+
+    def GetFamily(self) -> str:
+        if self._family:
+            return self._family
+        for prefix, family in sorted(self.FAMILIES, key=lambda x: -len(x[0])):
+            if self.device.upper().startswith(prefix):
+                return family
+        raise PLDudeError('Unknown family for ' + self.device + ', set family in pldprj.yml', 2)
+
+    def GetFingerprintKey(self) -> dict:
+        key = super().GetFingerprintKey()
+        key['family'] = self.GetFamily()
+        return key
+
+    def WriteScripts(self) -> list:
+        compile_dir = self.GetDirectory('compile')
+
+        self._logging.info("Writing Quartus project...")
+        altera_qpf = 'PROJECT_REVISION = "project"\n'
+
+        altera_qsf = '# Generated by PLDude, edits are overwritten\n'
+        altera_qsf += 'set_global_assignment -name FAMILY "' + self.GetFamily() + '"\n'
+        altera_qsf += 'set_global_assignment -name DEVICE ' + self.device + '\n'
+        altera_qsf += 'set_global_assignment -name TOP_LEVEL_ENTITY ' + self.top + '\n'
+        if self.vhdl_2008:
+            altera_qsf += 'set_global_assignment -name VHDL_INPUT_VERSION VHDL_2008\n'
+        altera_qsf += 'set_global_assignment -name NUM_PARALLEL_PROCESSORS ' + str(self.GetProcessors()) + '\n'
+
+        for i in self._files:
+            altera_qsf += 'set_global_assignment -name ' + i.type.upper() + '_FILE "' + str(i.dir).replace('\\', '/') + '"\n'
+
+        for i in self.GetPins().items():
+            if type(i[1]) == dict:
+                altera_qsf += 'set_location_assignment PIN_' + str(i[1]['pkg']) + ' -to ' + str(i[0]) + '\n'
+                if 'iostd' in i[1]:
+                    altera_qsf += 'set_instance_assignment -name IO_STANDARD "' + str(i[1]['iostd']) + '" -to ' + str(i[0]) + '\n'
+            elif type(i[1]) == str:
+                altera_qsf += 'set_location_assignment PIN_' + i[1] + ' -to ' + str(i[0]) + '\n'
+            else:
+                raise PLDudeError('Unknown type!', 2)
+
+        return [
+            self.WriteIfChanged(compile_dir + "/project.qpf", altera_qpf),
+            self.WriteIfChanged(compile_dir + "/project.qsf", altera_qsf)
+        ]
+
+    def compile(self):
+        compile_dir = self.GetDirectory('compile')
+        bitfile_dir = self.GetDirectory('compile/bitfile')
+        self.GetScripts()
+
+        sources = [i.dir for i in self._files]
+        stages = [
+            Stage(
+                'map',
+                lambda: self.RunSubprocess('Executing synthesis...', compile_dir, ['quartus_map', 'project'], timeout=self.GetTimeout('map')),
+                inputs = sources,
+                values = (self.GetFingerprintKey(), sources),
+                outputs = [compile_dir + '/project.map.rpt']
+            ),
+            Stage(
+                'fit',
+                lambda: self.RunSubprocess('Executing fitter...', compile_dir, ['quartus_fit', 'project'], timeout=self.GetTimeout('fit')),
+                values = self.GetPins(),
+                outputs = [compile_dir + '/project.fit.rpt'],
+                deps = ['map']
+            ),
+            # both only read the fitted database and run side by side
+            Stage(
+                'asm',
+                lambda: self.Assemble(compile_dir, bitfile_dir),
+                outputs = [bitfile_dir + '/project.sof'],
+                deps = ['fit']
+            ),
+            Stage(
+                'sta',
+                lambda: self.RunSubprocess('Executing timing analysis...', compile_dir, ['quartus_sta', 'project'], timeout=self.GetTimeout('sta')),
+                outputs = [compile_dir + '/project.sta.rpt'],
+                deps = ['fit']
+            )
+        ]
+
+        self.RunStages(stages)
+        self.BuildProgramFiles()
+
+    def GetArtifacts(self) -> dict:
+        return {
+            'project.sof': self.GetDirectory('compile/bitfile') + '/project.sof',
+            'project.sta.rpt': self.GetDirectory('compile') + '/project.sta.rpt'
+        }
+
+    def Assemble(self, compile_dir : str, bitfile_dir : str):
+        self.RunSubprocess('Executing assembler...', compile_dir, ['quartus_asm', 'project'], timeout=self.GetTimeout('asm'))
+
+        if os.path.exists(bitfile_dir + '/project.sof'):
+            os.remove(bitfile_dir + '/project.sof')
+        os.rename(compile_dir + '/project.sof', bitfile_dir + '/project.sof')
+
+    def ConvertBitfile(self, fmt : str, path : str):
+        args = ['quartus_cpf', '-c']
+        if fmt == 'jic':
+            if not self._flash.get('device', None):
+                raise PLDudeError('Set flash.device to the configuration device of the board to write a .jic, eg. EPCQ64', 1)
+            args += ['-d', str(self._flash['device']), '-s', self.device]
+        if self._compress:
+            args += ['-o', 'bitstream_compression=on']
+        args += ['project.sof', os.path.basename(path)]
+        self.RunSubprocess('Converting project.sof to ' + os.path.basename(path) + '...', os.path.dirname(path), args, timeout=self.GetTimeout('convert'))
+
+    def GetRemote(self) -> str:
+        if self._remote == 'DEFAULT':
+            return 'localhost'
+        if type(self._remote) == list:
+            return self._remote[0]
+        return self._remote
+
+    def ScanDevices(self) -> list:
+        self._logging.info('Getting list of JTAG Devices...')
+        proc = self._procman.Start(['quartus_stp', '-t', self.GetResourceDir('list_devices.tcl')], self.GetDirectory('program'), timeout=self.GetTimeout('scan'))
+        try:
+            devices = self.ParseDevices(proc, AlteraDevice)
+        finally:
+            for i in proc:
+                pass
+            proc.Wait()
+        return devices
+
+    def GetBitfile(self) -> str:
+        return self.GetDirectory('compile/bitfile') + '/project.sof'
+
+    def ScanTargets(self) -> list:
+        return self.ScanDevices()
+
+    def ProgramTarget(self, device : AlteraDevice):
+        # a .jic goes through the flash loader Quartus configures into the device on its own
+        path = self.GetProgramFile()
+        args = ['quartus_pgm', '-c', device.target, '-m', 'JTAG', '-o', 'p;./' + os.path.basename(path) + '@' + str(device.index)]
+        start = time.perf_counter()
+        self.RunSubprocess('Programming ' + str(device) + '...', self.GetDirectory('compile/bitfile'), args, timeout=self.GetTimeout('program'))
+        self.ReportTransfer(device, path, time.perf_counter() - start)
+
+    def program(self):
+        if not os.path.exists(self.GetBitfile()):
+            self.compile()
+        self.GetProgramFile()
+
+        self.ProgramCached(self.ScanDevices, self.ProgramTarget)
+        self._endargs['program'] = True
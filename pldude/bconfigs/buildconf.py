@@ -1,22 +1,38 @@
 import logging
-from posixpath import abspath
 import sys
 import os
-import io
-import shutil
-import yaml
 import re
-import glob
-import subprocess
+import time
+import threading
+import contextlib
 
-from typing import Any, IO, Match
+from typing import Callable, IO, Iterable, TYPE_CHECKING
 from pldude.utils.error import PLDudeError
 from typing import Union
-from genericpath import getmtime
+from pldude.utils.fingerprint import FingerprintStore
+from pldude.utils.tclsession import TclSession
+from pldude.utils.hdlindex import HdlIndex
+from pldude.utils.discovery import SourceWalker
+from pldude.utils.profile import Profiler
+from pldude.utils.configcache import ConfigCache
+from pldude.utils.procman import ProcessManager, ManagedProcess, SignalGroup
+from pldude.utils.logparse import LogMessage
+from pldude.utils.logarchive import LogArchive
+from pldude.bconfigs.stages import Stage, StageGraph, CurrentStage, EnterStage
+from pldude.bconfigs import registry
 from pldude.resources import ResourceManager
 
+# only for annotations, the caches are imported when a build actually uses them
+if TYPE_CHECKING:
+    from pldude.utils.artifacts import ArtifactCache
+    from pldude.utils.topology import TopologyCache
+
 class CustomFormatter(logging.Formatter):
-    
+
+    def __init__(self, prefix : str = ''):
+        super().__init__()
+        self.prefix = prefix
+
     FORMATS = {
         logging.DEBUG : '\u001b[32m',
         logging.INFO : '\u001b[32m',
@@ -26,10 +42,22 @@ class CustomFormatter(logging.Formatter):
     }
     
     def format(self, record : logging.LogRecord):
-        log_fmt = '[' + self.FORMATS.get(record.levelno, '\u001b[0m') + '%(levelname)s\u001b[0m] %(message)s'
+        log_fmt = '[' + self.FORMATS.get(record.levelno, '\u001b[0m') + '%(levelname)s\u001b[0m] ' + self.prefix + '%(message)s'
         formatter = logging.Formatter(log_fmt)
         return formatter.format(record)
 
+class WireFormatter(logging.Formatter):
+    """Log lines of a build worker or workspace job, read back by its parent with their level."""
+
+    def __init__(self, prefix : str = ''):
+        super().__init__()
+        from pldude.utils.wire import WIRE_MARK
+        self.mark = WIRE_MARK
+        self.prefix = prefix
+
+    def format(self, record : logging.LogRecord):
+        return '\n'.join([self.mark + str(record.levelno) + ' ' + self.prefix + i for i in super().format(record).split('\n')])
+
 class RepFile():
     def __init__(self, dir : str, type : str):
         self.dir = dir
@@ -38,42 +66,188 @@ class RepFile():
 class BuildConfig(ResourceManager):
 
     REQUIRED_PROJ_PARAMS = ('device', 'top')
+    CONFIG_FILES = ["pldprj.yml", "pinprj.yml"]
+    # pldprj.yml key -> accepted value types
+    PROJECT_SCHEMA = {
+        'device': (str, list),
+        'top': (str,),
+        'filetype': (str,),
+        'optimize': (str,),
+        'opt-level': (int, str),
+        'clock_report': (bool,),
+        'timing_reports': (list,),
+        'util_reports': (list,),
+        'src': (str,),
+        'devsrc': (str,),
+        'vhdl2008': (bool,),
+        'ignore': (list,),
+        'remote': (str, list),
+        'platform_src': (str,),
+        'session': (bool,),
+        'checkpoints': (bool,),
+        'matrix': (list,),
+        'jobs': (int,),
+        'licenses': (dict,),
+        'prune': (bool,),
+        'exclude': (list,),
+        'debounce': (int, float),
+        'timeouts': (dict,),
+        'scan_ttl': (int, float),
+        'program_jobs': (int,),
+        'family': (str,),
+        'processors': (int,),
+        'ooc': (str, list),
+        'ooc_jobs': (int,),
+        'strategies': (int, list),
+        'strategy_jobs': (int,),
+        'strategy_margin': (int, float),
+        'sim_jobs': (int,),
+        'log_history': (int,),
+        'workers': (list, str),
+        'cache': (str,),
+        'cache_size': (int, float),
+        'cache_checkpoints': (bool,),
+        'compress': (bool,),
+        'program_files': (list,),
+        'flash': (dict,),
+    }
+    FILE_TYPES = {
+        'MIXED': ('.vhd', '.vhdl', '.v'),
+        'VHDL': ('.vhd', '.vhdl'),
+        'VERILOG': ('.v',)
+    }
+    LOG_PARSER = None
+    # programming file format -> what loads it, 'jtag' straight into the device, 'flash' or
+    # None for images only written for other loaders
+    PROGRAM_FORMATS = {}
 
     def __init__(self):
         self._compile = False
         self._program = False
         self._simulate = False
         self._to_simulate = ""
+        self._simulate_all = None
         self._ignore = []
         self._clean = False
-        self._subprocesses = []
+        self._procman = ProcessManager()
+        self._timeouts = {}
+        self._scan_ttl = 120
+        self._program_all = False
+        self._target_filter = None
+        self._program_jobs = 4
+        self._family = None
+        self._processors = None
+        self._ooc = []
+        self._ooc_jobs = None
+        self._strategies = None
+        self._strategy_jobs = None
+        self._strategy_margin = 0.5
+        self._sim_jobs = None
+        self._log_history = 20
+        self._log_writer = None
+        self._farm = False
+        self._workers = []
+        self._ooc_blocks = None
         self._remote = None
         self._platform_dir = None
+        self._session = False
+        self._checkpoints = False
+        self._scripts = None
+        self._fingerprint = None
+        self._index = None
+        self._matrix = []
+        self._jobs = os.cpu_count() or 1
+        self._licenses = {}
+        self._variant = None
+        self._pinset = None
+        self._prune = True
+        self._exclude = []
+        self._debounce = 0.5
+        self._cancel = None
+        self._keep_session = False
+        self._compile_session = None
+        self._session_stage = None
+        self._profiler = Profiler()
+        self._trace = None
+        self._cache_dir = os.environ.get('PLDUDE_CACHE', None)
+        self._cache_size = 1024
+        self._cache_checkpoints = False
+        self._compress = False
+        self._program_files = []
+        self._flash = {}
+        self._program_flash = False
+        self._program_file = None
 
         self._endargs = {}
 
         self._logging = logging.getLogger()
         ch = logging.StreamHandler()
         ch.setLevel(logging.DEBUG)
-        ch.setFormatter(CustomFormatter())
+        ch.setFormatter(WireFormatter() if os.environ.get('PLDUDE_WORKER_JOB') else CustomFormatter())
         self._logging.addHandler(ch)
 
         self._logging.setLevel(logging.INFO)
 
-    def LoadConfig(self):
-        try:
-            project_yaml = open("pldprj.yml", "r")
-            pinproj_yaml = open("pinprj.yml", "r")
-        except OSError as err:
-            raise PLDudeError("Could not open " + err.filename + ": " + err.strerror, 2)
-
-        project = yaml.load(project_yaml, Loader=yaml.SafeLoader) or {}
-        self.pinconf = yaml.load(pinproj_yaml, Loader=yaml.SafeLoader) or {}
+    def ParseConfig(self) -> list:
+        import yaml
+        # libyaml's loader when PyYAML was built with it, the pure Python one otherwise
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        values = []
+        for i in self.CONFIG_FILES:
+            try:
+                with open(i, "r") as f:
+                    values.append(yaml.load(f, Loader=loader) or {})
+            except OSError as err:
+                raise PLDudeError("Could not open " + err.filename + ": " + err.strerror, 2)
+            except yaml.YAMLError as err:
+                raise PLDudeError("Could not parse " + i + ": " + str(err), 1)
+        return values
+
+    def CheckConfig(self, project : dict, pinconf : dict) -> list:
+        errors = []
+        if type(project) != dict:
+            return ['pldprj.yml must be a mapping of settings']
+        for key, value in project.items():
+            types = self.PROJECT_SCHEMA.get(key, None)
+            if types is None:
+                self._logging.warning('Unknown setting ' + str(key) + ' in pldprj.yml')
+            elif type(value) == bool and not bool in types or not isinstance(value, types):
+                errors.append('pldprj.yml: ' + str(key) + ' must be ' + ' or '.join([i.__name__ for i in types]) + ', not ' + type(value).__name__)
+
+        if type(pinconf) != dict:
+            return errors + ['pinprj.yml must be a mapping of pin sets']
+        for pinset, pins in pinconf.items():
+            if type(pins) != dict:
+                errors.append('pinprj.yml: ' + str(pinset) + ' must be a mapping of ports to pins')
+                continue
+            for port, pin in pins.items():
+                if type(pin) == dict and 'pkg' in pin:
+                    continue
+                if type(pin) != str:
+                    errors.append('pinprj.yml: ' + str(pinset) + '.' + str(port) + ' must be a pin name or {pkg, iostd}')
+        return errors
 
-        project_yaml.close()
-        pinproj_yaml.close()
+    def LoadConfig(self):
+        cache = ConfigCache("./gen/config.bin")
+        values = cache.Load(self.CONFIG_FILES)
+        parsed = values is None
+        if parsed:
+            values = self.ParseConfig()
+        project, self.pinconf = values
+
+        errors = self.CheckConfig(project, self.pinconf)
+        if len(errors) != 0:
+            raise PLDudeError("Invalid configuration:\n    " + '\n    '.join(errors), 1)
+        if parsed:
+            cache.Save(self.CONFIG_FILES, values)
 
         self.device = project.get('device', None)
+        self._matrix = project.get('matrix', self._matrix)
+        if type(self.device) == list:
+            self._matrix = [{'device': i} for i in self.device]
+            self.device = None
+        self._jobs = project.get('jobs', self._jobs)
+        self._licenses = project.get('licenses', self._licenses)
         self.top = project.get('top', None)
         self.mode = project.get('filetype', "mixed").upper()
         self.src_dir = project.get('src', './src')
@@ -81,17 +255,80 @@ class BuildConfig(ResourceManager):
         self._ignore = project.get('ignore', self._ignore)
         self._remote = project.get('remote', 'DEFAULT')
         self._platform_dir = project.get('platform_src', self._platform_dir)
+        self._session = project.get('session', self._session)
+        self._checkpoints = project.get('checkpoints', self._checkpoints)
+        self._prune = project.get('prune', self._prune)
+        self._exclude = project.get('exclude', self._exclude)
+        self._debounce = project.get('debounce', self._debounce)
+        self._timeouts = project.get('timeouts', self._timeouts)
+        self._scan_ttl = project.get('scan_ttl', self._scan_ttl)
+        self._program_jobs = project.get('program_jobs', self._program_jobs)
+        self._family = project.get('family', self._family)
+        self._processors = project.get('processors', self._processors)
+        self._ooc = project.get('ooc', self._ooc)
+        self._ooc_jobs = project.get('ooc_jobs', self._ooc_jobs)
+        self._strategies = project.get('strategies', self._strategies)
+        self._strategy_jobs = project.get('strategy_jobs', self._strategy_jobs)
+        self._strategy_margin = project.get('strategy_margin', self._strategy_margin)
+        self._sim_jobs = project.get('sim_jobs', self._sim_jobs)
+        self._log_history = project.get('log_history', self._log_history)
+        self._workers = project.get('workers', self._workers)
+        self._cache_dir = project.get('cache', self._cache_dir)
+        self._cache_size = project.get('cache_size', self._cache_size)
+        self._cache_checkpoints = project.get('cache_checkpoints', self._cache_checkpoints)
+        self._compress = project.get('compress', self._compress)
+        self._program_files = [str(i).lower().lstrip('.') for i in project.get('program_files', self._program_files)]
+        self._flash = project.get('flash', self._flash)
+
+        # a workspace hands every project its share of the machine
+        budget = os.environ.get('PLDUDE_PROCESSORS', '')
+        if budget.isdigit() and int(budget) > 0:
+            self._processors = min(int(self._processors or budget), int(budget))
+        jobs = os.environ.get('PLDUDE_JOBS', '')
+        if jobs.isdigit() and int(jobs) > 0:
+            self._jobs = min(int(project.get('jobs', jobs)), int(jobs))
 
         key_errors = []
         for key in self.REQUIRED_PROJ_PARAMS:
-            if not key in project.keys():
+            if not key in project.keys() and not (key == 'device' and self._matrix):
                 key_errors.append(key)
 
+        for i in self._matrix:
+            if type(i) != dict or not 'device' in i:
+                key_errors.append('matrix.device')
+                break
+
         if len(key_errors) != 0:
             raise PLDudeError("Missing project parameters: " + ', '.join(key_errors), 1)
+
+    def GetMatrix(self) -> list:
+        return self._matrix
+
+    def SetVariant(self, device : str, pinset : str = None):
+        self.device = device
+        self._variant = device
+        self._pinset = pinset
+        self._matrix = []
+        self._profiler = Profiler()
+        if self._trace:
+            self._trace = os.path.splitext(self._trace)[0] + '.' + device + os.path.splitext(self._trace)[1]
+
     def GetRemote(self) -> str:
         raise PLDudeError('Unknown Device! Cannot get remote programming URL!', 2)
 
+    def SetTrace(self, path : str):
+        self._trace = path
+
+    def SetProgramAll(self, val : bool, pattern : str = None):
+        self._program = val
+        self._program_all = val
+        if pattern is not None:
+            self._target_filter = pattern
+
+    def SetProgramFlash(self, val : bool):
+        self._program = val
+        self._program_flash = val
+
     def SetCompile(self, val : bool):
         self._compile = val
 
@@ -102,6 +339,27 @@ class BuildConfig(ResourceManager):
         self._simulate = val
         self._to_simulate = module
 
+    def SetSimulateAll(self, pattern : str):
+        # rejected up front, before any build or farm submission starts
+        try:
+            re.compile(pattern)
+        except re.error as err:
+            raise PLDudeError('Invalid --simulate-all pattern: ' + pattern + ' (' + str(err) + ')', 1)
+        self._simulate_all = pattern
+
+    def SetFarm(self, val : bool):
+        self._farm = val
+
+    def SetDevice(self, device : str):
+        # a single device of the matrix, how build workers receive matrix builds
+        if not self._matrix and device == self.device:
+            return
+        for i in self._matrix:
+            if i['device'] == device:
+                self.SetVariant(i['device'], i.get('pins', None))
+                return
+        raise PLDudeError('Device ' + device + ' is not part of the matrix in pldprj.yml', 2)
+
     def Clean(self, val : bool):
         self._clean = val
 
@@ -122,186 +380,640 @@ class BuildConfig(ResourceManager):
             raise PLDudeError("Verbosity expected to be: (DEBUG | INFO | WARNING | ERROR | CRITICAL)", 2)
 
     def GetSpecific(self) -> 'BuildConfig':
-        if self.device[0:3] == 'XC7':
-            self.__class__ = Xilinx7
-        elif self.device.upper()[0] == 'E' or self.device[0] == '5' or self.device[0:2] == '10':
-            self.__class__ = Altera
+        # only the backend the device needs is imported
+        backend = registry.Resolve(self.device)
+        if backend is not None:
+            self.__class__ = registry.Load(backend)
         return self
 
     def GetDirectory(self, module : str) -> str:
-        directory =  "./gen/" + self.__class__.__name__ + "/" + module
+        directory =  "./gen/" + self.__class__.__name__ + "/"
+        if self._variant:
+            directory += self._variant + "/"
+        directory += module
         if not os.path.exists(directory):
             os.makedirs(directory)
         return directory
 
-    def PrintLogs(self, logfile : IO[bytes]):
-        pass
+    def GetIndex(self) -> HdlIndex:
+        if self._index is None:
+            self._index = HdlIndex(self.GetDirectory('') + "hdlindex.bin", self.GetFingerprint().Digest)
+            self._index.Load()
+        return self._index
+
+    def PruneFiles(self, top : str) -> list:
+        index = self.GetIndex()
+        order = index.Closure(top, [i.dir for i in self._files])
+        index.Save()
+
+        if order is None:
+            self._logging.warning('Could not find ' + top + ' in the sources, using every source file')
+            return self._files
+
+        self._logging.debug('Using ' + str(len(order)) + ' of ' + str(len(self._files)) + ' source files reachable from ' + top)
+        files = dict([(i.dir, i) for i in self._files])
+        return [files[i] for i in order]
+
+    def GetPins(self) -> dict:
+        pinset = self._pinset or self.__class__.__name__
+        pins = self.pinconf.get(pinset, None)
+        if pins == None:
+            raise PLDudeError('Pin configuration does not exist for ' + pinset, 2)
+        return pins
+
+    def WriteIfChanged(self, path : str, content : str) -> str:
+        try:
+            with open(path, "r") as f:
+                if f.read() == content:
+                    return path
+        except OSError:
+            pass
+        with open(path, "w+") as f:
+            f.write(content)
+        return path
+
+    def ToolIdentity(self, executable : str) -> str:
+        # the installed build of a tool, cheap but only comparable on this machine
+        import shutil
+        path = shutil.which(executable)
+        if not path:
+            return ''
+        st = os.stat(path)
+        return path + ':' + str(st.st_size) + ':' + str(st.st_mtime_ns)
+
+    def ToolRelease(self, executable : str, args : list, pattern : str) -> str:
+        """The release a tool reports, identical releases match between machines.
+
+        Asking costs a tool start, so the answer is kept in ./gen/tools.json for
+        every installed build. Falls back to the local identity when the tool
+        does not answer.
+        """
+        identity = self.ToolIdentity(executable)
+        if not identity:
+            return ''
+        import json
+        path = './gen/tools.json'
+        try:
+            with open(path, 'r') as f:
+                known = json.load(f)
+        except (OSError, ValueError):
+            known = {}
+        if identity in known:
+            return known[identity]
+
+        self._logging.debug('Querying the release of ' + executable)
+        try:
+            proc = self._procman.Start([executable] + args, '.', timeout=60)
+        except OSError:
+            return identity
+        output = b''.join([i + b'\n' for i in proc]).decode(errors='replace')
+        proc.Wait()
+        match = re.search(pattern, output, re.MULTILINE)
+        if not match:
+            return identity
+
+        known[identity] = match.group(0).strip()
+        os.makedirs('./gen', exist_ok=True)
+        tmp = path + '.' + str(os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(known, f, indent=1)
+        os.replace(tmp, path)
+        return known[identity]
+
+    def GetToolVersion(self) -> str:
+        return ''
+
+    def GetProcessors(self) -> int:
+        # tool side threads, the machine unless a budget is configured
+        if self._processors:
+            return max(1, int(self._processors))
+        return os.cpu_count() or 1
+
+    def GetToolEnv(self, jobs : int = 1) -> dict:
+        # the threads each of jobs concurrent tool processes may use, scripts read PLDUDE_THREADS
+        return dict(os.environ, PLDUDE_THREADS=str(max(1, self.GetProcessors() // max(1, jobs))))
+
+    def WriteScripts(self) -> list:
+        return []
+
+    def GetScripts(self) -> list:
+        if self._scripts is None:
+            with self.Phase('generate scripts'):
+                self._scripts = self.WriteScripts()
+        return self._scripts
+
+    def GetFingerprint(self) -> FingerprintStore:
+        if self._fingerprint is None:
+            self._fingerprint = FingerprintStore(self.GetDirectory('') + "fingerprint.bin")
+            self._fingerprint.Load()
+        return self._fingerprint
+
+    def GetArtifacts(self) -> dict:
+        return {}
+
+    def GetFarmOutputs(self) -> tuple:
+        # files fetched back from a build worker, when the job passed and always
+        return list(self.GetArtifacts().values()) if self._compile else [], []
+
+    def GetArtifactCache(self) -> 'ArtifactCache':
+        if not self._cache_dir:
+            return None
+        from pldude.utils.artifacts import ArtifactCache
+        return ArtifactCache(os.path.expanduser(str(self._cache_dir)), int(self._cache_size) * 1024 * 1024)
+
+    def GetArtifactKey(self, cache : 'ArtifactCache') -> str:
+        return cache.Key(self.GetArtifactValues())
+
+    def GetArtifactValues(self) -> dict:
+        # sources by content and project relative path, so every checkout of a design shares its key
+        fingerprint = self.GetFingerprint()
+        sources = []
+        for i in self._files:
+            path = os.path.relpath(os.path.abspath(i.dir)).replace(os.sep, '/')
+            sources.append((path, i.type, (fingerprint.Digest(i.dir) or b'').hex()))
+        values = {
+            'build': self.GetFingerprintKey(),
+            'pins': self.GetPins(),
+            'sources': sources
+        }
+        if self._compress:
+            values['compress'] = True
+        return values
+
+    def FetchArtifacts(self, cache : 'ArtifactCache', key : str) -> bool:
+        placed = cache.Fetch(key, self.GetArtifacts())
+        if not placed:
+            return False
+        self._logging.info('Restored from artifact cache: ' + ', '.join(placed))
+        return True
+
+    def StoreArtifacts(self, cache : 'ArtifactCache', key : str):
+        artifacts = self.GetArtifacts()
+        if not self._cache_checkpoints:
+            artifacts = dict([i for i in artifacts.items() if not i[0].endswith('.dcp')])
+        try:
+            if cache.Store(key, artifacts, {'device': self.device, 'top': self.top}):
+                self._logging.debug('Stored ' + ', '.join(artifacts.keys()) + ' in artifact cache ' + cache.root)
+        except OSError as err:
+            self._logging.warning('Could not store artifacts in ' + cache.root + ': ' + str(err.strerror))
+
+    def RunStages(self, stages : list):
+        graph = StageGraph(self.GetFingerprint(), self._logging)
+        for i in stages:
+            graph.Add(i)
+
+        with self.Phase('check fingerprints'):
+            plan = graph.Plan()
+
+        cache = self.GetArtifactCache()
+        key = None
+        if cache:
+            with self.Phase('artifact cache'):
+                key = self.GetArtifactKey(cache)
+                if len(plan) != 0 and self.FetchArtifacts(cache, key):
+                    # stages whose outputs are restored count as built, and so do the
+                    # stages they were built from even when their checkpoints are not cached
+                    built = set()
+                    for i in reversed(plan):
+                        if i.name in built or not graph.Missing(i):
+                            built.add(i.name)
+                            built.update(i.deps)
+                    for i in plan:
+                        if i.name in built:
+                            graph.Commit(i)
+                    return
+
+        if len(plan) == 0:
+            self._logging.warning("Skipping synthesis: no changes detected")
+        else:
+            graph.Run(plan)
+            self._endargs['compile'] = True
+
+        if cache:
+            with self.Phase('artifact cache'):
+                self.StoreArtifacts(cache, key)
+
+    def GetFingerprintKey(self) -> dict:
+        return {
+            'backend': self.__class__.__name__,
+            'device': self.device,
+            'top': self.top,
+            'vhdl2008': self.vhdl_2008,
+            'tool': self.GetToolVersion()
+        }
+
+    def LogMessage(self, message : LogMessage):
+        if not self._logging.isEnabledFor(message.level):
+            return
+        param = ''
+        if message.id:
+            param = '[\u001b[94m' + message.id + '\u001b[0m] '
+        self._logging.log(message.level, param + message.text)
+
+    def ArchiveMessage(self, source : str, message : LogMessage):
+        if self._log_writer is not None:
+            self._log_writer.Add(CurrentStage() or source, message)
+
+    def PrintLogs(self, logfile : Union[IO[bytes], list], source : str = ''):
+        if self.LOG_PARSER is None:
+            for i in logfile:
+                pass
+            return
+
+        exit = False
+        writer = self._log_writer
+        stage = CurrentStage() or source
+        batch = []
+        try:
+            for i in self.LOG_PARSER(self._ignore, writer is not None).Parse(logfile):
+                if writer is not None:
+                    # archived in batches, the writer is shared by concurrent stages
+                    batch.append(i)
+                    if len(batch) >= 1024:
+                        writer.Extend(stage, batch)
+                        batch = []
+                    if i.ignored:
+                        continue
+                exit = exit or i.fatal
+                self.LogMessage(i)
+        finally:
+            if batch:
+                writer.Extend(stage, batch)
+        if exit:
+            sys.exit(2)
+
+    def CheckCancelled(self):
+        if self._cancel is not None and self._cancel.is_set():
+            raise PLDudeError('Build cancelled', 0, logging.WARNING)
+
+    def Cancel(self):
+        if self._cancel is not None:
+            self._cancel.set()
+        self.Terminate()
 
     def Terminate(self):
-        for i in self._subprocesses:
-            if not i.poll():
-                i.terminate()
+        self._procman.Terminate()
+
+    def GetTimeout(self, step : str) -> float:
+        return self._timeouts.get(step, None)
+
+    def Phase(self, name : str, category : str = 'pldude'):
+        return self._profiler.Phase(name, category)
 
-    def RunSubprocess(self, msg : str, cwd : str, args : list, block : bool = True, user_input : bool = False):
+    def WriteTrace(self):
+        if not self._trace or len(self._profiler.events) == 0:
+            return
+        self._profiler.WriteTrace(self._trace)
+        for i in self._profiler.Summary():
+            self._logging.info(i)
+        self._logging.info("Trace written to " + self._trace)
+
+    def Collect(self, msg : str, proc : ManagedProcess, start : float):
+        try:
+            with self.Phase('parse logs: ' + proc.name, 'parse'):
+                self.PrintLogs(proc, proc.name)
+            proc.Wait()
+        finally:
+            if proc.done.is_set():
+                self._profiler.RecordProcess(msg.rstrip('.'), start, proc.popen, proc.rusage)
+        self.CheckCancelled()
+        if proc.timed_out:
+            raise PLDudeError(proc.name + ' timed out after ' + str(proc.timeout) + ' seconds', 2)
+
+    def RunSubprocess(self, msg : str, cwd : str, args : list, block : bool = True, user_input : bool = False, timeout : float = None) -> ManagedProcess:
         self._logging.info(msg)
-        if user_input:
-            proc_stdin = subprocess.PIPE
-        else:
-            proc_stdin = subprocess.DEVNULL
-        subproc = subprocess.Popen(
-            args,
-            cwd=cwd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=proc_stdin
-        )
-        self._subprocesses.append(subproc)
+        start = time.perf_counter()
+        # background servers are drained to the debug log, nobody else reads them
+        sink = None
+        if not block and not user_input:
+            sink = lambda line: self._logging.debug(line.decode(errors='replace').rstrip())
+        proc = self._procman.Start(args, cwd, user_input, sink, timeout, self.GetToolEnv())
         if block:
-            self.PrintLogs(subproc.stdout)
-        return subproc
+            self.Collect(msg, proc, start)
+        return proc
+
+    def RunConcurrent(self, steps : list, limit : int = None):
+        # steps of (msg, cwd, args, timeout) that do not depend on each other
+        slots = threading.BoundedSemaphore(max(1, limit or len(steps)))
+        env = self.GetToolEnv(min(limit or len(steps), len(steps)))
+        errors = []
+        stage = CurrentStage()
+        def Worker(msg : str, cwd : str, args : list, timeout : float):
+            EnterStage(stage)
+            with slots:
+                try:
+                    self.CheckCancelled()
+                    self._logging.info(msg)
+                    start = time.perf_counter()
+                    self.Collect(msg, self._procman.Start(args, cwd, timeout=timeout, env=env), start)
+                except BaseException as err:
+                    errors.append(err)
+
+        threads = [threading.Thread(target=Worker, args=i) for i in steps]
+        for i in threads:
+            i.start()
+        for i in threads:
+            i.join()
+        if errors:
+            raise errors[0]
+
+    def OpenSession(self, cwd : str, args : list, prompt : bytes = b'') -> TclSession:
+        session = TclSession(args, cwd, prompt, self.GetToolEnv())
+        self._procman.Adopt(session.proc)
+        return session
+
+    def CloseSession(self, session : TclSession):
+        self._profiler.RecordProcess('session: ' + session.proc.args[0], session.start, session.proc, session.Close())
+
+    def RunSession(self, msg : str, session : TclSession, command : str, timeout : float = None):
+        self._logging.info(msg)
+        start = time.perf_counter()
+        # a session cannot be interrupted mid command, a timeout costs the whole session
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, SignalGroup, (session.proc, True))
+            timer.daemon = True
+            timer.start()
+        try:
+            with self.Phase('parse logs: ' + session.proc.args[0], 'parse'):
+                self.PrintLogs(session.Execute(command), session.proc.args[0])
+        except PLDudeError:
+            self.CheckCancelled()
+            if timer and not timer.is_alive():
+                raise PLDudeError(session.proc.args[0] + ' timed out after ' + str(timeout) + ' seconds', 2)
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+            self._profiler.Record(msg.rstrip('.'), 'session', start, time.perf_counter(), None, None, session.proc.pid)
+        if session.status != 0:
+            raise PLDudeError("Tool command failed: " + (session.error or command), 2)
 
     def run(self):
-        if self.mode == "MIXED":
-            glob_ext = "/**/*[.vhd,.vhdl,.v]"
-        elif self.mode == "VHDL":
-            glob_ext = "/**/*[.vhd,.vhdl]"
-        elif self.mode == "VERILOG":
-            glob_ext = "/**/*.v"
-        else:
+        extensions = self.FILE_TYPES.get(self.mode, None)
+        if extensions is None:
             raise PLDudeError("Unknown file type: " + self.mode, 2)
-        glob_dir = self.src_dir + glob_ext
-        files = glob.glob(glob_dir, recursive=True)
 
-        if self._platform_dir:
-            files.extend(glob.glob(self._platform_dir + "/" + self.__class__.__name__ + glob_ext))
+        with self.Phase('discover sources'):
+            walker = SourceWalker(self.GetDirectory('') + "discovery.bin", extensions, self._exclude, ['./gen'])
+            walker.Load()
+            files = walker.Walk(self.src_dir)
+            if self._platform_dir:
+                files.extend(walker.Walk(self._platform_dir + "/" + self.__class__.__name__))
+            walker.Save()
 
         self._files = []
-        for i in files:
-            ext = os.path.splitext(i)[1]
-            path = os.path.abspath(i)
+        for path in files:
+            ext = os.path.splitext(path)[1]
             if ext in ('.vhd', '.vhdl'):
                 self._files.append(RepFile(path, 'VHDL'))
             elif ext == '.v':
                 self._files.append(RepFile(path, 'VERILOG'))
 
-
-        update = False
-        timestamps_yml = {}
-        if os.path.exists("./gen/timestamp.yml"):
-            timestamps = open("./gen/timestamp.yml", "r")
-            timestamps_yml = dict(yaml.load(timestamps, Loader=yaml.FullLoader))
-            update = update or (timestamps_yml.get(os.path.abspath('./pinprj.yml'), None) != int(os.path.getmtime(os.path.abspath('./pinprj.yml'))))
-            update = update or (timestamps_yml.get(os.path.abspath('./pldprj.yml'), None) != int(os.path.getmtime(os.path.abspath('./pldprj.yml'))))
-            for i in self._files:
-                if int(os.path.getmtime(i.dir)) != timestamps_yml.get(i.dir, None):
-                    update = True
-                    timestamps.close()
-                    break
-            timestamps.close()
-        else:
-            update = True
+        # the worker discovers and prunes the shipped sources itself
+        remote = self._farm and (self._compile or self._simulate_all is not None)
+        if remote:
+            from pldude.bconfigs.farm import FarmClient
+            FarmClient(self).run()
+        elif self._prune and (self._compile or self._program or self._simulate):
+            with self.Phase('index sources'):
+                self._files = self.PruneFiles(self._to_simulate if self._simulate else self.top)
+
+        if not remote:
+            self.OpenLogArchive()
+        status = 'failed'
         try:
-            if self._simulate:
+            if self._simulate_all is not None:
+                if not remote:
+                    self.SimulateAll()
+            elif self._simulate:
                 self.simulate()
             else:
-                if self._compile and update:
+                if self._compile and not remote:
                     self.compile()
-                elif self._compile:
-                    self._logging.warning("Skipping synthesis: no changes detected")
 
-                if self._program:
+                if self._program_all:
+                    from pldude.bconfigs.rack import ProgramRack
+                    ProgramRack(self).run()
+                elif self._program:
                     self.program()
 
             if self._clean and self._compile and not self._program:
                 self._logging.warning("Skipping clean: compile flag set without program flag")
             elif self._clean and not self._compile:
-                if not os.path.exists('./gen'):
-                    raise PLDudeError('Nothing to clean', 0, logging.INFO)
-                self._logging.info('Cleaning...')
-                try:
-                    shutil.rmtree('./gen', ignore_errors=True)
-                    sys.exit(0)
-                except OSError as err:
-                    raise PLDudeError(err.strerror, 2)
+                self.CleanGenerated()
+            status = 'ok'
 
         except PLDudeError as err:
+            if self._cancel is not None and self._cancel.is_set():
+                status = 'cancelled'
             raise err
+        finally:
+            self.CloseLogArchive(status)
 
-        timestamps_yml.update({
-            os.path.abspath('./pinprj.yml') : int(os.path.getmtime('./pinprj.yml')),
-            os.path.abspath('./pldprj.yml') : int(os.path.getmtime('./pldprj.yml'))
-        })
+    def GetLogArchive(self) -> LogArchive:
+        return LogArchive(self.GetDirectory('logs'), self._log_history)
 
-        if self._endargs.get('compile', False):
-            for i in self._files:
-                timestamps_yml.update({
-                    i.dir: int(os.path.getmtime(i.dir))
-                })
+    def OpenLogArchive(self):
+        if not (self._compile or self._program or self._simulate or self._simulate_all is not None):
+            return
+        try:
+            self._log_writer = self.GetLogArchive().Open({
+                'command': sys.argv[1:],
+                'device': self.device,
+                'variant': self._variant,
+                'top': self.top
+            }, dict([(k, v[0]) for k, v in self.LOG_PARSER.SEVERITIES.items()]) if self.LOG_PARSER else {})
+        except OSError as err:
+            # a build without its archive is still a build
+            self._logging.warning('Cannot archive build logs: ' + str(err))
+
+    def CloseLogArchive(self, status : str):
+        writer = self._log_writer
+        self._log_writer = None
+        if writer is not None:
+            try:
+                writer.Close(status)
+            except OSError as err:
+                self._logging.warning('Cannot archive build logs: ' + str(err))
+
+    def GetWatched(self) -> tuple:
+        dirs = [self.src_dir]
+        if self._platform_dir:
+            dirs.append(self._platform_dir + "/" + self.__class__.__name__)
+        return dirs, [os.path.abspath('./pldprj.yml'), os.path.abspath('./pinprj.yml')]
 
-            timestamps = open("./gen/timestamp.yml", "w+")
-            yaml.dump(timestamps_yml, timestamps)
-            timestamps.close()
+    def WatchBuild(self):
+        try:
+            self.run()
+            self._logging.info('Build finished')
+        except PLDudeError as err:
+            self._logging.log(err.level, err.reason)
+        except SystemExit:
+            self._logging.error('Build failed')
 
-    def program(self):
-        raise PLDudeError("Unknown device! Cannot program!", 3)
+    def Watch(self):
+        if not (self._compile or self._program or self._simulate or self._simulate_all is not None):
+            self._compile = True
 
-    def compile(self):
-        raise PLDudeError("Unknown device! Cannot synthesize", 3)
+        self._cancel = threading.Event()
+        self._keep_session = True
 
-    def simulate(self):
-        raise PLDudeError("Unknown device! Cannot simulate", 3)
+        dirs, configs = self.GetWatched()
+        from pldude.utils.watch import CreateWatcher, Debounce
+        watcher = CreateWatcher(dirs, configs, self.FILE_TYPES.get(self.mode, ()), ['./gen'])
+        self._logging.info('Watching ' + ', '.join(dirs) + ' (' + watcher.__class__.__name__ + ')')
 
-class Device():...
+        try:
+            while True:
+                self._cancel.clear()
+                build = threading.Thread(target=self.WatchBuild, daemon=True)
+                build.start()
+
+                changed = set()
+                while build.is_alive():
+                    changed = watcher.Wait(0.2)
+                    if changed:
+                        self._logging.warning('Sources changed, cancelling build...')
+                        self.Cancel()
+                        break
+                build.join()
+
+                if not changed:
+                    self._logging.info('Waiting for changes...')
+                    while not changed:
+                        changed = watcher.Wait(None)
+                changed |= Debounce(watcher, self._debounce)
+                self._logging.info(str(len(changed)) + ' file(s) changed, rebuilding...')
+
+                if set(configs) & changed:
+                    self.LoadConfig()
+                    self.GetSpecific()
+                self._scripts = None
+                self._fingerprint = None
+                self._index = None
+                self._ooc_blocks = None
+                self._endargs = {}
+        finally:
+            watcher.Close()
+            if self._compile_session:
+                self.CloseSession(self._compile_session)
+
+    def GetBitfile(self) -> str:
+        raise PLDudeError("Unknown device! Cannot program!", 3)
 
-class Xilinx7Device(Device):
-    def __init__(self, target : str, device : str):
-        self.target = target
-        self.device = device
+    def HardwareServer(self):
+        return contextlib.nullcontext()
+
+    def GetProgramFiles(self) -> dict:
+        # derived format -> path, written next to the bitfile it is converted from
+        base = os.path.splitext(self.GetBitfile())[0]
+        return dict([(i, base + '.' + i) for i in self._program_files])
+
+    def ConvertBitfile(self, fmt : str, path : str):
+        raise PLDudeError("Unknown device! Cannot convert bitfile", 3)
+
+    def BuildProgramFiles(self):
+        # one stage per derived file, it only reruns when the content of the bitfile changed
+        files = self.GetProgramFiles()
+        derived = [i for i in sorted(self.PROGRAM_FORMATS) if i != os.path.splitext(self.GetBitfile())[1][1:]]
+        unknown = [i for i in files if not i in derived]
+        if unknown:
+            raise PLDudeError('Unknown program_files format ' + ', '.join(unknown) + ', ' + self.__class__.__name__ + ' writes ' + ', '.join(derived), 1)
+        if not files or not os.path.exists(self.GetBitfile()):
+            return
+
+        cache = self.GetArtifactCache()
+        graph = StageGraph(self.GetFingerprint(), self._logging)
+        for fmt, path in sorted(files.items()):
+            values = {
+                'format': fmt,
+                'compress': self._compress,
+                'flash': self._flash,
+                'tool': self.GetToolVersion()
+            }
+            graph.Add(Stage(
+                'convert:' + fmt,
+                lambda fmt=fmt, path=path, values=values: self.ConvertCached(cache, fmt, path, values),
+                inputs = [self.GetBitfile()],
+                values = values,
+                outputs = [path]
+            ))
+        graph.Run(graph.Plan())
+
+    def ConvertCached(self, cache : 'ArtifactCache', fmt : str, path : str, values : dict):
+        # the artifact cache shares conversions of the same bitfile between builds
+        name = os.path.basename(path)
+        shared = None
+        if cache:
+            shared = cache.Key(dict(values, parent=(self.GetFingerprint().Digest(self.GetBitfile()) or b'').hex()))
+            if cache.Fetch(shared, {name: path}):
+                self._logging.info('Restored ' + name + ' from artifact cache')
+                return
+        self.ConvertBitfile(fmt, path)
+        if cache:
+            try:
+                cache.Store(shared, {name: path}, {'device': self.device, 'format': fmt})
+            except OSError as err:
+                self._logging.warning('Could not store ' + name + ' in artifact cache ' + cache.root + ': ' + str(err.strerror))
+
+    def GetProgramFile(self) -> str:
+        # of the files the mode can load, the smallest transfers fastest
+        if self._program_file is not None:
+            return self._program_file
+        self.BuildProgramFiles()
+        mode = 'flash' if self._program_flash else 'jtag'
+        files = dict(self.GetProgramFiles())
+        files[os.path.splitext(self.GetBitfile())[1][1:]] = self.GetBitfile()
+        candidates = [path for fmt, path in files.items() if self.PROGRAM_FORMATS.get(fmt, None) == mode and os.path.exists(path)]
+        if not candidates and self._program_flash:
+            formats = [i for i in sorted(self.PROGRAM_FORMATS) if self.PROGRAM_FORMATS[i] == mode]
+            raise PLDudeError('No flash image to program, add ' + ' or '.join(formats) + ' to program_files', 1)
+        if not candidates:
+            raise PLDudeError('No bitfile to program at ' + self.GetBitfile(), 2)
+        self._program_file = min(candidates, key=lambda i: (os.path.getsize(i), i))
+        if len(candidates) > 1:
+            self._logging.info('Programming with ' + os.path.basename(self._program_file) + ', the smallest of ' + ', '.join(sorted([os.path.basename(i) for i in candidates])))
+        return self._program_file
+
+    def ReportTransfer(self, device : 'Device', path : str, elapsed : float):
+        size = os.path.getsize(path) / 1024
+        self._logging.info('Programmed ' + str(device) + ' with ' + os.path.basename(path) + (' (%.0f KB) in %.1fs, %.0f KB/s' % (size, elapsed, size / max(elapsed, 0.001))))
+
+    def ScanTargets(self) -> list:
+        raise PLDudeError("Unknown device! Cannot program!", 3)
 
-    def __repr__(self) -> str:
-        if type(self.device) == list:
-            return self.target + " (" + ' '.join(self.device) + ")"
-        elif type(self.device) == str:
-            return self.target + " (" + self.device + ")"
+    def ProgramTarget(self, device : 'Device'):
+        raise PLDudeError("Unknown device! Cannot program!", 3)
 
-class Xilinx7(BuildConfig):
-    def GetRemote(self) -> str:
-        if self._remote == 'DEFAULT':
-            return 'localhost:3121'
-        return self._remote
-
-    def ListDevices(self) -> Xilinx7Device:
-        program_dir = self.GetDirectory('program')
-        self._logging.info('Getting list of JTAG Devices...')
-
-        hw_devices_prog = subprocess.Popen(
-            ['vivado.bat', '-mode', 'tcl'],
-            cwd = program_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE
-        )
-
-        scan_for_devices = self.GetResource("scan_for_devices.tcl")
-        hw_devices_prog.stdin.write(b'open_hw\n')
-        hw_devices_prog.stdin.write(b'connect_hw_server -url ' + self.GetRemote().encode() + b'\n')
-        hw_devices_prog.stdin.write(scan_for_devices.read().encode())
-        scan_for_devices.close()
-
-        output_prog = hw_devices_prog.communicate()[0].decode()
+    def MatchesPart(self, name : str) -> bool:
+        # chain entries name the die (xc7a35t_0, 10M08SA(.|ES)/10M08SC), the project a full part number
+        device = self.device.lower()
+        return any([len(i) >= 4 and device.startswith(i) for i in re.split('[^0-9a-z]+', name.lower())])
 
+    def ParseDevices(self, lines : Iterable[bytes], cls : type) -> list:
         devices = None
-        for i in output_prog.split('\r\n'):
-            match = re.match("PLDUDE:(.*)", i)
-            if match:
-                if match.group(1) == 'BEGIN':
-                    devices = []
-                elif match.group(1) == 'END':
-                    break
-            elif type(devices) == list:
-                params = i.split(' ')
-                devices.append(Xilinx7Device(params[0], params[1:]))
+        for i in lines:
+            i = i.decode(errors='replace').rstrip('\r\n')
+            match = re.search("PLDUDE:(BEGIN|END|TARGET|DEVICE) ?(.*)", i)
+            if not match:
+                continue
+            if match.group(1) == 'BEGIN':
+                devices = []
+            elif match.group(1) == 'END':
+                break
+            elif devices is None:
+                continue
+            elif match.group(1) == 'TARGET':
+                devices.append(cls(match.group(2).strip(), []))
+            elif len(devices) > 0:
+                devices[-1].device.append(match.group(2).strip())
 
+        if devices is None:
+            raise PLDudeError('Could not scan for JTAG devices', 2)
+        return devices
+
+    def SelectDevice(self, devices : list) -> 'Device':
         if len(devices) > 1:
             print('Select a target:')
             for i in range(0, len(devices)):
@@ -323,228 +1035,70 @@ class Xilinx7(BuildConfig):
         elif len(devices[target].device) == 1:
             device = 0
             self._logging.info('Singular device found, selecting ' + str(devices[target].device[0]))
+        else:
+            raise PLDudeError('No devices found on ' + devices[target].target, 0, logging.WARNING)
 
+        # position in the JTAG chain, quartus_pgm addresses devices by it
+        devices[target].index = device + 1
         devices[target].device = devices[target].device[device]
         return devices[target]
 
-    def PrintLogs(self, logfile : Union[IO[bytes], list]):
-        exit = False
-        for i in logfile:
-            vivado_match = re.match("(INFO|WARNING|ERROR|CRITICAL): \[(.*)] (.*)", i.decode())
-            if vivado_match:
-                match = False
-                for x in self._ignore:
-                    if re.match(x, vivado_match.group(2)):
-                        match = True
-                        break
-                if match and vivado_match.group(1) == 'WARNING':
-                    continue
-                
-                vivado_param = '[\u001b[94m' + vivado_match.group(2) + '\u001b[0m] '
-                # bring tool info level messages downto debug for PLDude
-                if vivado_match.group(1) == 'INFO':
-                    self._logging.debug(vivado_param + vivado_match.group(3))
-                else:
-                    exit = exit or vivado_match.group(1) in ('ERROR', 'CRITICAL')
-                    getattr(self._logging, vivado_match.group(1).lower())(vivado_param + vivado_match.group(3))
-        if exit:
-            sys.exit(2)
-
-    def compile(self):
-        compile_dir = self.GetDirectory("compile")
-        bitfile_dir = self.GetDirectory("compile/bitfile")
-
-        xilinx7_synthfile = open(compile_dir + "/synth.tcl", "w+")
-        self._logging.info("Writing to TCL script...")
-
-        xilinx7_synthfile.write("create_project -in_memory -part \"" + self.device + "\"\n")
-        if self.vhdl_2008:
-            xilinx7_synthfile.write("set_property enable_vhdl_2008 1 [current_project]\n")
-
-        for i in self._files:
-            file_ext = os.path.splitext(i.dir)
-            if len(file_ext) < 2:
-                continue
-
-            if file_ext[1] in (".vhd", ".vhdl"):
-                file_args = ""
-                if self.vhdl_2008:
-                    file_args = '-vhdl2008 '
-                xilinx7_synthfile.write("read_vhdl " + file_args + str(i.dir).replace('\\', '/') + "\n")
-            elif file_ext[1] in (".v"):
-                xilinx7_synthfile.write("read_verilog " + str(i.dir).replace('\\', '/') + "\n")
-
-        self._logging.info("Configuring synthesis...")
-
-        xilinx7_synthfile.write("synth_design -flatten_hierarchy none -top " + self.top + " -part " + self.device + "\n")
-        xilinx7_synthfile.write("opt_design -retarget -propconst -bram_power_opt -verbose\n")
-        xilinx7_synthfile.write("write_checkpoint -incremental_synth -force ./post_synth.dcp\n")
-
-        xilinx7_synthfile.close()
-
-        self._logging.info("Configuring place and route...")
-        xilinx7_parfile = open(compile_dir + "/par.tcl", "w+")
-        xilinx7_parfile.write("open_checkpoint ./post_synth.dcp\n")
-        xilinx7_parfile.write("read_xdc ./pins.xdc\n")
-        xilinx7_parfile.write("place_design\n")
-        xilinx7_parfile.write("route_design -directive Explore\n")
-        xilinx7_parfile.write("write_checkpoint -force ./post_par.dcp\n")
-
-        xilinx7_parfile.close()
-
-        self._logging.info("Configuring bitstream write...")
-        xilinx7_bitfile = open(compile_dir + "/bit.tcl", "w+")
-        xilinx7_bitfile.write("open_checkpoint ./post_par.dcp\n")
-        xilinx7_bitfile.write("write_bitstream -force ./bitfile/project.bit\n")
-        xilinx7_bitfile.close()
-
-        self._logging.info("Generating XDC file...")
-        xilinx7_xstfile = open(compile_dir + "/pins.xdc", "w+")
-        xilinx7_xstfile.write('set_property CFGBVS VCCO [current_design];\n')
-        xilinx7_xstfile.write('set_property CONFIG_VOLTAGE 3.3 [current_design];\n')
-        for i in self.pinconf.get('Xilinx7').items():
-            if type(i[1]) == str:
-                xilinx7_xstfile.write("set_property -dict { PACKAGE_PIN " + str(i[1]) + " IOSTANDARD LVCMOS33 } [get_ports { " + str(i[0]) + " }];\n")
-            elif type(i[1]) == dict:
-                xilinx7_xstfile.write("set_property -dict { PACKAGE_PIN " + str(i[1]['pkg']) + " IOSTANDARD " + str(i[1]['iostd']) + " } [get_ports { " + str(i[0]) + " }];\n")
-        xilinx7_xstfile.close()
-
-        self.RunSubprocess("Executing synthesis...", compile_dir, ['vivado.bat', '-mode', 'batch', '-source', './synth.tcl'])
-        self.RunSubprocess("Executing place and route...", compile_dir, ['vivado.bat', '-mode', 'batch', '-source', './par.tcl'])
-        self.RunSubprocess("Executing bitstream generation...", compile_dir, ['vivado.bat', '-mode', 'batch', '-source', './bit.tcl'])
-
-        self._endargs.update({
-            'compile': True
-        })
+    def GetTopology(self) -> 'TopologyCache':
+        from pldude.utils.topology import TopologyCache
+        return TopologyCache(self.GetDirectory('program') + '/topology.json', float(self._scan_ttl))
+
+    def ProgramCached(self, scan : Callable[[], list], program : Callable[['Device'], None]):
+        remote = self.GetRemote()
+        topology = self.GetTopology()
+        entry = topology.Get(remote)
+        if entry is not None:
+            device = Device(entry['target'], entry['device'])
+            device.index = entry.get('index', 1)
+            self._logging.info('Using cached JTAG target ' + str(device) + ', set scan_ttl to 0 to always rescan')
+            try:
+                program(device)
+                return
+            except (PLDudeError, SystemExit):
+                # the board was unplugged or swapped since the last scan
+                self._logging.warning('Programming the cached target failed, rescanning...')
+                topology.Invalidate(remote)
+
+        device = self.SelectDevice(scan())
+        topology.Put(remote, {'target': device.target, 'device': device.device, 'index': device.index})
+        program(device)
+
+    def CleanGenerated(self):
+        if not os.path.exists('./gen'):
+            raise PLDudeError('Nothing to clean', 0, logging.INFO)
+        self._logging.info('Cleaning...')
+        try:
+            import shutil
+            shutil.rmtree('./gen', ignore_errors=True)
+            sys.exit(0)
+        except OSError as err:
+            raise PLDudeError(err.strerror, 2)
 
     def program(self):
-        program_dir = self.GetDirectory('program')
-        hw_server_prog = self.RunSubprocess('Starting JTAG hardware server...', program_dir, ['hw_server.bat'], False)
-
-        device = self.ListDevices()
-
-        if not os.path.exists(self.GetDirectory('compile/bitfile') + '/project.bit'):
-            self.compile()
-
-        hw_client_prog = self.RunSubprocess('Programming device...', program_dir, ['vivado.bat', '-mode', 'tcl'], False, True)
-
-        hw_client_prog.stdin.write(b'open_hw\n')
-        hw_client_prog.stdin.write(b'connect_hw_server -url ' + self.GetRemote().encode() + b'\n')
-        hw_client_prog.stdin.write(b'current_hw_target ' + device.target.encode() + b'\n')
-        hw_client_prog.stdin.write(b'open_hw_target\n')
-        hw_client_prog.stdin.write(b'current_hw_device [get_hw_devices -of_objects [current_hw_target]]\n')
-        hw_client_prog.stdin.write(b'set_property PROGRAM.FILE {../compile/bitfile/project.bit} [current_hw_device]\n')
-        hw_client_prog.stdin.write(b'program_hw_devices [current_hw_device]\n')
-
-        self.PrintLogs(hw_client_prog.communicate()[0].split(b'\r\n'))
-
-        hw_client_prog.terminate()
-        hw_server_prog.terminate()
-        self._endargs.update({
-            'program': True
-        })
-        
-    def simulate(self):
-        sim_dir = self.GetDirectory("simulation")
-        sim_file = open(sim_dir + "/sim.prj", "w+")
-        self._logging.info("Writing simulation project file...")
-
-        for i in self._files:
-            file_ext = os.path.splitext(i.dir)
-            if len(file_ext) < 2:
-                continue
-
-            file_line = "work " + str(i.dir).replace('\\', '/') + "\n"
-            if file_ext[1] in (".vhd", ".vhdl"):
-                if self.vhdl_2008:
-                    file_line = "vhdl2008 " + file_line
-                else:
-                    file_line = "vhdl " + file_line
-            elif file_ext[1] == ".v":
-                file_line = "verilog " + file_line
-
-            sim_file.write(file_line)
-
-
-        sim_file.close()
-
-        if not os.path.exists(sim_dir + "/bat.tcl"):
-            self._logging.info("Writing tcl batch file...")
-            file_tcl = open(sim_dir + "/bat.tcl", "w+")
-            file_tcl.write("create_wave_config; add_wave /; set_property needs_save false [current_wave_config]")
-            file_tcl.close()
-
-        self.RunSubprocess('Executing xelab...', sim_dir, ["xelab.bat", "-prj", "./sim.prj", "-debug", "typical", "-s", "sim.out", "work." + self._to_simulate])
-
-        self._logging.info('Executing iSim...')
-        isim_prog = subprocess.Popen(
-            ['xsim.bat', 'sim.out', '-gui', '-tclbatch', './bat.tcl'],
-            cwd = sim_dir,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            stdin=subprocess.DEVNULL
-        )
-        isim_prog.wait()
-        self._endargs.update({
-            'simulate': True
-        })
-
-class AlteraDevice(Device):...
-
-class Altera(BuildConfig):
-    def PrintLogs(self, logfile : Union[IO[bytes], list]):
-        regex = re.compile('^(Info|(?:Critical )?Warning|Error|Critical)[:]? (?:\\((.*)\\): )?(.*)')
-        exit = False
-        for i in logfile:
-            m = regex.match(i.decode())
-            if m:
-                altera_param = ''
-                if m.group(2):
-                    altera_param = '[\u001b[94m' + m.group(2) + '\u001b[0m] '
-                if m.group(1) == 'Info':
-                    if m.group(3)[0:5] != '*****':
-                        self._logging.debug(altera_param + m.group(3))
-                    continue
-                elif m.group(1) == 'Critical Warning':
-                    self._logging.warning(altera_param + m.group(3))
-                    continue
-                exit = exit or m.group(1).upper() in ('ERROR', 'CRITICAL')
-                getattr(self._logging, m.group(1).lower())(altera_param + m.group(3))
-        
-        if exit:
-            sys.exit(2)
+        raise PLDudeError("Unknown device! Cannot program!", 3)
 
     def compile(self):
-        compile_dir = self.GetDirectory('compile')
-        bitfile_dir = self.GetDirectory('compile/bitfile')
-
-        pins = ['quartus_sh', '-t', os.path.abspath(self.GetResourceDir('qsf.tcl')), self.device, self.top]
-        altera_pconf = self.pinconf.get(self.__class__.__name__, None)
-        if altera_pconf == None:
-            raise PLDudeError('Pin configuration does not exist for ' + self.__class__.__name__, 2)
-        for i in self.pinconf[self.__class__.__name__].items():
-            data = 'IO;' + i[0] + ';'
-            if type(i[1]) == dict:
-                data += ';'.join(list(i[1].values()))
-            elif type(i[1]) == str:
-                data += i[1] + ';LVCMOS'
-            else:
-                raise PLDudeError('Unknown type!', 2)
+        raise PLDudeError("Unknown device! Cannot synthesize", 3)
 
-        for i in self._files:
-            pins.append("FILE;" + i.type.upper() + ';' + i.dir)
+    def simulate(self):
+        raise PLDudeError("Unknown device! Cannot simulate", 3)
 
-        self.RunSubprocess('Creating quartus project...', compile_dir, pins)
-        self.RunSubprocess('Executing synthesis...', compile_dir, ['quartus_map', 'project'])
-        self.RunSubprocess('Executing fitter...', compile_dir, ['quartus_fit', 'project'])
-        self.RunSubprocess('Executing assembler...', compile_dir, ['quartus_asm', 'project'])
+    def SimulateAll(self):
+        raise PLDudeError("Unknown device! Cannot simulate", 3)
 
-        if os.path.exists(bitfile_dir + '/project.sof'):
-            os.remove(bitfile_dir + '/project.sof')
-        os.rename(compile_dir + '/project.sof', bitfile_dir + '/project.sof')
-        self._endargs['compile'] = True
+class Device():
+    def __init__(self, target : str, device : Union[str, list]):
+        self.target = target
+        self.device = device
+        self.index = 1
+        self.remote = None
 
-    def program(self):
-        bitfile_dir = self.GetDirectory('compile/bitfile')
-        self.RunSubprocess('Executing programmer...', bitfile_dir, ['quartus_pgm', '-m', 'JTAG', '-o', 'p;./project.sof'])
-        self._endargs['program'] = True
\ No newline at end of file
+    def __repr__(self) -> str:
+        if type(self.device) == list:
+            return self.target + " (" + ' '.join(self.device) + ")"
+        elif type(self.device) == str:
+            return self.target + " (" + self.device + ")"
@@ -0,0 +1,260 @@
+import os
+import zlib
+import socket
+import hashlib
+import logging
+
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from pldude.utils.error import PLDudeError
+from pldude.utils.wire import Connection
+from pldude.utils.worker import SafePath
+from pldude.bconfigs.rack import PrefixAdapter
+
+class WorkerState():
+    def __init__(self, address : str, conn : Connection, status : dict):
+        self.address = address
+        self.conn = conn
+        self.status = status
+        self.name = status.get('name', address) + ' (' + address + ')'
+
+class FarmClient():
+    """Runs the compile or the simulation of a project on the least loaded build worker.
+
+    Every worker in 'workers' is asked for its status at once, the job goes to
+    the one with a free slot and license and the lowest load. Sources are
+    shipped by content digest, so only files the worker has never seen travel.
+    The worker's log is replayed into the local log as it arrives and the
+    outputs are fetched back into ./gen, where programming picks them up.
+    """
+
+    CONNECT_TIMEOUT = 5.0
+
+    def __init__(self, bconf):
+        self._bconf = bconf
+        self._logging = bconf._logging
+
+    def GetWorkers(self) -> List[str]:
+        workers = os.environ.get('PLDUDE_WORKERS', '') or self._bconf._workers
+        if type(workers) == str:
+            workers = workers.split(',')
+        workers = [str(i).strip() for i in workers if str(i).strip()]
+        if not workers:
+            raise PLDudeError('No build workers configured, set workers in pldprj.yml or PLDUDE_WORKERS', 2)
+        return workers
+
+    def Relative(self, path : str) -> str:
+        relative = os.path.relpath(os.path.abspath(path)).replace(os.sep, '/')
+        if not SafePath(relative):
+            raise PLDudeError('Remote builds need every file inside the project directory: ' + path, 2)
+        return relative
+
+    def Manifest(self) -> List[Tuple[str, str]]:
+        # the discovered sources and the configuration, by content
+        fingerprint = self._bconf.GetFingerprint()
+        paths = [i.dir for i in self._bconf._files] + [i for i in self._bconf.CONFIG_FILES if os.path.exists(i)]
+        manifest = {}
+        for path in paths:
+            digest = fingerprint.Digest(path)
+            if digest is None:
+                raise PLDudeError('Cannot read ' + path, 2)
+            manifest[self.Relative(path)] = digest.hex()
+        return sorted(manifest.items())
+
+    def GetProject(self) -> str:
+        # one workspace per checkout on every worker
+        return hashlib.blake2b((socket.gethostname() + ':' + os.path.abspath('.')).encode(), digest_size=16).hexdigest()
+
+    def Poll(self, address : str) -> Optional[WorkerState]:
+        try:
+            conn = Connection.Connect(address, self.CONNECT_TIMEOUT)
+        except (OSError, PLDudeError) as err:
+            self._logging.warning('Worker ' + address + ' is unreachable: ' + str(err))
+            return None
+        try:
+            conn.Send('hello', version=Connection.VERSION, token=os.environ.get('PLDUDE_FARM_TOKEN', ''))
+            status = conn.Expect('status')[0]
+            return WorkerState(address, conn, status)
+        except PLDudeError as err:
+            # the reason already names the worker
+            conn.Close()
+            self._logging.warning(err.reason)
+            return None
+        except OSError as err:
+            conn.Close()
+            self._logging.warning('Worker ' + address + ': ' + str(err))
+            return None
+
+    def Rank(self, workers : List[WorkerState], brand : str) -> List[WorkerState]:
+        candidates = []
+        for i in workers:
+            status = i.status
+            limit = status.get('licenses', {}).get(brand, None)
+            if limit is not None and limit <= 0:
+                self._logging.debug(i.name + ' has no ' + brand + ' license')
+                continue
+            slots = max(1, int(status.get('slots', 1)))
+            free = status.get('running', 0) < slots and (limit is None or status.get('usage', {}).get(brand, 0) < limit)
+            load = (status.get('running', 0) + status.get('queued', 0)) / slots
+            candidates.append(((0 if free else 1, load, status.get('load', 0.0) / max(1, status.get('cpus', 1))), i))
+        candidates.sort(key=lambda x: x[0])
+        return [i[1] for i in candidates]
+
+    def Upload(self, worker : WorkerState, manifest : List[Tuple[str, str]], request : dict) -> Optional[Tuple[int, int]]:
+        # files and bytes shipped, None when the worker is busy and the request did not wait
+        conn = worker.conn
+        conn.Send('submit', files=manifest, **request)
+        header = conn.Expect('need', 'busy')[0]
+        if header['type'] == 'busy':
+            return None
+        missing = set(header.get('digests', []))
+        shipped = 0
+        size = 0
+        for path, digest in manifest:
+            if digest in missing:
+                missing.discard(digest)
+                with open(path, 'rb') as f:
+                    data = zlib.compress(f.read(), 1)
+                conn.Send('blob', data, digest=digest, zlib=True)
+                shipped += 1
+                size += len(data)
+        conn.Send('sent')
+        return shipped, size
+
+    def Claim(self, ranked : List[WorkerState], manifest : List[Tuple[str, str]], request : dict) -> Tuple[WorkerState, int, int]:
+        """Submits to the best ranked worker that can start the job at once, or else queues on the best one.
+
+        Status polls of concurrent clients race, a worker that filled up in the
+        meantime answers busy instead of queueing the job.
+        """
+        refused = set()
+        chosen = None
+        try:
+            for wait in (False, True):
+                for worker in ranked:
+                    if worker.address in refused:
+                        continue
+                    if worker.conn is None:
+                        fresh = self.Poll(worker.address)
+                        if fresh is None:
+                            refused.add(worker.address)
+                            continue
+                        worker.conn = fresh.conn
+                    try:
+                        result = self.Upload(worker, manifest, dict(request, wait=wait))
+                    except (OSError, PLDudeError) as err:
+                        self._logging.warning(worker.name + ' refused the job: ' + str(getattr(err, 'reason', err)))
+                        refused.add(worker.address)
+                        result = None
+                    if result is None:
+                        worker.conn.Close()
+                        worker.conn = None
+                        continue
+                    chosen = worker
+                    return (worker,) + result
+            raise PLDudeError('No build worker accepted the job', 2)
+        finally:
+            # the others are released
+            for i in ranked:
+                if i is chosen or i.conn is None:
+                    continue
+                try:
+                    i.conn.Send('bye')
+                except OSError:
+                    pass
+                i.conn.Close()
+                i.conn = None
+
+    def Receive(self, worker : WorkerState, outputs : List[str]) -> int:
+        log = PrefixAdapter(self._logging, {'prefix': '(' + worker.status.get('name', worker.address) + ') '})
+        fetched = []
+        partial = {}
+        try:
+            return self.Stream(worker, log, outputs, fetched, partial)
+        finally:
+            for i in partial.values():
+                i.close()
+
+    def Stream(self, worker : WorkerState, log : logging.LoggerAdapter, outputs : List[str], fetched : list, partial : dict) -> int:
+        while True:
+            header, payload = worker.conn.Receive()
+            if header is None:
+                raise PLDudeError('Lost the connection to ' + worker.name, 2)
+            kind = header['type']
+            if kind == 'log':
+                log.log(int(header.get('level', logging.INFO)), str(header.get('text', '')))
+            elif kind == 'queued':
+                self._logging.info('Queued on ' + worker.name + ' behind ' + str(header.get('running', 0)) + ' running jobs')
+            elif kind == 'artifact':
+                path = str(header.get('path', ''))
+                # a worker only ever writes what was asked for
+                if not SafePath(path) or not [i for i in outputs if path == i or path.startswith(i.rstrip('/') + '/')]:
+                    raise PLDudeError(worker.name + ' sent an unrequested file: ' + path, 2)
+                tmp = path + '.farm.tmp'
+                if not path in partial:
+                    directory = os.path.dirname(path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    partial[path] = open(tmp, 'wb')
+                partial[path].write(zlib.decompress(payload) if header.get('zlib') else payload)
+                if header.get('last'):
+                    partial.pop(path).close()
+                    os.replace(tmp, path)
+                    fetched.append(path)
+            elif kind == 'done':
+                if fetched:
+                    self._logging.info('Fetched ' + str(len(fetched)) + ' files from ' + worker.name)
+                return int(header.get('code', 2))
+            elif kind == 'error':
+                raise PLDudeError(worker.name + ': ' + str(header.get('reason', 'unknown error')), 2)
+
+    def run(self):
+        bconf = self._bconf
+        brand = bconf.__class__.__name__
+        if bconf._simulate:
+            raise PLDudeError('Interactive simulation cannot run on a build worker', 2)
+
+        with bconf.Phase('fingerprint sources'):
+            manifest = self.Manifest()
+        fetch, always = bconf.GetFarmOutputs()
+        fetch = [self.Relative(i) for i in fetch]
+        always = [self.Relative(i) for i in always]
+        request = {
+            'project': self.GetProject(),
+            'brand': brand,
+            'compile': bool(bconf._compile),
+            'simulate_all': bconf._simulate_all,
+            'device': bconf._variant,
+            'verbosity': logging.getLevelName(logging.getLogger().getEffectiveLevel()),
+            'fetch': fetch,
+            'always': always
+        }
+
+        workers = self.GetWorkers()
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            polled = [i for i in pool.map(self.Poll, workers) if i is not None]
+        ranked = self.Rank(polled, brand)
+        for i in polled:
+            if not i in ranked:
+                i.conn.Close()
+        if not ranked:
+            raise PLDudeError('No build worker available for ' + brand, 2)
+
+        chosen = None
+        try:
+            chosen, shipped, size = self.Claim(ranked, manifest, request)
+            self._logging.info('Building on ' + chosen.name + ', shipped ' + str(shipped) + ' of ' + str(len(manifest)) + ' files (%.1f KB)' % (size / 1024))
+            try:
+                code = self.Receive(chosen, fetch + always)
+            except KeyboardInterrupt:
+                try:
+                    chosen.conn.Send('cancel')
+                except OSError:
+                    pass
+                raise
+        finally:
+            if chosen is not None:
+                chosen.conn.Close()
+
+        if code != 0:
+            raise PLDudeError('Build on ' + chosen.name + ' failed with exit code ' + str(code), code)
@@ -0,0 +1,150 @@
+import copy
+import time
+import logging
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pldude.utils.error import PLDudeError
+from pldude.utils.procman import ProcessManager
+from pldude.bconfigs.buildconf import BuildConfig, CustomFormatter, WireFormatter
+
+class MatrixJob():
+    def __init__(self, bconf : BuildConfig):
+        self.bconf = bconf
+        self.device = bconf.device
+        self.backend = bconf.__class__.__name__
+        self.status = 'PENDING'
+        self.reason = ''
+        self.elapsed = 0.0
+
+# console handler of a pool worker and the formatter its lines take, set by ConfigureWorker
+_handler = None
+_formatter = CustomFormatter
+
+def ConfigureWorker(level : int, formatter : type):
+    # runs once in every pool worker before its first job, a spawned worker inherits no handlers
+    global _handler, _formatter
+    logger = logging.getLogger()
+    for i in list(logger.handlers):
+        logger.removeHandler(i)
+    _handler = logging.StreamHandler()
+    _handler.setLevel(logging.DEBUG)
+    logger.addHandler(_handler)
+    logger.setLevel(level)
+    _formatter = formatter
+
+def RunJob(bconf : BuildConfig) -> tuple:
+    # runs inside a pool worker, every failure is reported back instead of raised
+    logger = bconf._logging
+    _handler.setFormatter(_formatter('(' + bconf.device + ') '))
+
+    start = time.monotonic()
+    try:
+        bconf.run()
+        return ('PASS', '', time.monotonic() - start)
+    except PLDudeError as err:
+        logger.log(err.level, err.reason)
+        status = 'PASS' if err.ecode == 0 else 'FAIL'
+        return (status, err.reason, time.monotonic() - start)
+    except SystemExit:
+        return ('FAIL', 'Tool reported errors', time.monotonic() - start)
+    except KeyboardInterrupt:
+        bconf.Terminate()
+        return ('FAIL', 'User termination', time.monotonic() - start)
+    except Exception as err:
+        return ('FAIL', repr(err), time.monotonic() - start)
+    finally:
+        bconf.WriteTrace()
+
+class BuildMatrix():
+    """Builds every device of a pldprj.yml matrix in its own gen/<backend>/<device>.
+
+    Jobs run in a bounded process pool, at most 'jobs' at a time and never more
+    concurrent builds of one backend than its entry in 'licenses'.
+    """
+
+    def __init__(self, bconf : BuildConfig):
+        self._bconf = bconf
+        self._logging = bconf._logging
+        self._jobs = []
+
+        for i in bconf.GetMatrix():
+            job = copy.copy(bconf)
+            job._procman = ProcessManager()
+            # concurrent builds share the cores, or the configured budget
+            job._processors = max(1, bconf.GetProcessors() // max(1, min(int(bconf._jobs), len(bconf.GetMatrix()))))
+            job.SetVariant(i['device'], i.get('pins', None))
+            self._jobs.append(MatrixJob(job.GetSpecific()))
+
+    def Schedulable(self, job : MatrixJob, running : dict) -> bool:
+        limit = self._bconf._licenses.get(job.backend, None)
+        if limit is None:
+            return True
+        return len([i for i in running.values() if i.backend == job.backend]) < limit
+
+    def run(self):
+        if self._bconf._simulate or self._bconf._simulate_all is not None or self._bconf._program:
+            raise PLDudeError('Programming and simulation need a single device, remove the matrix from pldprj.yml', 2)
+
+        if not self._bconf._compile:
+            if self._bconf._clean:
+                self._bconf.CleanGenerated()
+            return
+
+        pending = []
+        for i in self._jobs:
+            if i.backend == BuildConfig.__name__:
+                i.status = 'FAIL'
+                i.reason = 'Unknown device'
+                i.backend = '-'
+            else:
+                pending.append(i)
+
+        jobs = max(1, int(self._bconf._jobs))
+        self._logging.info('Building ' + str(len(pending)) + ' devices, ' + str(jobs) + ' at a time...')
+
+        start = time.monotonic()
+        running = {}
+        wire = any([isinstance(i.formatter, WireFormatter) for i in self._logging.handlers])
+        setup = (self._logging.getEffectiveLevel(), WireFormatter if wire else CustomFormatter)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=ConfigureWorker, initargs=setup) as pool:
+            while pending or running:
+                for i in list(pending):
+                    if len(running) >= jobs:
+                        break
+                    if not self.Schedulable(i, running):
+                        continue
+                    pending.remove(i)
+                    i.status = 'RUNNING'
+                    running[pool.submit(RunJob, i.bconf)] = i
+
+                if not running:
+                    # a license limit of 0 can never be satisfied
+                    for i in pending:
+                        i.status = 'FAIL'
+                        i.reason = 'No license available for ' + i.backend
+                    break
+
+                done = wait(running, return_when=FIRST_COMPLETED)[0]
+                for i in done:
+                    job = running.pop(i)
+                    try:
+                        job.status, job.reason, job.elapsed = i.result()
+                    except Exception as err:
+                        job.status, job.reason = 'FAIL', repr(err)
+
+        self.PrintSummary(time.monotonic() - start)
+
+        failed = [i for i in self._jobs if i.status != 'PASS']
+        if failed:
+            raise PLDudeError(str(len(failed)) + ' of ' + str(len(self._jobs)) + ' builds failed', 2)
+
+    def PrintSummary(self, elapsed : float):
+        width = max([len(i.device) for i in self._jobs] + [6])
+        print('')
+        print('Device'.ljust(width) + '  Backend     Status  Time')
+        for i in self._jobs:
+            line = i.device.ljust(width) + '  ' + i.backend.ljust(10) + '  ' + i.status.ljust(6) + '  ' + ('%.1fs' % i.elapsed)
+            if i.reason:
+                line += '  ' + i.reason
+            print(line)
+        print('Total wall time: %.1fs' % elapsed)
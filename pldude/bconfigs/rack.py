@@ -0,0 +1,108 @@
+import os
+import re
+import copy
+import time
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from pldude.utils.error import PLDudeError
+
+class PrefixAdapter(logging.LoggerAdapter):
+    def process(self, msg, kwargs):
+        return self.extra['prefix'] + msg, kwargs
+
+class ProgramJob():
+    def __init__(self, device):
+        self.device = device
+        self.target = device.target
+        # the serial number for hw_server targets, the cable name for Altera
+        self.label = device.target.rstrip('/').split('/')[-1]
+        self.status = 'PENDING'
+        self.reason = ''
+        self.elapsed = 0.0
+
+class ProgramRack():
+    """Programs the bitstream into every attached board whose target matches a filter.
+
+    Every target gets its own worker, at most 'program_jobs' run at once, and a
+    failing board is reported in the summary without stopping the others.
+    """
+
+    def __init__(self, bconf):
+        self._bconf = bconf
+        self._logging = bconf._logging
+        self._jobs = []
+
+    def Select(self, devices : list):
+        pattern = self._bconf._target_filter
+        for i in devices:
+            if pattern and not re.search(pattern, i.target):
+                continue
+            # only devices of the project's part, a chain may also hold CPLDs or debug cores
+            parts = [x for x in i.device if self._bconf.MatchesPart(x)]
+            job = ProgramJob(copy.copy(i))
+            if parts:
+                job.device.index = i.device.index(parts[0]) + 1
+                job.device.device = parts[0]
+            else:
+                job.status = 'SKIP'
+                job.reason = 'No ' + self._bconf.device + ' on the chain'
+            self._jobs.append(job)
+
+    def Program(self, job : ProgramJob):
+        worker = copy.copy(self._bconf)
+        worker._logging = PrefixAdapter(self._logging, {'prefix': '(' + job.label + ') '})
+
+        job.status = 'RUNNING'
+        start = time.monotonic()
+        try:
+            worker.ProgramTarget(job.device)
+            job.status = 'PASS'
+        except PLDudeError as err:
+            worker._logging.log(err.level, err.reason)
+            job.status = 'PASS' if err.ecode == 0 else 'FAIL'
+            job.reason = err.reason
+        except SystemExit:
+            job.status = 'FAIL'
+            job.reason = 'Tool reported errors'
+        except Exception as err:
+            job.status = 'FAIL'
+            job.reason = repr(err)
+        job.elapsed = time.monotonic() - start
+
+    def run(self):
+        bconf = self._bconf
+        if not os.path.exists(bconf.GetBitfile()):
+            bconf.compile()
+        # picked once, every worker loads the same file
+        bconf.GetProgramFile()
+
+        start = time.monotonic()
+        with bconf.HardwareServer():
+            self.Select(bconf.ScanTargets())
+            pending = [i for i in self._jobs if i.status == 'PENDING']
+            if not pending:
+                raise PLDudeError('No matching targets found', 0, logging.WARNING)
+
+            jobs = max(1, int(bconf._program_jobs))
+            self._logging.info('Programming ' + str(len(pending)) + ' targets, ' + str(jobs) + ' at a time...')
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                list(pool.map(self.Program, pending))
+
+        self.PrintSummary(time.monotonic() - start)
+
+        failed = [i for i in self._jobs if i.status == 'FAIL']
+        if failed:
+            raise PLDudeError(str(len(failed)) + ' of ' + str(len(self._jobs)) + ' targets failed', 2)
+        bconf._endargs['program'] = True
+
+    def PrintSummary(self, elapsed : float):
+        width = max([len(i.label) for i in self._jobs] + [6])
+        print('')
+        print('Target'.ljust(width) + '  Status  Time')
+        for i in self._jobs:
+            line = i.label.ljust(width) + '  ' + i.status.ljust(6) + '  ' + ('%.1fs' % i.elapsed)
+            if i.reason:
+                line += '  ' + i.reason
+            print(line)
+        print('Total wall time: %.1fs' % elapsed)
@@ -0,0 +1,62 @@
+import importlib
+
+from typing import Dict, Optional
+
+# device part number prefix -> backend, the longest matching prefix wins
+DEVICES = (
+    ('XC7', 'Xilinx7'),
+    ('E', 'Altera'),
+    ('5', 'Altera'),
+    ('10', 'Altera'),
+)
+
+# backend -> module:class, imported only once a project needs it
+BACKENDS = {
+    'Xilinx7': 'pldude.bconfigs.xilinx7:Xilinx7',
+    'Altera': 'pldude.bconfigs.altera:Altera',
+}
+
+ENTRY_POINTS = 'pldude.backends'
+
+_plugins : Optional[Dict[str, object]] = None
+
+def Plugins() -> dict:
+    """Backends installed by other packages under the 'pldude.backends' entry point group.
+
+    The package metadata is only read when a device is not covered by the built-in
+    table, the backend class lists the part number prefixes it handles in PREFIXES.
+    """
+    global _plugins
+    if _plugins is None:
+        _plugins = {}
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:
+            return _plugins
+        found = entry_points()
+        if hasattr(found, 'select'):
+            found = found.select(group=ENTRY_POINTS)
+        else:
+            found = found.get(ENTRY_POINTS, [])
+        for i in found:
+            if not i.name in BACKENDS:
+                _plugins[i.name] = i
+    return _plugins
+
+def Resolve(device : str) -> Optional[str]:
+    device = device.upper()
+    for prefix, backend in sorted(DEVICES, key=lambda x: -len(x[0])):
+        if device.startswith(prefix):
+            return backend
+
+    for name in Plugins():
+        prefixes = getattr(Load(name), 'PREFIXES', ())
+        if any([device.startswith(i.upper()) for i in prefixes]):
+            return name
+    return None
+
+def Load(backend : str) -> type:
+    if backend in BACKENDS:
+        module, cls = BACKENDS[backend].split(':')
+        return getattr(importlib.import_module(module), cls)
+    return Plugins()[backend].load()
@@ -0,0 +1,168 @@
+import os
+import time
+import logging
+import hashlib
+import threading
+
+from typing import Any, Callable, Dict, List
+from pldude.utils.fingerprint import FingerprintStore
+
+# the stage the calling thread works for, tool messages are archived under it
+_current = threading.local()
+
+def CurrentStage() -> str:
+    return getattr(_current, 'name', '')
+
+def EnterStage(name : str):
+    _current.name = name
+
+def Unshare(paths : List[str]):
+    # outputs may be hardlinked from the artifact cache, never let a tool write through them
+    for i in paths:
+        try:
+            if os.stat(i).st_nlink > 1:
+                os.remove(i)
+        except OSError:
+            pass
+
+class Stage():
+    """One step of a backend's compile flow.
+
+    A stage reruns when the content of its inputs, its values or the digest of
+    any stage it depends on changed, or when one of its output artifacts is
+    missing. Missing outputs of a stage other stages depend on only matter
+    when one of those dependents runs, so a build restored from the artifact
+    cache without its checkpoints stays up to date. Stages that keep their result only in memory (a persistent tool
+    session without checkpoints) are marked volatile and are rerun whenever a
+    dependent stage has to run.
+    """
+
+    def __init__(self, name : str, action : Callable[[], None], inputs : List[str] = [], values : Any = None, outputs : List[str] = [], deps : List[str] = [], volatile : bool = False):
+        self.name = name
+        self.action = action
+        self.inputs = [os.path.abspath(i) for i in inputs]
+        self.values = values
+        self.outputs = outputs
+        self.deps = deps
+        self.volatile = volatile
+
+class StageGraph():
+    def __init__(self, store : FingerprintStore, logger : logging.Logger):
+        self._store = store
+        self._logging = logger
+        self._stages : List[Stage] = []
+        self._digests : Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def Add(self, stage : Stage):
+        for i in stage.deps:
+            if not i in self._digests:
+                raise ValueError('Stage ' + stage.name + ' depends on undeclared stage ' + i)
+        self._stages.append(stage)
+        self._digests[stage.name] = self.Digest(stage)
+
+    def Digest(self, stage : Stage) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(stage.values).encode())
+        for i in stage.deps:
+            digest.update(self._digests[i])
+        for i in sorted(stage.inputs):
+            digest.update(i.encode())
+            digest.update(self._store.Digest(i) or b'\0')
+        return digest.digest()
+
+    def Changed(self, stage : Stage) -> bool:
+        return self._store.StageDigest(stage.name) != self._digests[stage.name]
+
+    def Missing(self, stage : Stage) -> bool:
+        return not all([os.path.exists(i) for i in stage.outputs])
+
+    def Plan(self) -> List[Stage]:
+        # intermediate outputs are pulled in by their dependents like volatile stages
+        intermediate = set([x for i in self._stages for x in i.deps])
+        run = set([i.name for i in self._stages if self.Changed(i) or (self.Missing(i) and not i.name in intermediate)])
+
+        changed = True
+        while changed:
+            changed = False
+            for stage in self._stages:
+                if stage.name in run:
+                    continue
+                if any([i in run for i in stage.deps]):
+                    run.add(stage.name)
+                    changed = True
+            # a volatile stage or missing outputs leave nothing on disk for dependents to resume from
+            for stage in self._stages:
+                if stage.name in run:
+                    for i in self._stages:
+                        if i.name in stage.deps and (i.volatile or self.Missing(i)) and not i.name in run:
+                            run.add(i.name)
+                            changed = True
+
+        return [i for i in self._stages if i.name in run]
+
+    def Commit(self, stage : Stage):
+        self._store.CommitStage(stage.name, self._digests[stage.name], stage.inputs)
+
+    def Execute(self, stage : Stage):
+        Unshare(stage.outputs)
+        previous = CurrentStage()
+        EnterStage(stage.name)
+        try:
+            stage.action()
+        finally:
+            EnterStage(previous)
+
+    def Run(self, plan : List[Stage] = None) -> List[Stage]:
+        """Runs the planned stages, every stage whose dependencies are done runs
+        concurrently with the other ready ones."""
+        if plan is None:
+            plan = self.Plan()
+        for stage in self._stages:
+            if not stage in plan:
+                self._logging.info('Reusing ' + stage.name + ' stage: no changes detected')
+
+        pending = list(plan)
+        planned = set([i.name for i in plan])
+        done = set()
+        while pending:
+            ready = [i for i in pending if all([x in done or not x in planned for x in i.deps])]
+            pending = [i for i in pending if not i in ready]
+            if len(ready) == 1:
+                self.Execute(ready[0])
+                self.Commit(ready[0])
+            else:
+                self.RunConcurrent(ready)
+            done.update([i.name for i in ready])
+
+        if self._store.IsDirty():
+            self._store.Save()
+        return plan
+
+    def RunConcurrent(self, stages : List[Stage]):
+        elapsed : Dict[str, float] = {}
+        errors = []
+
+        def Worker(stage : Stage):
+            start = time.monotonic()
+            try:
+                self.Execute(stage)
+            except BaseException as err:
+                errors.append(err)
+                return
+            finally:
+                elapsed[stage.name] = time.monotonic() - start
+            with self._lock:
+                self.Commit(stage)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=Worker, args=(i,), name='stage-' + i.name) for i in stages]
+        for i in threads:
+            i.start()
+        for i in threads:
+            i.join()
+        wall = time.monotonic() - start
+
+        self._logging.info('Ran ' + ', '.join([i.name for i in stages]) + ' concurrently in %.1fs, saving %.1fs over running them in sequence' % (wall, max(0.0, sum(elapsed.values()) - wall)))
+        if errors:
+            raise errors[0]
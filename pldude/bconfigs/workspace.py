@@ -0,0 +1,300 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import logging
+
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pldude.utils.error import PLDudeError
+from pldude.utils.wire import WIRE_MARK
+from pldude.utils.procman import ProcessManager
+from pldude.utils.fingerprint import FingerprintStore
+from pldude.bconfigs import registry
+from pldude.bconfigs.rack import PrefixAdapter
+from pldude.bconfigs.buildconf import BuildConfig
+
+class WorkspaceProject():
+    def __init__(self, path : str, name : str):
+        self.path = path
+        self.name = name
+        self.devices = []
+        self.backend = '-'
+        self.src = './src'
+        self.extensions = ()
+        self.platform = []
+        # devices built at once, licenses held per backend while building
+        self.jobs = 1
+        self.licenses = {}
+        self.threads = 0
+        self.stamp = None
+        self.status = 'PENDING'
+        self.reason = ''
+        self.elapsed = 0.0
+
+    def GetGroup(self) -> Optional[tuple]:
+        return tuple(self.platform) or None
+
+    def GetStampPath(self) -> str:
+        return os.path.join(self.path, 'gen', 'workspace.stamp')
+
+    def IsCurrent(self) -> bool:
+        try:
+            with open(self.GetStampPath(), 'r') as f:
+                return f.read() == self.stamp
+        except OSError:
+            return False
+
+class Workspace():
+    """Builds every out of date PLDude project under a root with one scheduler.
+
+    Every project is compiled by its own pldude process in its own directory. At
+    most 'jobs' devices build at once, never more per backend than 'licenses',
+    and each build gets an equal share of 'processors' for its tool threads.
+    Projects sharing a platform_src are ordered so the first of each platform
+    starts early, the shared out-of-context blocks it synthesizes are then taken
+    from the workspace's artifact cache by the others.
+    """
+
+    def __init__(self, root : str, logger : logging.Logger, jobs : int = None, processors : int = None, licenses : Dict[str, int] = {}, pattern : str = None, everything : bool = False):
+        self._root = os.path.abspath(root)
+        self._logging = logger
+        self._processors = max(1, processors or os.cpu_count() or 1)
+        self._jobs = max(1, jobs or self._processors // 4)
+        self._licenses = licenses
+        self._pattern = pattern
+        self._everything = everything
+        self._procman = ProcessManager()
+        self._fingerprint = FingerprintStore(os.path.join(self._root, 'gen', 'workspace.bin'))
+        self._trees = {}
+        self._hashed = []
+        self._projects = []
+
+    def Discover(self) -> List[WorkspaceProject]:
+        projects = []
+        for root, dirs, files in os.walk(self._root):
+            # generated and hidden directories never hold projects
+            dirs[:] = sorted([i for i in dirs if i != 'gen' and not i.startswith('.')])
+            if not 'pldprj.yml' in files:
+                continue
+            name = os.path.relpath(root, self._root).replace(os.sep, '/')
+            if self._pattern and not re.search(self._pattern, name):
+                continue
+            projects.append(WorkspaceProject(root, name))
+        return projects
+
+    def Describe(self, project : WorkspaceProject):
+        import yaml
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        try:
+            with open(os.path.join(project.path, 'pldprj.yml'), 'r') as f:
+                config = yaml.load(f, Loader=loader) or {}
+        except (OSError, yaml.YAMLError) as err:
+            raise PLDudeError('Cannot read pldprj.yml: ' + ' '.join(str(err).split()), 1)
+        if type(config) != dict:
+            raise PLDudeError('pldprj.yml must be a mapping of settings', 1)
+
+        device = config.get('device', None)
+        matrix = config.get('matrix', [])
+        if type(device) == list:
+            matrix = [{'device': i} for i in device]
+        if matrix:
+            devices = [str(i.get('device', '')) for i in matrix if type(i) == dict]
+        else:
+            devices = [str(device)] if device else []
+        if not devices:
+            raise PLDudeError('No device in pldprj.yml', 1)
+        for i in devices:
+            backend = registry.Resolve(i)
+            if backend is None:
+                raise PLDudeError('Unknown device ' + i, 1)
+            project.devices.append((i, backend))
+        backends = sorted(set([i[1] for i in project.devices]))
+        project.backend = ','.join(backends)
+
+        project.src = str(config.get('src', project.src))
+        project.extensions = BuildConfig.FILE_TYPES.get(str(config.get('filetype', 'mixed')).upper(), ())
+        if config.get('platform_src', None):
+            project.platform = [os.path.realpath(os.path.join(project.path, str(config['platform_src']), i)) for i in backends]
+
+        # the matrix of a project builds in parallel within the project's own share
+        try:
+            jobs = int(config.get('jobs', len(devices)))
+        except (TypeError, ValueError):
+            jobs = len(devices)
+        project.jobs = max(1, min(jobs, len(devices), self._jobs))
+        limits = config.get('licenses', {}) if type(config.get('licenses', {})) == dict else {}
+        for i in backends:
+            # a limit of 0 is left to the scheduler, which never starts the project
+            limit = self._licenses.get(i, None)
+            if limit:
+                project.jobs = min(project.jobs, limit)
+        for i in backends:
+            count = len([x for x in project.devices if x[1] == i])
+            project.licenses[i] = min(project.jobs, count, int(limits.get(i, count)))
+
+    def Tree(self, directory : str, extensions : tuple) -> list:
+        # (relative path, digest) of the sources under directory, a shared platform is hashed once
+        key = (os.path.realpath(directory), extensions)
+        if key in self._trees:
+            return self._trees[key]
+        tree = []
+        for root, dirs, files in os.walk(key[0]):
+            dirs[:] = sorted([i for i in dirs if i != 'gen' and not i.startswith('.')])
+            for name in sorted(files):
+                if not os.path.splitext(name)[1] in extensions:
+                    continue
+                path = os.path.join(root, name)
+                self._hashed.append(path)
+                tree.append((os.path.relpath(path, key[0]).replace(os.sep, '/'), self._fingerprint.Digest(path) or b''))
+        self._trees[key] = tree
+        return tree
+
+    def Stamp(self, project : WorkspaceProject) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for i in BuildConfig.CONFIG_FILES:
+            path = os.path.join(project.path, i)
+            self._hashed.append(path)
+            digest.update(i.encode())
+            digest.update(self._fingerprint.Digest(path) or b'\0')
+        for directory in [os.path.join(project.path, project.src)] + project.platform:
+            digest.update(directory.encode())
+            for path, content in self.Tree(directory, project.extensions):
+                digest.update(path.encode())
+                digest.update(content)
+        return digest.hexdigest()
+
+    def Prepare(self):
+        self._fingerprint.Load()
+        self._projects = self.Discover()
+        for i in self._projects:
+            try:
+                self.Describe(i)
+                i.stamp = self.Stamp(i)
+            except PLDudeError as err:
+                i.status = 'FAIL'
+                i.reason = err.reason
+                continue
+            if not self._everything and i.IsCurrent():
+                i.status = 'SKIP'
+                i.reason = 'up to date'
+        try:
+            # only the stat fast path of the next run is kept
+            self._fingerprint.CommitStage('workspace', b'', self._hashed)
+        except OSError as err:
+            self._logging.debug('Cannot save ' + self._fingerprint.path + ': ' + str(err))
+
+    def Order(self, pending : List[WorkspaceProject], started : set) -> List[WorkspaceProject]:
+        # the first project of every platform goes ahead of the ones that can reuse its work
+        return sorted(pending, key=lambda i: i.GetGroup() is not None and i.GetGroup() in started)
+
+    def Schedulable(self, project : WorkspaceProject, running : dict, used : int) -> bool:
+        if used + project.jobs > self._jobs:
+            return False
+        for backend, count in project.licenses.items():
+            limit = self._licenses.get(backend, None)
+            if limit is not None and sum([i.licenses.get(backend, 0) for i in running.values()]) + count > limit:
+                return False
+        return True
+
+    def Forward(self, log : logging.LoggerAdapter, line : bytes):
+        text = line.decode(errors='replace').rstrip('\r\n')
+        level = logging.INFO
+        if text.startswith(WIRE_MARK):
+            level, _, text = text[1:].partition(' ')
+            level = int(level) if level.isdigit() else logging.INFO
+        log.log(level, text)
+
+    def Build(self, project : WorkspaceProject) -> tuple:
+        env = dict(os.environ, PLDUDE_WORKER_JOB='1', PLDUDE_PROCESSORS=str(project.threads), PLDUDE_JOBS=str(project.jobs))
+        # shared out-of-context blocks need a cache every project can reach, bitstreams stay opt-in
+        env.setdefault('PLDUDE_OOC_CACHE', os.path.join(self._root, 'gen', 'cache'))
+        args = [sys.executable, '-m', 'pldude', '-c', '-v', logging.getLevelName(self._logging.getEffectiveLevel())]
+        log = PrefixAdapter(self._logging, {'prefix': '(' + project.name + ') '})
+
+        start = time.monotonic()
+        proc = self._procman.Start(args, project.path, sink=lambda line: self.Forward(log, line), env=env)
+        proc.Wait()
+        if proc.returncode != 0:
+            return ('FAIL', 'exit code ' + str(proc.returncode), time.monotonic() - start)
+        try:
+            with open(project.GetStampPath() + '.tmp', 'w') as f:
+                f.write(project.stamp)
+            os.replace(project.GetStampPath() + '.tmp', project.GetStampPath())
+        except OSError as err:
+            self._logging.warning('Cannot record the build of ' + project.name + ': ' + str(err))
+        return ('PASS', '', time.monotonic() - start)
+
+    def run(self):
+        self.Prepare()
+        if not self._projects:
+            raise PLDudeError('No projects found under ' + self._root, 2)
+
+        pending = [i for i in self._projects if i.status == 'PENDING']
+        slots = sum([i.jobs for i in pending])
+        threads = max(1, self._processors // max(1, min(self._jobs, slots)))
+        self._logging.info('Building ' + str(len(pending)) + ' of ' + str(len(self._projects)) + ' projects, ' + str(self._jobs) + ' devices at a time with ' + str(threads) + ' threads each...')
+
+        start = time.monotonic()
+        running = {}
+        started = set()
+        with ThreadPoolExecutor(max_workers=self._jobs) as pool:
+            try:
+                while pending or running:
+                    used = sum([i.jobs for i in running.values()])
+                    while True:
+                        # ranked again after every start, the platform it claims moves its peers back
+                        ready = [i for i in self.Order(pending, started) if self.Schedulable(i, running, used)]
+                        if not ready:
+                            break
+                        i = ready[0]
+                        pending.remove(i)
+                        i.status = 'RUNNING'
+                        i.threads = i.jobs * threads
+                        used += i.jobs
+                        if i.GetGroup() is not None:
+                            started.add(i.GetGroup())
+                        running[pool.submit(self.Build, i)] = i
+
+                    if not running:
+                        for i in pending:
+                            i.status = 'FAIL'
+                            i.reason = 'No license available for ' + i.backend
+                        break
+
+                    done = wait(running, return_when=FIRST_COMPLETED)[0]
+                    for i in done:
+                        project = running.pop(i)
+                        try:
+                            project.status, project.reason, project.elapsed = i.result()
+                        except Exception as err:
+                            project.status, project.reason = 'FAIL', repr(err)
+            except KeyboardInterrupt:
+                self._procman.Terminate()
+                raise
+
+        self.PrintSummary(time.monotonic() - start)
+
+        failed = [i for i in self._projects if i.status == 'FAIL']
+        if failed:
+            raise PLDudeError(str(len(failed)) + ' of ' + str(len(self._projects)) + ' projects failed', 2)
+
+    def List(self):
+        self.Prepare()
+        width = max([len(i.name) for i in self._projects] + [7])
+        print('Project'.ljust(width) + '  Backend     Devices  State')
+        for i in self._projects:
+            state = {'PENDING': 'out of date', 'SKIP': 'up to date'}.get(i.status, i.reason)
+            print(i.name.ljust(width) + '  ' + i.backend.ljust(10) + '  ' + str(len(i.devices)).ljust(7) + '  ' + state)
+
+    def PrintSummary(self, elapsed : float):
+        width = max([len(i.name) for i in self._projects] + [7])
+        print('')
+        print('Project'.ljust(width) + '  Backend     Status  Threads  Time')
+        for i in self._projects:
+            line = i.name.ljust(width) + '  ' + i.backend.ljust(10) + '  ' + i.status.ljust(6) + '  ' + (str(i.threads) if i.threads else '-').ljust(7) + '  ' + ('%.1fs' % i.elapsed)
+            if i.reason:
+                line += '  ' + i.reason
+            print(line)
+        print('Total wall time: %.1fs' % elapsed)
@@ -0,0 +1,900 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+import contextlib
+import hashlib
+import shutil
+
+from typing import Optional, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor, wait
+from pldude.utils.error import PLDudeError
+from pldude.utils.tclsession import TclSession
+from pldude.utils.hdlindex import HdlIndex
+from pldude.utils.logparse import VivadoLog
+from pldude.bconfigs.stages import Stage, CurrentStage, EnterStage, Unshare
+from pldude.bconfigs.buildconf import BuildConfig, Device, RepFile
+
+if TYPE_CHECKING:
+    from pldude.utils.artifacts import ArtifactCache
+
+class OocBlock():
+    def __init__(self, name : str, files : list, type : str):
+        self.name = name
+        self.files = files
+        self.type = type
+
+
+class Xilinx7Device(Device):...
+
+class Xilinx7(BuildConfig):
+    LOG_PARSER = VivadoLog
+
+    # (place_design, route_design) directive pairs tried in this order by 'strategies: <n>'
+    STRATEGIES = (
+        ('Explore', 'Explore'),
+        ('ExtraNetDelay_high', 'Explore'),
+        ('AltSpreadLogic_high', 'AggressiveExplore'),
+        ('ExtraPostPlacementOpt', 'NoTimingRelaxation'),
+        ('WLDrivenBlockPlacement', 'Explore'),
+        ('EarlyBlockPlacement', 'AggressiveExplore'),
+        ('ExtraTimingOpt', 'HigherDelayCost'),
+        ('Default', 'Default'),
+    )
+
+    # first line of every compile script, the thread count comes from the environment so
+    # a different budget never changes the scripts and never invalidates a stage
+    THREADS = "if {[info exists ::env(PLDUDE_THREADS)]} { set_param general.maxThreads [expr {min(8, $::env(PLDUDE_THREADS))}] }\n"
+
+    # seconds between checks of the running strategies' post-place estimates
+    PRUNE_INTERVAL = 1.0
+
+    # worst setup slack into pldude_wns, unconstrained designs have no setup paths and count as met
+    WNS = "set pldude_wns [get_property SLACK [get_timing_paths -setup -max_paths 1 -nworst 1]]\nif {$pldude_wns eq \"\"} { set pldude_wns 0 }\n"
+
+    PROGRAM_FORMATS = {'bit': 'jtag', 'bin': 'flash', 'mcs': 'flash'}
+
+    def GetRemote(self) -> str:
+        if self._remote == 'DEFAULT':
+            return 'localhost:3121'
+        if type(self._remote) == list:
+            return self._remote[0]
+        return self._remote
+
+    def GetRemotes(self) -> list:
+        if type(self._remote) == list:
+            return self._remote
+        return [self.GetRemote()]
+
+    def GetBitfile(self) -> str:
+        return self.GetDirectory('compile/bitfile') + '/project.bit'
+
+    @contextlib.contextmanager
+    def HardwareServer(self):
+        # remote hw_server instances are expected to be running already
+        if not any([i.split(':')[0] in ('localhost', '127.0.0.1') for i in self.GetRemotes()]):
+            yield
+            return
+        hw_server_prog = self.RunSubprocess('Starting JTAG hardware server...', self.GetDirectory('program'), ['hw_server.bat'], False)
+        try:
+            yield
+        finally:
+            # never leave hw_server behind
+            self._procman.Cancel(hw_server_prog)
+
+    def OpenHardware(self, remote : str) -> TclSession:
+        # no log or journal, concurrent sessions share the program directory
+        session = self.OpenSession(self.GetDirectory('program'), ['vivado.bat', '-mode', 'tcl', '-nojournal', '-nolog'], b'Vivado% ')
+        try:
+            self.RunSession('Connecting to ' + remote + '...', session, 'open_hw; connect_hw_server -url ' + remote, self.GetTimeout('scan'))
+        except BaseException:
+            self.CloseSession(session)
+            raise
+        return session
+
+    def ScanTargets(self) -> list:
+        remotes = self.GetRemotes()
+        devices = []
+        session = self.OpenHardware(remotes[0])
+        try:
+            for remote in remotes:
+                if remote != remotes[0]:
+                    self.RunSession('Connecting to ' + remote + '...', session, 'connect_hw_server -url ' + remote, self.GetTimeout('scan'))
+                for i in self.ScanDevices(session):
+                    i.remote = remote
+                    devices.append(i)
+        finally:
+            self.CloseSession(session)
+        return devices
+
+    def ProgramTarget(self, device : Xilinx7Device):
+        session = self.OpenHardware(device.remote)
+        try:
+            self.ProgramDevice(session, device)
+        finally:
+            self.CloseSession(session)
+
+    def ScanDevices(self, session : TclSession) -> list:
+        self._logging.info('Getting list of JTAG Devices...')
+        scan_for_devices = self.GetResource("scan_for_devices.tcl")
+        devices = self.ParseDevices(session.Execute(scan_for_devices.read()), Xilinx7Device)
+        scan_for_devices.close()
+        if session.status != 0:
+            raise PLDudeError('Could not scan for JTAG devices: ' + session.error, 2)
+        return devices
+
+    def ProgramDevice(self, session : TclSession, device : Xilinx7Device):
+        path = self.GetProgramFile()
+        program_file = '../compile/bitfile/' + os.path.basename(path)
+        command = 'current_hw_target {' + device.target + '}; open_hw_target; '
+        command += 'current_hw_device [get_hw_devices {' + device.device + '}]'
+        self.RunSession('Opening ' + str(device) + '...', session, command, self.GetTimeout('scan'))
+
+        if self._program_flash:
+            command = self.GetFlashCommand(program_file)
+        else:
+            command = 'set_property PROGRAM.FILE {' + program_file + '} [current_hw_device]; program_hw_devices [current_hw_device]'
+        start = time.perf_counter()
+        self.RunSession('Programming ' + str(device) + '...', session, command + '; close_hw_target', self.GetTimeout('program'))
+        self.ReportTransfer(device, path, time.perf_counter() - start)
+
+    def GetFlashCommand(self, program_file : str) -> str:
+        if not self._flash.get('part', None):
+            raise PLDudeError('Set flash.part to the configuration memory of the board to program it, eg. s25fl128sxxxxxx0-spi-x1_x2_x4', 1)
+        command = 'create_hw_cfgmem -hw_device [current_hw_device] [lindex [get_cfgmem_parts {' + str(self._flash['part']) + '}] 0]; '
+        command += 'set pldude_cfgmem [get_property PROGRAM.HW_CFGMEM [current_hw_device]]; '
+        command += 'set_property PROGRAM.FILES [list {' + program_file + '}] $pldude_cfgmem; '
+        command += 'set_property PROGRAM.ADDRESS_RANGE {use_file} $pldude_cfgmem; '
+        command += 'set_property PROGRAM.ERASE 1 $pldude_cfgmem; '
+        command += 'set_property PROGRAM.CFG_PROGRAM 1 $pldude_cfgmem; '
+        command += 'set_property PROGRAM.VERIFY 1 $pldude_cfgmem; '
+        # the flash is written through Vivado's loader design, configured into the device first
+        command += 'create_hw_bitstream -hw_device [current_hw_device] [get_property PROGRAM.HW_CFGMEM_BITFILE [current_hw_device]]; '
+        command += 'program_hw_devices [current_hw_device]; refresh_hw_device [current_hw_device]; '
+        command += 'program_hw_cfgmem -hw_cfgmem $pldude_cfgmem'
+        return command
+
+    def ConvertBitfile(self, fmt : str, path : str):
+        bitfile_dir = os.path.dirname(path)
+        name = os.path.basename(path)
+        script = "write_cfgmem -force -format " + fmt + " -interface " + str(self._flash.get('interface', 'SPIx4'))
+        script += " -size " + str(self._flash.get('size', 16)) + " -loadbit {up 0x0 ./project.bit} -file ./" + name + "\n"
+        self.WriteIfChanged(bitfile_dir + "/" + fmt + ".tcl", script)
+        args = ['vivado.bat', '-mode', 'batch', '-nojournal', '-log', './' + fmt + '.log', '-source', './' + fmt + '.tcl']
+        self.RunSubprocess('Writing ' + name + '...', bitfile_dir, args, timeout=self.GetTimeout('convert'))
+
+    def GetToolVersion(self) -> str:
+        return self.ToolRelease('vivado.bat', ['-version'], r'^Vivado v.*$')
+
+    def GetStrategies(self) -> list:
+        if not self._strategies:
+            return []
+        if type(self._strategies) == int:
+            return [{'place': i[0], 'route': i[1], 'phys_opt': True} for i in self.STRATEGIES[:self._strategies]]
+        strategies = []
+        for i in self._strategies:
+            if type(i) != dict:
+                raise PLDudeError('strategies must be a number or a list of {place, route, phys_opt} entries', 2)
+            strategies.append({'place': str(i.get('place', 'Default')), 'route': str(i.get('route', 'Default')), 'phys_opt': bool(i.get('phys_opt', False))})
+        return strategies
+
+    def WritesCheckpoints(self) -> bool:
+        # the strategy sweep starts every run from post_synth.dcp
+        return bool(self._checkpoints or not self._session or self.GetStrategies())
+
+    def RunStrategies(self, compile_dir : str):
+        strategies = self.GetStrategies()
+        results = [{'name': i['place'] + '/' + i['route'], 'status': 'PENDING', 'wns': None, 'tns': None} for i in strategies]
+        running = {}
+        lock = threading.Lock()
+        met = threading.Event()
+        stage = CurrentStage()
+
+        def Worker(n : int):
+            result = results[n]
+            name = str(n)
+            EnterStage((stage or 'par') + ':' + result['name'])
+            with lock:
+                if met.is_set():
+                    result['status'] = 'SKIP'
+                    return
+                msg = 'Executing place and route with strategy ' + result['name'] + '...'
+                self._logging.info(msg)
+                start = time.perf_counter()
+                args = ['vivado.bat', '-mode', 'batch', '-nojournal', '-log', './strategy/' + name + '.log', '-source', './strategy/' + name + '.tcl']
+                proc = self._procman.Start(args, compile_dir, timeout=self.GetTimeout('par'), env=env)
+                running[n] = proc
+                result['status'] = 'RUNNING'
+
+            try:
+                self.Collect(msg, proc, start)
+                with open(compile_dir + '/strategy/' + name + '.timing', 'r') as f:
+                    wns, tns = [float(i) for i in f.read().split()[:2]]
+            except PLDudeError as err:
+                # a timed out strategy only drops out of the sweep
+                result['status'] = 'FAIL'
+                self.CheckCancelled()
+                self._logging.warning('Strategy ' + result['name'] + ': ' + err.reason)
+                return
+            except (SystemExit, OSError, ValueError):
+                if result['status'] != 'PRUNED':
+                    result['status'] = 'CANCEL' if proc.cancelled else 'FAIL'
+                return
+            finally:
+                with lock:
+                    del running[n]
+
+            result['status'] = 'DONE'
+            result['wns'] = wns
+            result['tns'] = tns
+            self._logging.info('Strategy ' + result['name'] + ' finished with WNS %.3f ns, TNS %.3f ns' % (wns, tns))
+            if wns >= 0 and not met.is_set():
+                # timing is met, the other runs can only tie
+                with lock:
+                    met.set()
+                    others = list(running.values())
+                for i in others:
+                    self._procman.Cancel(i)
+            else:
+                Prune()
+
+        def Prune():
+            # a run whose post-place estimate already trails a finished run by the margin will not catch up
+            finished = [i['wns'] for i in results if i['status'] == 'DONE']
+            if not finished:
+                return
+            with lock:
+                for n, proc in list(running.items()):
+                    try:
+                        with open(compile_dir + '/strategy/' + str(n) + '.placed', 'r') as f:
+                            estimate = float(f.read().split()[0])
+                    except (OSError, ValueError, IndexError):
+                        continue
+                    if estimate < max(finished) - float(self._strategy_margin) and results[n]['status'] == 'RUNNING':
+                        self._logging.info('Strategy ' + results[n]['name'] + ' dropped, estimated WNS %.3f ns after placement' % estimate)
+                        results[n]['status'] = 'PRUNED'
+                        self._procman.Cancel(proc)
+
+        for i in range(len(strategies)):
+            for ext in ('.timing', '.placed'):
+                try:
+                    os.remove(compile_dir + '/strategy/' + str(i) + ext)
+                except FileNotFoundError:
+                    pass
+
+        jobs = self._strategy_jobs or max(1, self.GetProcessors() // 2)
+        env = self.GetToolEnv(min(int(jobs), len(strategies)))
+        with ThreadPoolExecutor(max_workers=max(1, int(jobs))) as pool:
+            futures = [pool.submit(Worker, i) for i in range(len(strategies))]
+            # estimates show up while the runs are still routing
+            while wait(futures, timeout=self.PRUNE_INTERVAL)[1]:
+                Prune()
+            for i in futures:
+                i.result()
+
+        self.PrintStrategies(results)
+        done = [i for i in range(len(results)) if results[i]['status'] == 'DONE']
+        if not done:
+            raise PLDudeError('No implementation strategy completed', 2)
+        best = max(done, key=lambda i: (results[i]['wns'], results[i]['tns']))
+        self._logging.info('Using strategy ' + results[best]['name'])
+        shutil.copyfile(compile_dir + '/strategy/' + str(best) + '.dcp', compile_dir + '/post_par.dcp')
+
+    def PrintStrategies(self, results : list):
+        width = max([len(i['name']) for i in results] + [8])
+        self._logging.info('Strategy'.ljust(width) + '  Status   WNS       TNS')
+        for i in results:
+            line = i['name'].ljust(width) + '  ' + i['status'].ljust(7)
+            if i['wns'] is not None:
+                line += '  ' + ('%.3f' % i['wns']).ljust(8) + '  ' + ('%.3f' % i['tns'])
+            self._logging.info(line)
+
+    def ReadSources(self, files : list) -> str:
+        script = ""
+        for i in files:
+            file_ext = os.path.splitext(i.dir)
+            if len(file_ext) < 2:
+                continue
+
+            if file_ext[1] in (".vhd", ".vhdl"):
+                file_args = ""
+                if self.vhdl_2008:
+                    file_args = '-vhdl2008 '
+                script += "read_vhdl " + file_args + str(i.dir).replace('\\', '/') + "\n"
+            elif file_ext[1] in (".v"):
+                script += "read_verilog " + str(i.dir).replace('\\', '/') + "\n"
+        return script
+
+    def GetOocBlocks(self) -> list:
+        if self._ooc_blocks is not None:
+            return self._ooc_blocks
+
+        self._ooc_blocks = []
+        if not self._ooc:
+            return self._ooc_blocks
+
+        index = self.GetIndex()
+        paths = [i.dir for i in self._files]
+        types = dict([(i.dir, i.type) for i in self._files])
+        if self._ooc == 'auto':
+            names = index.Children(self.top, paths)
+        else:
+            names = [str(i) for i in self._ooc]
+
+        for name in names:
+            files = index.Closure(name, paths)
+            if files is None:
+                self._logging.warning('Could not find ' + name + ' in the sources, synthesizing it in context')
+                continue
+            # the tools get the module as declared, Verilog names are case sensitive
+            provider, name = index.Provider(name, files)
+            self._ooc_blocks.append(OocBlock(name, files, types[provider]))
+        index.Save()
+        return self._ooc_blocks
+
+    def GetOocStub(self, block : OocBlock) -> str:
+        return "./ooc/" + block.name + ("_stub.vhd" if block.type == 'VHDL' else "_stub.v")
+
+    def GetOocKey(self, block : OocBlock) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(self.GetFingerprintKey()).encode())
+        digest.update(block.name.encode())
+        for i in block.files:
+            digest.update(i.encode())
+            digest.update(self.GetFingerprint().Digest(i) or b'\0')
+        return digest.hexdigest()
+
+    def GetSharedOocKey(self, cache : 'ArtifactCache', block : OocBlock) -> Optional[str]:
+        # a block built from platform_src alone is the same in every project using the platform
+        if not self._platform_dir:
+            return None
+        platform = os.path.abspath(self._platform_dir + "/" + self.__class__.__name__)
+        sources = []
+        for i in block.files:
+            path = os.path.relpath(os.path.abspath(i), platform)
+            if path == os.pardir or path.startswith(os.pardir + os.sep):
+                return None
+            sources.append((path.replace(os.sep, '/'), (self.GetFingerprint().Digest(i) or b'').hex()))
+        return cache.Key({
+            'ooc': block.name,
+            'type': block.type,
+            'device': self.device,
+            'vhdl2008': self.vhdl_2008,
+            'tool': self.GetToolVersion(),
+            'sources': sources
+        })
+
+    def GetOocOutputs(self, compile_dir : str, block : OocBlock) -> dict:
+        stub = self.GetOocStub(block)
+        return {
+            block.name + '.dcp': compile_dir + "/ooc/" + block.name + ".dcp",
+            os.path.basename(stub): compile_dir + "/" + stub
+        }
+
+    def GetOocCache(self) -> 'ArtifactCache':
+        # a workspace shares platform blocks between its projects without caching their bitstreams
+        root = os.environ.get('PLDUDE_OOC_CACHE', None)
+        if not root:
+            return self.GetArtifactCache()
+        from pldude.utils.artifacts import ArtifactCache
+        return ArtifactCache(os.path.expanduser(root), int(self._cache_size) * 1024 * 1024)
+
+    def RunOoc(self, compile_dir : str):
+        # every block keeps its checkpoint until the content of its own source closure changes
+        stale = []
+        for i in self.GetOocBlocks():
+            key = self.GetOocKey(i)
+            key_path = compile_dir + "/ooc/" + i.name + ".key"
+            try:
+                with open(key_path, "r") as f:
+                    current = f.read()
+            except OSError:
+                current = None
+            if current == key and os.path.exists(compile_dir + "/ooc/" + i.name + ".dcp") and os.path.exists(compile_dir + "/" + self.GetOocStub(i)):
+                self._logging.info("Reusing out-of-context checkpoint of " + i.name)
+                continue
+            if current is not None:
+                os.remove(key_path)
+            stale.append((i, key, key_path))
+
+        # platform blocks go through the artifact cache under a claim, so of the projects
+        # sharing a platform only the first synthesizes them and the others wait for it
+        cache = self.GetOocCache() if stale else None
+        shared = {}
+        if cache:
+            for i, key, key_path in stale:
+                shared_key = self.GetSharedOocKey(cache, i)
+                if shared_key:
+                    shared[i.name] = shared_key
+
+        with contextlib.ExitStack() as claims:
+            # claimed in key order, builds waiting on each other can never deadlock
+            for name in sorted(shared, key=lambda x: shared[x]):
+                claims.enter_context(cache.Claim(shared[name], lambda name=name: self._logging.info("Waiting for another build synthesizing " + name + "...")))
+
+            for entry in list(stale):
+                i, key, key_path = entry
+                if not i.name in shared:
+                    continue
+                outputs = self.GetOocOutputs(compile_dir, i)
+                placed = cache.Fetch(shared[i.name], outputs)
+                if placed and len(placed) == len(outputs):
+                    self._logging.info("Restored out-of-context checkpoint of " + i.name + " from artifact cache")
+                    with open(key_path, "w") as f:
+                        f.write(key)
+                    stale.remove(entry)
+
+            steps = []
+            for i, key, key_path in stale:
+                # checkpoints and stubs restored from the cache are hardlinks into its entries
+                Unshare(list(self.GetOocOutputs(compile_dir, i).values()))
+                args = ['vivado.bat', '-mode', 'batch', '-nojournal', '-log', './ooc/' + i.name + '.log', '-source', './ooc/' + i.name + '.tcl']
+                steps.append(("Synthesizing " + i.name + " out of context...", compile_dir, args, self.GetTimeout('ooc')))
+
+            jobs = self._ooc_jobs or max(1, self.GetProcessors() // 2)
+            try:
+                self.RunConcurrent(steps, jobs)
+            finally:
+                for i, key, key_path in stale:
+                    if os.path.exists(compile_dir + "/ooc/" + i.name + ".dcp"):
+                        with open(key_path, "w") as f:
+                            f.write(key)
+
+            for i, key, key_path in stale:
+                if i.name in shared:
+                    try:
+                        cache.Store(shared[i.name], self.GetOocOutputs(compile_dir, i), {'ooc': i.name, 'device': self.device})
+                    except OSError as err:
+                        self._logging.warning('Could not store ' + i.name + ' in artifact cache ' + cache.root + ': ' + str(err.strerror))
+
+    def WriteScripts(self) -> list:
+        compile_dir = self.GetDirectory("compile")
+        self.GetDirectory("compile/bitfile")
+
+        self._logging.info("Writing to TCL script...")
+
+        blocks = self.GetOocBlocks()
+        files = self._files
+        if blocks:
+            # out of context blocks are linked from their checkpoints, only their stubs are read
+            types = dict([(i.dir, i.type) for i in self._files])
+            top_files = self.GetIndex().Closure(self.top, [i.dir for i in self._files], set([i.name for i in blocks]))
+            if top_files is not None:
+                files = [RepFile(i, types[i]) for i in top_files]
+
+        xilinx7_synth = self.THREADS
+        xilinx7_synth += "create_project -in_memory -part \"" + self.device + "\"\n"
+        if self.vhdl_2008:
+            xilinx7_synth += "set_property enable_vhdl_2008 1 [current_project]\n"
+        xilinx7_synth += self.ReadSources(files)
+        for i in blocks:
+            xilinx7_synth += ("read_vhdl " if i.type == 'VHDL' else "read_verilog ") + self.GetOocStub(i) + "\n"
+
+        ooc_scripts = []
+        if blocks:
+            self.GetDirectory("compile/ooc")
+            self._logging.info("Configuring out-of-context synthesis of " + ', '.join([i.name for i in blocks]) + "...")
+        for i in blocks:
+            xilinx7_ooc = self.THREADS
+            xilinx7_ooc += "create_project -in_memory -part \"" + self.device + "\"\n"
+            if self.vhdl_2008:
+                xilinx7_ooc += "set_property enable_vhdl_2008 1 [current_project]\n"
+            xilinx7_ooc += self.ReadSources([RepFile(x, '') for x in i.files])
+            xilinx7_ooc += "synth_design -mode out_of_context -flatten_hierarchy none -top " + i.name + " -part " + self.device + "\n"
+            xilinx7_ooc += "write_checkpoint -force ./ooc/" + i.name + ".dcp\n"
+            if i.type == 'VHDL':
+                xilinx7_ooc += "write_vhdl -force -mode synth_stub " + self.GetOocStub(i) + "\n"
+            else:
+                xilinx7_ooc += "write_verilog -force -mode synth_stub " + self.GetOocStub(i) + "\n"
+            ooc_scripts.append(self.WriteIfChanged(compile_dir + "/ooc/" + i.name + ".tcl", xilinx7_ooc))
+
+        self._logging.info("Configuring synthesis...")
+
+        xilinx7_synth += "synth_design -flatten_hierarchy none -top " + self.top + " -part " + self.device + "\n"
+        for i in blocks:
+            xilinx7_synth += "foreach cell [get_cells -hierarchical -filter {REF_NAME == " + i.name + "}] { read_checkpoint -cell $cell ./ooc/" + i.name + ".dcp }\n"
+        xilinx7_synth += "opt_design -retarget -propconst -bram_power_opt -verbose\n"
+        # a persistent session keeps the design in memory between stages,
+        # checkpoints are then only written when requested
+        checkpoints = self.WritesCheckpoints()
+        if checkpoints:
+            xilinx7_synth += "write_checkpoint -incremental_synth -force ./post_synth.dcp\n"
+
+        self._logging.info("Configuring place and route...")
+        xilinx7_par = self.THREADS
+        if not self._session:
+            xilinx7_par += "open_checkpoint ./post_synth.dcp\n"
+        xilinx7_par += "read_xdc ./pins.xdc\n"
+        xilinx7_par += "place_design\n"
+        xilinx7_par += "route_design -directive Explore\n"
+        if checkpoints:
+            xilinx7_par += "write_checkpoint -force ./post_par.dcp\n"
+
+        strategy_scripts = []
+        if self.GetStrategies():
+            self.GetDirectory("compile/strategy")
+        for n, i in enumerate(self.GetStrategies()):
+            name = './strategy/' + str(n)
+            xilinx7_strategy = self.THREADS
+            xilinx7_strategy += "open_checkpoint ./post_synth.dcp\n"
+            xilinx7_strategy += "read_xdc ./pins.xdc\n"
+            xilinx7_strategy += "place_design -directive " + i['place'] + "\n"
+            if i['phys_opt']:
+                xilinx7_strategy += "phys_opt_design\n"
+            # post-place estimate, lets the sweep drop runs a finished one already beats
+            xilinx7_strategy += self.WNS
+            xilinx7_strategy += "set pldude_placed [open " + name + ".placed w]\n"
+            xilinx7_strategy += "puts $pldude_placed $pldude_wns\n"
+            xilinx7_strategy += "close $pldude_placed\n"
+            xilinx7_strategy += "route_design -directive " + i['route'] + "\n"
+            xilinx7_strategy += "write_checkpoint -force " + name + ".dcp\n"
+            xilinx7_strategy += self.WNS
+            xilinx7_strategy += "set pldude_tns 0\n"
+            xilinx7_strategy += "foreach pldude_path [get_timing_paths -setup -max_paths 100000 -nworst 1 -slack_lesser_than 0] { set pldude_tns [expr {$pldude_tns + [get_property SLACK $pldude_path]}] }\n"
+            xilinx7_strategy += "set pldude_timing [open " + name + ".timing w]\n"
+            xilinx7_strategy += "puts $pldude_timing \"$pldude_wns $pldude_tns\"\n"
+            xilinx7_strategy += "close $pldude_timing\n"
+            strategy_scripts.append(self.WriteIfChanged(compile_dir + "/strategy/" + str(n) + ".tcl", xilinx7_strategy))
+
+        self._logging.info("Configuring bitstream write...")
+        xilinx7_bit = self.THREADS
+        if not self._session:
+            xilinx7_bit += "open_checkpoint ./post_par.dcp\n"
+        if self._compress:
+            # smaller bitstreams load faster over JTAG and from flash
+            xilinx7_bit += "set_property BITSTREAM.GENERAL.COMPRESS TRUE [current_design]\n"
+        xilinx7_bit += "write_bitstream -force ./bitfile/project.bit\n"
+
+        self._logging.info("Generating XDC file...")
+        xilinx7_xdc = 'set_property CFGBVS VCCO [current_design];\n'
+        xilinx7_xdc += 'set_property CONFIG_VOLTAGE 3.3 [current_design];\n'
+        for i in self.GetPins().items():
+            if type(i[1]) == str:
+                xilinx7_xdc += "set_property -dict { PACKAGE_PIN " + str(i[1]) + " IOSTANDARD LVCMOS33 } [get_ports { " + str(i[0]) + " }];\n"
+            elif type(i[1]) == dict:
+                xilinx7_xdc += "set_property -dict { PACKAGE_PIN " + str(i[1]['pkg']) + " IOSTANDARD " + str(i[1]['iostd']) + " } [get_ports { " + str(i[0]) + " }];\n"
+
+        return [
+            self.WriteIfChanged(compile_dir + "/synth.tcl", xilinx7_synth),
+            self.WriteIfChanged(compile_dir + "/par.tcl", xilinx7_par),
+            self.WriteIfChanged(compile_dir + "/bit.tcl", xilinx7_bit),
+            self.WriteIfChanged(compile_dir + "/pins.xdc", xilinx7_xdc)
+        ] + ooc_scripts + strategy_scripts
+
+    def GetArtifacts(self) -> dict:
+        compile_dir = self.GetDirectory('compile')
+        return {
+            'project.bit': compile_dir + '/bitfile/project.bit',
+            'post_synth.dcp': compile_dir + '/post_synth.dcp',
+            'post_par.dcp': compile_dir + '/post_par.dcp'
+        }
+
+    def GetArtifactValues(self) -> dict:
+        # a strategy sweep or out-of-context blocks build a different bitstream from the same sources
+        values = super().GetArtifactValues()
+        if self.GetStrategies():
+            values['strategies'] = self.GetStrategies()
+        if self.GetOocBlocks():
+            values['ooc'] = sorted([i.name for i in self.GetOocBlocks()])
+        return values
+
+    def GetFarmOutputs(self) -> tuple:
+        fetch, always = super().GetFarmOutputs()
+        if self._simulate_all is not None:
+            # failing testbenches are results too
+            sim_dir = self.GetDirectory('simulation')
+            always += [sim_dir + '/results.json', sim_dir + '/logs']
+        return fetch, always
+
+    def RunScript(self, msg : str, cwd : str, stage : str, previous : str = None):
+        script = './' + stage + '.tcl'
+        if not self._session:
+            self.RunSubprocess(msg, cwd, ['vivado.bat', '-mode', 'batch', '-source', script], timeout=self.GetTimeout(stage))
+            return
+
+        if self._compile_session is None or self._compile_session.proc.poll() is not None:
+            self._logging.info("Starting Vivado session...")
+            self._compile_session = self.OpenSession(cwd, ['vivado.bat', '-mode', 'tcl', '-nojournal'], b'Vivado% ')
+            self._session_stage = None
+
+        # the session only holds the previous stage's design if it ran in this session
+        command = 'source ' + script
+        if previous is None:
+            command = 'catch {close_project}; ' + command
+        elif self._session_stage != previous:
+            command = 'catch {close_project}; open_checkpoint ./post_' + previous + '.dcp; ' + command
+
+        self._session_stage = None
+        self.RunSession(msg, self._compile_session, command, self.GetTimeout(stage))
+        self._session_stage = stage
+
+    def compile(self):
+        compile_dir = self.GetDirectory("compile")
+        self.GetScripts()
+
+        volatile = not self.WritesCheckpoints()
+        strategies = self.GetStrategies()
+        blocks = self.GetOocBlocks()
+        stages = []
+        if blocks:
+            stages.append(Stage(
+                'ooc',
+                lambda: self.RunOoc(compile_dir),
+                inputs = sorted(set([x for i in blocks for x in i.files])) + [compile_dir + '/ooc/' + i.name + '.tcl' for i in blocks],
+                values = [i.name for i in blocks],
+                outputs = [compile_dir + '/ooc/' + i.name + '.dcp' for i in blocks]
+            ))
+        stages += [
+            Stage(
+                'synth',
+                lambda: self.RunScript("Executing synthesis...", compile_dir, 'synth'),
+                inputs = [i.dir for i in self._files] + [compile_dir + '/synth.tcl'],
+                values = self.GetFingerprintKey(),
+                outputs = [] if volatile else [compile_dir + '/post_synth.dcp'],
+                deps = ['ooc'] if blocks else [],
+                volatile = volatile
+            ),
+            Stage(
+                'par',
+                lambda: self.RunScript("Executing place and route...", compile_dir, 'par', 'synth'),
+                inputs = [compile_dir + '/par.tcl', compile_dir + '/pins.xdc'],
+                outputs = [] if volatile else [compile_dir + '/post_par.dcp'],
+                deps = ['synth'],
+                volatile = volatile
+            ) if not strategies else Stage(
+                'par',
+                lambda: self.RunStrategies(compile_dir),
+                inputs = [compile_dir + '/strategy/' + str(i) + '.tcl' for i in range(len(strategies))] + [compile_dir + '/pins.xdc'],
+                values = strategies,
+                outputs = [compile_dir + '/post_par.dcp'],
+                deps = ['synth']
+            ),
+            Stage(
+                'bit',
+                lambda: self.RunScript("Executing bitstream generation...", compile_dir, 'bit', 'par'),
+                inputs = [compile_dir + '/bit.tcl'],
+                outputs = [compile_dir + '/bitfile/project.bit'],
+                deps = ['par']
+            )
+        ]
+
+        try:
+            self.RunStages(stages)
+        finally:
+            # watch mode keeps the session warm for the next iteration
+            if self._compile_session and not self._keep_session:
+                self.CloseSession(self._compile_session)
+                self._compile_session = None
+        self.BuildProgramFiles()
+
+    def program(self):
+        if not os.path.exists(self.GetBitfile()):
+            self.compile()
+        self.GetProgramFile()
+
+        # one hw session for the scan, the selection and programming
+        with self.HardwareServer():
+            session = self.OpenHardware(self.GetRemote())
+            try:
+                self.ProgramCached(lambda: self.ScanDevices(session), lambda device: self.ProgramDevice(session, device))
+            finally:
+                self.CloseSession(session)
+        self._endargs.update({
+            'program': True
+        })
+        
+    def simulate(self):
+        sim_dir = self.GetDirectory("simulation")
+        sim_file = open(sim_dir + "/sim.prj", "w+")
+        self._logging.info("Writing simulation project file...")
+
+        for i in self._files:
+            file_ext = os.path.splitext(i.dir)
+            if len(file_ext) < 2:
+                continue
+
+            file_line = "work " + str(i.dir).replace('\\', '/') + "\n"
+            if file_ext[1] in (".vhd", ".vhdl"):
+                if self.vhdl_2008:
+                    file_line = "vhdl2008 " + file_line
+                else:
+                    file_line = "vhdl " + file_line
+            elif file_ext[1] == ".v":
+                file_line = "verilog " + file_line
+
+            sim_file.write(file_line)
+
+
+        sim_file.close()
+
+        if not os.path.exists(sim_dir + "/bat.tcl"):
+            self._logging.info("Writing tcl batch file...")
+            file_tcl = open(sim_dir + "/bat.tcl", "w+")
+            file_tcl.write("create_wave_config; add_wave /; set_property needs_save false [current_wave_config]")
+            file_tcl.close()
+
+        self.RunSubprocess('Executing xelab...', sim_dir, ["xelab.bat", "-prj", "./sim.prj", "-debug", "typical", "-s", "sim.out", "work." + self._to_simulate], timeout=self.GetTimeout('elaborate'))
+
+        self._logging.info('Executing iSim...')
+        isim_prog = self._procman.Start(['xsim.bat', 'sim.out', '-gui', '-tclbatch', './bat.tcl'], sim_dir, sink=lambda line: None)
+        isim_prog.Wait()
+        self._endargs.update({
+            'simulate': True
+        })
+
+    def CompileLibrary(self, sim_dir : str, index : HdlIndex, order : list):
+        # a file is recompiled when its content changed or a unit it uses was recompiled
+        state_path = sim_dir + '/compiled.json'
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        options = [self.vhdl_2008, self.ToolIdentity('xvhdl.bat'), self.ToolIdentity('xvlog.bat')]
+        if state.get('options', None) != options:
+            state = {'options': options, 'files': {}}
+
+        providers = {}
+        for i in order:
+            for x in index.Get(i)[1]:
+                providers.setdefault(x.lower(), []).append(i)
+
+        stale = set()
+        groups = []
+        for i in order:
+            record = index.Get(i)
+            deps = [y for x in record[2] | record[3] for y in providers.get(x, []) if y != i]
+            if state['files'].get(i, None) == record[0].hex() and not any([y in stale for y in deps]):
+                continue
+            stale.add(i)
+            # consecutive files of one language share a compiler run
+            language = 'VHDL' if os.path.splitext(i)[1] in ('.vhd', '.vhdl') else 'VERILOG'
+            if groups and groups[-1][0] == language:
+                groups[-1][1].append(i)
+            else:
+                groups.append((language, [i]))
+
+        if not groups:
+            self._logging.info('Simulation library is up to date')
+            return
+
+        for language, files in groups:
+            if language == 'VHDL':
+                args = ['xvhdl.bat'] + (['--2008'] if self.vhdl_2008 else []) + ['--work', 'work'] + files
+            else:
+                args = ['xvlog.bat', '--work', 'work'] + files
+            self.RunSubprocess('Compiling ' + str(len(files)) + ' files into the simulation library...', sim_dir, args, timeout=self.GetTimeout('elaborate'))
+            for i in files:
+                state['files'][i] = index.Get(i)[0].hex()
+            with open(state_path + '.tmp', 'w') as f:
+                json.dump(state, f)
+            os.replace(state_path + '.tmp', state_path)
+
+    def RunTestStep(self, log : logging.LoggerAdapter, msg : str, cwd : str, args : list, timeout : float) -> str:
+        # the reason the step failed, empty when it passed
+        start = time.perf_counter()
+        proc = self._procman.Start(args, cwd, timeout=timeout)
+        parser = self.LOG_PARSER(self._ignore, True)
+        reason = ''
+        try:
+            for line in proc:
+                text = line.decode(errors='replace').rstrip()
+                message = parser.Feed(line)
+                if message is not None:
+                    self.ArchiveMessage(proc.name, message)
+                if message is not None and message.fatal:
+                    reason = reason or message.text
+                elif re.match(r'(Error|Failure|Fatal): ', text):
+                    reason = reason or text
+                log.debug(text)
+            proc.Wait()
+        finally:
+            if proc.done.is_set():
+                self._profiler.RecordProcess(msg, start, proc.popen, proc.rusage)
+        self.CheckCancelled()
+        if proc.timed_out:
+            return 'Timed out after ' + str(timeout) + ' seconds'
+        if not reason and proc.returncode != 0:
+            reason = proc.name + ' exited with ' + str(proc.returncode)
+        return reason
+
+    def RunTestbench(self, sim_dir : str, index : HdlIndex, paths : list, name : str) -> dict:
+        from pldude.bconfigs.rack import PrefixAdapter
+        log = PrefixAdapter(self._logging, {'prefix': '(' + name + ') '})
+        EnterStage('simulate:' + name)
+        # xelab gets the testbench as declared, snapshots and logs are named by the lowercase key
+        snapshot = name.lower()
+        result = {'name': name, 'status': 'FAIL', 'reason': '', 'duration': 0.0, 'elaborated': False, 'log': 'logs/' + snapshot + '.log'}
+        start = time.monotonic()
+
+        # the snapshot only depends on the files the testbench reaches
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr([self.vhdl_2008, self.ToolIdentity('xelab.bat'), name]).encode())
+        for i in index.Closure(name, paths):
+            digest.update(i.encode())
+            digest.update(index.Get(i)[0])
+        key = digest.hexdigest()
+        key_path = sim_dir + '/snapshots/' + snapshot + '.key'
+        try:
+            with open(key_path, 'r') as f:
+                current = f.read()
+        except OSError:
+            current = None
+
+        if current != key or not os.path.isdir(sim_dir + '/xsim.dir/' + snapshot):
+            if current is not None:
+                os.remove(key_path)
+            log.info('Elaborating...')
+            result['elaborated'] = True
+            args = ['xelab.bat', '-debug', 'off', '-s', snapshot, '-log', 'logs/' + snapshot + '.elab.log', 'work.' + name]
+            result['reason'] = self.RunTestStep(log, 'xelab ' + name, sim_dir, args, self.GetTimeout('elaborate'))
+            if result['reason']:
+                result['duration'] = time.monotonic() - start
+                return result
+            with open(key_path, 'w') as f:
+                f.write(key)
+
+        log.info('Simulating...')
+        args = ['xsim.bat', snapshot, '-R', '-log', 'logs/' + snapshot + '.log']
+        result['reason'] = self.RunTestStep(log, 'xsim ' + name, sim_dir, args, self.GetTimeout('simulate'))
+        result['status'] = 'FAIL' if result['reason'] else 'PASS'
+        result['duration'] = time.monotonic() - start
+        (log.error if result['reason'] else log.info)(result['status'] + ' in %.1fs' % result['duration'])
+        return result
+
+    def SimulateAll(self):
+        sim_dir = self.GetDirectory("simulation")
+        self.GetDirectory("simulation/logs")
+        self.GetDirectory("simulation/snapshots")
+        start = time.monotonic()
+
+        index = self.GetIndex()
+        paths = [i.dir for i in self._files]
+        names = set()
+        for i in paths:
+            record = index.Get(i)
+            names |= record[1] - record[4]
+        pattern = re.compile(self._simulate_all, re.IGNORECASE)
+        names = sorted([i for i in names if pattern.search(i)])
+        if not names:
+            raise PLDudeError('No testbenches match ' + self._simulate_all, 2)
+
+        # one library holds every testbench's closure, in an order valid for all of them
+        order = []
+        for i in names:
+            order.extend([x for x in index.Closure(i, paths) if not x in order])
+        index.Save()
+
+        self.CompileLibrary(sim_dir, index, order)
+
+        jobs = max(1, int(self._sim_jobs or self.GetProcessors()))
+        self._logging.info('Running ' + str(len(names)) + ' testbenches, ' + str(jobs) + ' at a time...')
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(lambda i: self.RunTestbench(sim_dir, index, paths, i), names))
+
+        failed = [i for i in results if i['status'] != 'PASS']
+        report = {
+            'tests': results,
+            'passed': len(results) - len(failed),
+            'failed': len(failed),
+            'duration': time.monotonic() - start
+        }
+        with open(sim_dir + '/results.json.tmp', 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(sim_dir + '/results.json.tmp', sim_dir + '/results.json')
+
+        width = max([len(i['name']) for i in results] + [9])
+        print('')
+        print('Testbench'.ljust(width) + '  Status  Time')
+        for i in results:
+            line = i['name'].ljust(width) + '  ' + i['status'].ljust(6) + '  ' + ('%.1fs' % i['duration'])
+            if i['reason']:
+                line += '  ' + i['reason']
+            print(line)
+        print('Total wall time: %.1fs' % report['duration'])
+
+        if failed:
+            raise PLDudeError(str(len(failed)) + ' of ' + str(len(results)) + ' testbenches failed, see ' + sim_dir + '/results.json', 2)
+        self._endargs['simulate'] = True
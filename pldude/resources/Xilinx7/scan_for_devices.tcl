@@ -1,9 +1,11 @@
 puts "PLDUDE:BEGIN"
 foreach target [get_hw_targets] {
-    current_hw_target $target;
-    open_hw_target -quiet;
-    puts -nonewline $target; puts -nonewline " ";
-    puts [get_hw_devices -of_object [current_hw_target]];
-    close_hw_target -quiet;
+    puts "PLDUDE:TARGET $target"
+    current_hw_target $target
+    open_hw_target -quiet
+    foreach device [get_hw_devices -of_objects [current_hw_target]] {
+        puts "PLDUDE:DEVICE $device"
+    }
+    close_hw_target -quiet
 }
-puts "PLDUDE:END"
\ No newline at end of file
+puts "PLDUDE:END"
@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import uuid
+import errno
+import shutil
+import hashlib
+import contextlib
+
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# from linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+def Reflink(src : str, dst : str) -> bool:
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+def Materialize(src : str, dst : str) -> str:
+    """Places a copy of src at dst by the cheapest available means, returns the method used."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return 'hardlink'
+    tmp = dst + '.' + uuid.uuid4().hex[:8] + '.tmp'
+    try:
+        os.link(src, tmp)
+        method = 'hardlink'
+    except OSError:
+        if Reflink(src, tmp):
+            method = 'reflink'
+        else:
+            shutil.copyfile(src, tmp)
+            method = 'copy'
+    os.replace(tmp, dst)
+    # renaming onto another link of the same inode does nothing and leaves tmp behind
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    return method
+
+class ArtifactCache():
+    """Content-addressed store of build artifacts, shareable between checkouts.
+
+    Every entry is a directory objects/<key[:2]>/<key> holding the artifact files
+    and a manifest. Entries are assembled under tmp/ and renamed into place, so a
+    reader never sees a partial entry and of several concurrent writers of the
+    same key exactly one wins. The mtime of an entry is bumped on every hit and
+    the least recently used entries are evicted once the cache exceeds its size.
+    """
+
+    VERSION = 1
+    MANIFEST = 'manifest.json'
+    STALE = 60 * 60
+
+    def __init__(self, root : str, limit : int):
+        self.root = os.path.abspath(root)
+        self.limit = limit
+
+    def Key(self, values : dict) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(repr(self.VERSION).encode())
+        digest.update(json.dumps(values, sort_keys=True, default=repr).encode())
+        return digest.hexdigest()
+
+    def EntryDir(self, key : str) -> str:
+        return os.path.join(self.root, 'objects', key[:2], key)
+
+    def TempDir(self) -> str:
+        directory = os.path.join(self.root, 'tmp', uuid.uuid4().hex)
+        os.makedirs(directory)
+        return directory
+
+    def Lookup(self, key : str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.EntryDir(key), self.MANIFEST), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('key') != key:
+            return None
+        return manifest
+
+    def Fetch(self, key : str, targets : Dict[str, str]) -> Optional[List[str]]:
+        """Materializes the artifacts of key at the target paths, None on a miss.
+
+        Artifacts missing from the entry are skipped, the names of the ones
+        placed are returned together with the method used.
+        """
+        manifest = self.Lookup(key)
+        if manifest is None:
+            return None
+
+        entry = self.EntryDir(key)
+        placed = []
+        try:
+            for name, target in targets.items():
+                if not name in manifest['files']:
+                    continue
+                directory = os.path.dirname(target)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                placed.append(name + ' (' + Materialize(os.path.join(entry, name), target) + ')')
+            os.utime(entry)
+        except OSError:
+            # evicted while reading
+            return None
+        return placed
+
+    @contextlib.contextmanager
+    def Claim(self, key : str, waiting : Callable[[], None] = None):
+        """Holds the producer lock of key, so work shared between builds is only done once.
+
+        waiting is called when another process holds the lock. Without fcntl
+        concurrent producers race and the first Store wins, as before.
+        """
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.join(self.root, 'locks')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, key), 'a') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if waiting:
+                    waiting()
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def Store(self, key : str, sources : Dict[str, str], info : dict = {}) -> bool:
+        if self.Lookup(key) is not None:
+            try:
+                os.utime(self.EntryDir(key))
+            except OSError:
+                pass
+            return False
+
+        tmp = self.TempDir()
+        files = {}
+        try:
+            for name, source in sources.items():
+                if not os.path.exists(source):
+                    continue
+                Materialize(source, os.path.join(tmp, name))
+                files[name] = os.path.getsize(source)
+
+            with open(os.path.join(tmp, self.MANIFEST), 'w') as f:
+                json.dump({'key': key, 'files': files, 'created': time.time(), 'info': info}, f)
+
+            entry = self.EntryDir(key)
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                os.rename(tmp, entry)
+            except OSError as err:
+                # another writer inserted the same key first
+                if err.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                    return False
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.Evict()
+        return True
+
+    def Entries(self) -> list:
+        entries = []
+        objects = os.path.join(self.root, 'objects')
+        try:
+            shards = os.scandir(objects)
+        except OSError:
+            return entries
+        with shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as keys:
+                    for i in keys:
+                        try:
+                            with open(os.path.join(i.path, self.MANIFEST), 'r') as f:
+                                size = sum(json.load(f)['files'].values())
+                            entries.append((i.stat().st_mtime, size, i.path))
+                        except (OSError, ValueError, KeyError):
+                            continue
+        return entries
+
+    def Evict(self):
+        # leftovers of writers that died mid-insert
+        tmp = os.path.join(self.root, 'tmp')
+        try:
+            with os.scandir(tmp) as leftovers:
+                for i in leftovers:
+                    if time.time() - i.stat().st_mtime > self.STALE:
+                        shutil.rmtree(i.path, ignore_errors=True)
+        except OSError:
+            pass
+
+        entries = sorted(self.Entries())
+        total = sum([i[1] for i in entries])
+        for mtime, size, path in entries:
+            if total <= self.limit:
+                break
+            # move out of objects/ first so readers never see a half deleted entry
+            doomed = os.path.join(self.root, 'tmp', uuid.uuid4().hex)
+            try:
+                os.makedirs(os.path.dirname(doomed), exist_ok=True)
+                os.rename(path, doomed)
+            except OSError:
+                continue
+            shutil.rmtree(doomed, ignore_errors=True)
+            total -= size
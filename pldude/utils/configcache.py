@@ -0,0 +1,70 @@
+import os
+import time
+import pickle
+
+from typing import List, Optional
+from pldude.utils.fingerprint import FileRecord, FingerprintStore, HashFile
+
+class ConfigCache():
+    """Parsed configuration files, so repeat runs skip YAML entirely.
+
+    Every file is recorded with its size, mtime and content hash. A file whose
+    stat still matches is trusted without reading it, a touched file is hashed
+    and still hits when the content is the same. The values are only stored
+    after they passed validation.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path : str):
+        self.path = path
+
+    def Record(self, path : str) -> FileRecord:
+        st = os.stat(path)
+        return (st.st_size, st.st_mtime_ns, HashFile(path))
+
+    def Load(self, files : List[str]) -> Optional[list]:
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError):
+            return None
+
+        if type(data) != dict or data.get('version') != self.VERSION or data.get('names') != files:
+            return None
+
+        refreshed = False
+        records = list(data['files'])
+        for n, path in enumerate(files):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            size, mtime, digest = records[n]
+            # a file written in the same mtime tick as it was recorded is always hashed
+            if (st.st_size, st.st_mtime_ns) == (size, mtime) and data['time'] - mtime > FingerprintStore.RACY_NS:
+                continue
+            record = self.Record(path)
+            if record[2] != digest:
+                return None
+            records[n] = record
+            refreshed = True
+
+        if refreshed:
+            self.Save(files, data['values'], records)
+        return data['values']
+
+    def Save(self, files : List[str], values : list, records : List[FileRecord] = None):
+        if records is None:
+            records = [self.Record(i) for i in files]
+        directory = os.path.dirname(self.path)
+        try:
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp = self.path + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump({'version': self.VERSION, 'names': files, 'files': records, 'time': time.time_ns(), 'values': values}, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+        except OSError:
+            # a read-only checkout only loses the speedup
+            pass
@@ -0,0 +1,163 @@
+import os
+import re
+import time
+import pickle
+
+from typing import Dict, List, Tuple
+
+# (mtime_ns, matching file names, subdirectory names) of one directory
+DirRecord = Tuple[int, List[str], List[str]]
+
+class ExcludeRules():
+    """gitignore-style exclude patterns, matched against '/' separated paths
+    relative to the walked root. The last matching pattern wins and a leading
+    '!' re-includes what an earlier pattern excluded."""
+
+    def __init__(self, patterns : list):
+        self.patterns = list(patterns)
+        self._rules = []
+        for i in self.patterns:
+            i = str(i).strip()
+            if not i or i[0] == '#':
+                continue
+            negate = i[0] == '!'
+            if negate:
+                i = i[1:]
+            dir_only = i[-1] == '/'
+            i = i.strip('/') if dir_only else i
+            anchored = '/' in i.rstrip('/')
+            self._rules.append((re.compile(self.Translate(i.lstrip('/'), anchored)), negate, dir_only))
+
+    def Translate(self, pattern : str, anchored : bool) -> str:
+        regex = '' if anchored else '(?:.*/)?'
+        i = 0
+        while i < len(pattern):
+            c = pattern[i]
+            if pattern[i:i + 3] == '**/':
+                regex += '(?:.*/)?'
+                i += 3
+                continue
+            elif pattern[i:i + 2] == '**':
+                regex += '.*'
+                i += 2
+                continue
+            elif c == '*':
+                regex += '[^/]*'
+            elif c == '?':
+                regex += '[^/]'
+            else:
+                regex += re.escape(c)
+            i += 1
+        return regex + '$'
+
+    def Match(self, path : str, is_dir : bool) -> bool:
+        excluded = False
+        for regex, negate, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                excluded = not negate
+        return excluded
+
+class SourceWalker():
+    """Single pass os.scandir discovery of source files.
+
+    Only files with one of the given extensions are kept, VCS directories and the
+    build output directories are never entered. Every directory listing is
+    cached and reused while the directory's mtime is unchanged, a new, removed
+    or renamed entry always bumps the mtime of the directory holding it.
+    """
+
+    VERSION = 1
+    VCS_DIRS = ('.git', '.svn', '.hg', '.bzr', '__pycache__')
+
+    # see FingerprintStore.RACY_NS
+    RACY_NS = 2 * 1000 * 1000 * 1000
+
+    def __init__(self, path : str, extensions : tuple, exclude : list = [], prune : list = []):
+        self.path = path
+        self._extensions = tuple(extensions)
+        self._exclude = ExcludeRules(exclude)
+        self._prune = set([os.path.abspath(i) for i in prune])
+        self._dirs : Dict[str, DirRecord] = {}
+        self._visited = set()
+        self._walked = set()
+        self._dirty = False
+
+    def Key(self) -> tuple:
+        return (self._extensions, tuple(self._exclude.patterns), tuple(sorted(self._prune)))
+
+    def Load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return
+        if type(data) == dict and data.get('version') == self.VERSION and data.get('key') == self.Key():
+            self._dirs = data.get('dirs', {})
+
+    def Save(self):
+        # forget directories that were removed or are no longer walked
+        if len(self._visited) != len(self._dirs):
+            self._dirs = dict([(i, self._dirs[i]) for i in self._visited if i in self._dirs])
+            self._dirty = True
+        if not self._dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': self.VERSION, 'key': self.Key(), 'dirs': self._dirs}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def ListDir(self, directory : str, relative : str) -> DirRecord:
+        self._visited.add(directory)
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return (0, [], [])
+
+        record = self._dirs.get(directory)
+        if record and record[0] == mtime:
+            return record
+
+        files = []
+        dirs = []
+        with os.scandir(directory) as entries:
+            for i in entries:
+                path = relative + i.name
+                if i.is_dir():
+                    if i.name in self.VCS_DIRS or os.path.abspath(i.path) in self._prune:
+                        continue
+                    if self._exclude.Match(path, True):
+                        continue
+                    dirs.append(i.name)
+                elif i.name.endswith(self._extensions):
+                    if os.path.splitext(i.name)[1] in self._extensions and not self._exclude.Match(path, False):
+                        files.append(i.name)
+
+        if time.time_ns() - mtime < self.RACY_NS:
+            mtime = -1
+        record = (mtime, sorted(files), sorted(dirs))
+        self._dirs[directory] = record
+        self._dirty = True
+        return record
+
+    def Walk(self, root : str) -> List[str]:
+        found = []
+        stack = [(os.path.abspath(root), '')]
+        while stack:
+            directory, relative = stack.pop()
+            # symlink loops and overlapping roots, a linked directory is walked once by its real path
+            real = os.path.realpath(directory)
+            if directory in self._visited or real in self._walked:
+                continue
+            self._walked.add(real)
+            record = self.ListDir(directory, relative)
+            prefix = directory + os.sep
+            found.extend([prefix + i for i in record[1]])
+            for i in reversed(record[2]):
+                stack.append((prefix + i, relative + i + '/'))
+        return found
@@ -1,4 +1,5 @@
-from logging import CRITICAL
+# logging.CRITICAL, the error type is needed before logging is set up
+CRITICAL = 50
 
 class PLDudeError(Exception):
     def __init__(self, err : str, exitcode : int, level : int = CRITICAL):
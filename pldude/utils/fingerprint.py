@@ -0,0 +1,107 @@
+import os
+import time
+import pickle
+import hashlib
+
+from typing import Dict, Iterable, Optional, Tuple
+
+# (size, mtime_ns, digest) of a file at the time it was last hashed
+FileRecord = Tuple[int, int, bytes]
+
+def HashFile(path : str) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(FingerprintStore.CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.digest()
+
+class FingerprintStore():
+    """Content-hash record of the inputs of the last successful build stages.
+
+    Files are compared by content, stat() is only used as a fast path: a file is
+    re-hashed when its size or mtime moved since it was recorded. The store is a
+    single pickle under ./gen, so loading it costs one read even on large trees.
+    """
+
+    VERSION = 2
+    CHUNK_SIZE = 1 << 20
+
+    # Files modified this close to the moment they were hashed could change again
+    # within the same mtime tick, never trust their stat on the next run
+    RACY_NS = 2 * 1000 * 1000 * 1000
+
+    def __init__(self, path : str):
+        self.path = path
+        self._stages : Dict[str, bytes] = {}
+        self._files : Dict[str, FileRecord] = {}
+        self._seen : Dict[str, FileRecord] = {}
+        self._dirty = False
+
+    def Load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return
+
+        if type(data) != dict or data.get('version') != self.VERSION:
+            return
+
+        self._stages = data.get('stages', {})
+        self._files = data.get('files', {})
+
+    def Save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({
+                'version': self.VERSION,
+                'stages': self._stages,
+                'files': self._files
+            }, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def Digest(self, path : str) -> Optional[bytes]:
+        record = self._seen.get(path)
+        if record:
+            return record[2]
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        record = self._files.get(path)
+        if not (record and record[0] == st.st_size and record[1] == st.st_mtime_ns):
+            mtime = st.st_mtime_ns
+            if time.time_ns() - mtime < self.RACY_NS:
+                mtime = -1
+            digest = HashFile(path)
+            if record and record[2] == digest:
+                # Same content under a new stat (touch, checkout), refresh the fast path
+                self._files[path] = (st.st_size, mtime, digest)
+                self._dirty = True
+            record = (st.st_size, mtime, digest)
+
+        self._seen[path] = record
+        return record[2]
+
+    def StageDigest(self, name : str) -> Optional[bytes]:
+        return self._stages.get(name)
+
+    def CommitStage(self, name : str, digest : bytes, paths : Iterable[str]):
+        for path in paths:
+            if self.Digest(path) is not None:
+                self._files[path] = self._seen[path]
+        self._stages[name] = digest
+        self.Save()
+
+    def IsDirty(self) -> bool:
+        return self._dirty
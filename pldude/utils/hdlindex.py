@@ -0,0 +1,176 @@
+import os
+import re
+import pickle
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# (digest, provides, requires, extends, packages) of one source file, packages
+# are the provided units that cannot be instantiated. Provided units keep their
+# declared spelling, Verilog is case sensitive, the units used are lowercase keys
+IndexRecord = Tuple[bytes, Set[str], Set[str], Set[str], Set[str]]
+
+VHDL_COMMENT = re.compile(r'--[^\n]*')
+VHDL_ENTITY = re.compile(r'\b(entity|package)\s+(\w+)\s+is\b', re.IGNORECASE)
+VHDL_EXTENDS = re.compile(r'\b(?:architecture\s+\w+\s+of|package\s+body)\s+(\w+)\s+is\b', re.IGNORECASE)
+VHDL_USE = re.compile(r'\buse\s+\w+\.(\w+)', re.IGNORECASE)
+VHDL_INSTANCE = re.compile(r'\w+\s*:\s*(?:(?:entity|component)\s+)?(?:\w+\.)?(\w+)\s*(?:\(\s*\w+\s*\)\s*)?(?:generic|port)\s+map\b', re.IGNORECASE)
+
+VERILOG_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+VERILOG_MODULE = re.compile(r'\b(module|package|interface)\s+(?:automatic\s+|static\s+)?(\w+)')
+VERILOG_IMPORT = re.compile(r'\bimport\s+(\w+)\s*::')
+VERILOG_INSTANCE = re.compile(r'\b(\w+)\s*(?:#\s*\(|\w+\s*(?:\[[^\]]*\]\s*)?\()')
+
+VERILOG_KEYWORDS = set([
+    'module', 'endmodule', 'input', 'output', 'inout', 'wire', 'reg', 'logic', 'assign', 'always',
+    'always_ff', 'always_comb', 'initial', 'if', 'else', 'for', 'while', 'case', 'begin', 'end',
+    'function', 'task', 'return', 'generate', 'parameter', 'localparam', 'posedge', 'negedge', 'or',
+    'and', 'not', 'integer', 'genvar', 'signed', 'unsigned', 'default', 'repeat', 'forever'
+])
+
+def ScanVHDL(text : str) -> Tuple[Set[str], Set[str], Set[str], Set[str]]:
+    text = VHDL_COMMENT.sub('', text).lower()
+    units = [i for i in VHDL_ENTITY.findall(text) if i[1] != 'body']
+    provides = set([i[1] for i in units])
+    packages = set([i[1] for i in units if i[0] == 'package'])
+    extends = set(VHDL_EXTENDS.findall(text))
+    requires = set(VHDL_USE.findall(text)) | set(VHDL_INSTANCE.findall(text))
+    return provides, requires, extends, packages
+
+def ScanVerilog(text : str) -> Tuple[Set[str], Set[str], Set[str], Set[str]]:
+    text = VERILOG_COMMENT.sub('', text)
+    units = VERILOG_MODULE.findall(text)
+    provides = set([i[1] for i in units])
+    packages = set([i[1] for i in units if i[0] != 'module'])
+    requires = set([i.lower() for i in VERILOG_IMPORT.findall(text)])
+    requires |= set([i.lower() for i in VERILOG_INSTANCE.findall(text) if not i in VERILOG_KEYWORDS])
+    return provides, requires, set(), packages
+
+class HdlIndex():
+    """Cached per-file index of the design units each HDL source declares and uses.
+
+    Files are only rescanned when their content digest changed, the index is
+    used to prune a source list to the files reachable from a top-level unit
+    and to order it so every file follows the files it depends on.
+    """
+
+    VERSION = 3
+
+    def __init__(self, path : str, digest : Callable[[str], Optional[bytes]]):
+        self.path = path
+        self._digest = digest
+        self._records : Dict[str, IndexRecord] = {}
+        self._dirty = False
+
+    def Load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return
+        if type(data) == dict and data.get('version') == self.VERSION:
+            self._records = data.get('records', {})
+
+    def Save(self):
+        if not self._dirty:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': self.VERSION, 'records': self._records}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def Get(self, path : str) -> IndexRecord:
+        digest = self._digest(path)
+        record = self._records.get(path)
+        if record and record[0] == digest:
+            return record
+
+        with open(path, 'r', errors='replace') as f:
+            text = f.read()
+        if os.path.splitext(path)[1] in ('.vhd', '.vhdl'):
+            units = ScanVHDL(text)
+        else:
+            units = ScanVerilog(text)
+
+        record = (digest, units[0], units[1], units[2], units[3])
+        self._records[path] = record
+        self._dirty = True
+        return record
+
+    def Provider(self, name : str, paths : List[str]) -> Optional[Tuple[str, str]]:
+        """File declaring the unit name and the unit's declared spelling."""
+        key = name.lower()
+        for i in paths:
+            for x in self.Get(i)[1]:
+                if x.lower() == key:
+                    return i, x
+        return None
+
+    def Children(self, top : str, paths : List[str]) -> List[str]:
+        """Design units instantiated by top that are declared in the tree."""
+        providers = {}
+        packages = set()
+        for i in paths:
+            record = self.Get(i)
+            for x in record[1]:
+                providers[x.lower()] = x
+            packages |= set([x.lower() for x in record[4]])
+
+        top = top.lower()
+        children = set()
+        for i in paths:
+            record = self.Get(i)
+            if top in [x.lower() for x in record[1]] or top in record[3]:
+                children |= record[2]
+        return sorted([providers[i] for i in children if i in providers and not i in packages and i != top])
+
+    def Closure(self, top : str, paths : List[str], leaves : Set[str] = set()) -> Optional[List[str]]:
+        providers : Dict[str, List[str]] = {}
+        extenders : Dict[str, List[str]] = {}
+        for i in paths:
+            record = self.Get(i)
+            for x in record[1]:
+                providers.setdefault(x.lower(), []).append(i)
+            for x in record[3]:
+                extenders.setdefault(x, []).append(i)
+
+        top = top.lower()
+        leaves = set([i.lower() for i in leaves])
+        if not top in providers:
+            return None
+
+        # file -> files it depends on, only following names declared in the tree
+        deps : Dict[str, List[str]] = {}
+        stack = list(providers[top])
+        while stack:
+            path = stack.pop()
+            if path in deps:
+                continue
+            record = self.Get(path)
+            deps[path] = []
+            # leaves are linked in from elsewhere, their sources are not followed
+            for x in (record[2] | record[3]) - leaves:
+                deps[path].extend([y for y in providers.get(x, []) if y != path])
+            for x in record[1]:
+                for y in extenders.get(x.lower(), []):
+                    if y != path and not y in deps:
+                        stack.append(y)
+            stack.extend([y for y in deps[path] if not y in deps])
+
+        order = []
+        visited = set()
+        for i in paths:
+            if not i in deps or i in visited:
+                continue
+            visited.add(i)
+            walk = [(i, iter(deps[i]))]
+            while walk:
+                node, children = walk[-1]
+                child = next(children, None)
+                if child is None:
+                    walk.pop()
+                    order.append(node)
+                elif not child in visited:
+                    visited.add(child)
+                    walk.append((child, iter(deps[child])))
+        return order
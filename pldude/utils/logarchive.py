@@ -0,0 +1,316 @@
+import os
+import re
+import json
+import time
+import zlib
+import threading
+import collections
+
+from typing import Dict, Iterator, List
+from pldude.utils.logparse import LogMessage
+
+# stage, severity, message id, text, ignored
+LogRecord = tuple
+
+def Pack(columns : tuple) -> bytes:
+    # one flag byte per record, then the four text columns one field per line
+    stages, severities, ids, texts, ignored = columns
+    fields = stages + severities + ids + texts
+    data = '\n'.join(fields)
+    if data.count('\n') != len(fields) - 1:
+        data = '\n'.join([i.replace('\n', ' ') for i in fields])
+    return bytes(ignored) + data.encode()
+
+def Unpack(data : bytes, count : int) -> Iterator[LogRecord]:
+    fields = data[count:].decode().split('\n')
+    return zip(fields[:count], fields[count:2 * count], fields[2 * count:3 * count], fields[3 * count:], [bool(i) for i in data[:count]])
+
+class LogWriter():
+    """Records the messages of one build into its archive.
+
+    Records are kept in columns and packed into blocks of BLOCK messages, every
+    full block is counted, compressed and appended to the log file right away so
+    a multi-gigabyte tool log never sits in memory. The index is only written
+    when the build is closed, a build that never closes stays invisible to
+    queries.
+    """
+
+    def __init__(self, archive : 'LogArchive', build : int, info : dict, levels : Dict[str, int]):
+        self._archive = archive
+        self._lock = threading.Lock()
+        self._file = open(archive.LogPath(build), 'ab')
+        self._columns = ([], [], [], [], [])
+        self._offset = 0
+        self._index = {
+            'version': LogArchive.VERSION,
+            'build': build,
+            'started': time.time(),
+            'finished': None,
+            'status': None,
+            'info': info,
+            'records': 0,
+            'ignored': 0,
+            'levels': levels,
+            'blocks': [],
+            'severities': {},
+            'stages': {},
+            'ids': {}
+        }
+
+    def Add(self, stage : str, message : LogMessage):
+        self.Extend(stage, [message])
+
+    def Extend(self, stage : str, messages : List[LogMessage]):
+        with self._lock:
+            if self._file is None:
+                return
+            stages, severities, ids, texts, ignored = self._columns
+            stages.extend([stage] * len(messages))
+            severities.extend([i.severity for i in messages])
+            ids.extend([i.id for i in messages])
+            texts.extend([i.text for i in messages])
+            ignored.extend([i.ignored for i in messages])
+            if len(stages) >= LogArchive.BLOCK:
+                self.Flush()
+
+    def Count(self, table : dict, key : str, count : int, block : int):
+        entry = table.get(key, None)
+        if entry is None:
+            entry = table[key] = {'count': 0, 'blocks': []}
+        entry['count'] += count
+        if not entry['blocks'] or entry['blocks'][-1] != block:
+            entry['blocks'].append(block)
+
+    def Flush(self):
+        stages, severities, ids, texts, ignored = self._columns
+        if not stages:
+            return
+        block = len(self._index['blocks'])
+        data = zlib.compress(Pack(self._columns), 1)
+        self._file.write(data)
+        self._index['blocks'].append((self._offset, len(data), len(stages)))
+        self._index['records'] += len(stages)
+        self._offset += len(data)
+
+        # counted per block, a handful of distinct keys instead of every record
+        first = None
+        for (stage, severity, id, skipped), count in collections.Counter(zip(stages, severities, ids, ignored)).items():
+            self.Count(self._index['severities'], severity, count, block)
+            self.Count(self._index['stages'], stage, count, block)
+            if skipped:
+                self._index['ignored'] += count
+            if not id:
+                continue
+            entry = self._index['ids'].get(id, None)
+            if entry is None:
+                if first is None:
+                    first = dict(zip(reversed(ids), reversed(texts)))
+                entry = self._index['ids'][id] = {'severity': severity, 'count': 0, 'ignored': 0, 'stages': {}, 'blocks': [], 'text': first[id]}
+            entry['count'] += count
+            if skipped:
+                entry['ignored'] += count
+            entry['stages'][stage] = entry['stages'].get(stage, 0) + count
+            if not entry['blocks'] or entry['blocks'][-1] != block:
+                entry['blocks'].append(block)
+        self._columns = ([], [], [], [], [])
+
+    def Close(self, status : str):
+        with self._lock:
+            if self._file is None:
+                return
+            self.Flush()
+            self._file.close()
+            self._file = None
+            self._index['finished'] = time.time()
+            self._index['status'] = status
+            self._archive.WriteIndex(self._index)
+        self._archive.Prune()
+
+class LogArchive():
+    """Compressed per-build archive of the parsed tool messages.
+
+    Every build leaves <n>.log, zlib compressed blocks of records, and <n>.idx,
+    a small JSON index with the message count per severity, stage and message
+    id and the blocks each of them occurs in. Listing, diffing and tracking a
+    message across builds only read indexes, a filtered query only inflates
+    the blocks the index points at.
+    """
+
+    VERSION = 1
+    BLOCK = 4096
+
+    def __init__(self, directory : str, history : int = 20):
+        self.directory = directory
+        self.history = history
+
+    def LogPath(self, build : int) -> str:
+        return os.path.join(self.directory, str(build) + '.log')
+
+    def IndexPath(self, build : int) -> str:
+        return os.path.join(self.directory, str(build) + '.idx')
+
+    def Builds(self) -> List[int]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted([int(i[:-4]) for i in names if i.endswith('.idx') and i[:-4].isdigit()])
+
+    def Open(self, info : dict, levels : Dict[str, int] = {}) -> LogWriter:
+        # levels maps the tool severities to logging levels, for the error and warning totals
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        build = max([0] + self.Builds() + [int(i[:-4]) for i in os.listdir(self.directory) if i.endswith('.log') and i[:-4].isdigit()]) + 1
+        # concurrent builds in the same directory each claim their own number
+        while True:
+            try:
+                os.close(os.open(self.LogPath(build), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                break
+            except FileExistsError:
+                build += 1
+        return LogWriter(self, build, info, dict(levels))
+
+    def WriteIndex(self, index : dict):
+        path = self.IndexPath(index['build'])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def Prune(self):
+        if self.history <= 0:
+            return
+        builds = self.Builds()
+        if len(builds) <= self.history:
+            return
+        oldest = builds[-self.history]
+        # logs of builds that never closed go with the indexed builds around them
+        stale = [int(i[:-4]) for i in os.listdir(self.directory) if i.endswith('.log') and i[:-4].isdigit()]
+        for build in set([i for i in builds + stale if i < oldest]):
+            for path in (self.IndexPath(build), self.LogPath(build)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def Resolve(self, ref : str) -> int:
+        """Build number of 'last', 'prev', a build number or a negative offset from the last build."""
+        builds = self.Builds()
+        if not builds:
+            raise ValueError('No builds archived in ' + self.directory)
+        ref = {'last': '-1', 'prev': '-2'}.get(ref, ref)
+        try:
+            n = int(ref)
+        except ValueError:
+            raise ValueError('Unknown build: ' + ref)
+        if n < 0:
+            if -n > len(builds):
+                raise ValueError('Only ' + str(len(builds)) + ' builds archived')
+            return builds[n]
+        if not n in builds:
+            raise ValueError('Build ' + str(n) + ' is not archived')
+        return n
+
+    def Index(self, build : int) -> dict:
+        with open(self.IndexPath(build), 'r') as f:
+            index = json.load(f)
+        if index.get('version') != self.VERSION:
+            raise ValueError('Build ' + str(build) + ' was archived by another PLDude version')
+        return index
+
+    def Size(self, build : int) -> int:
+        size = 0
+        for path in (self.IndexPath(build), self.LogPath(build)):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def Query(self, build : int, ids : List[str] = [], severities : List[str] = [], stages : List[str] = [], pattern : str = None, ignored : bool = False) -> Iterator[LogRecord]:
+        index = self.Index(build)
+        severities = [i.lower() for i in severities]
+
+        # every filter narrows the blocks worth inflating
+        blocks = None
+        for wanted, table in ((ids, index['ids']), (stages, index['stages'])):
+            if wanted:
+                found = set()
+                for i in wanted:
+                    found.update(table.get(i, {'blocks': []})['blocks'])
+                blocks = found if blocks is None else blocks & found
+        if severities:
+            found = set()
+            for name, entry in index['severities'].items():
+                if name.lower() in severities:
+                    found.update(entry['blocks'])
+            blocks = found if blocks is None else blocks & found
+        if blocks is None:
+            blocks = range(len(index['blocks']))
+
+        try:
+            regex = re.compile(pattern) if pattern else None
+        except re.error as err:
+            raise ValueError('Invalid pattern ' + pattern + ': ' + str(err))
+        with open(self.LogPath(build), 'rb') as f:
+            for n in sorted(blocks):
+                offset, length, count = index['blocks'][n]
+                f.seek(offset)
+                for record in Unpack(zlib.decompress(f.read(length)), count):
+                    stage, severity, id, text, skipped = record
+                    if skipped and not ignored:
+                        continue
+                    if ids and not id in ids:
+                        continue
+                    if stages and not stage in stages:
+                        continue
+                    if severities and not severity.lower() in severities:
+                        continue
+                    if regex and not regex.search(text):
+                        continue
+                    yield tuple(record)
+
+    def Diff(self, old : int, new : int) -> List[tuple]:
+        """(id, severity, old count, new count, sample text) of every message id whose count changed."""
+        before = self.Index(old)['ids']
+        after = self.Index(new)['ids']
+        changes = []
+        for id in sorted(set(before) | set(after)):
+            a = before.get(id, None)
+            b = after.get(id, None)
+            count_a = a['count'] - a['ignored'] if a else 0
+            count_b = b['count'] - b['ignored'] if b else 0
+            if count_a != count_b:
+                entry = b or a
+                changes.append((id, entry['severity'], count_a, count_b, entry['text']))
+        return changes
+
+    def History(self, id : str) -> List[tuple]:
+        """(build, started, count) of the message id in every archived build."""
+        history = []
+        for build in self.Builds():
+            try:
+                index = self.Index(build)
+            except (OSError, ValueError):
+                continue
+            entry = index['ids'].get(id, None)
+            history.append((build, index['started'], entry['count'] - entry['ignored'] if entry else 0))
+        return history
+
+    @staticmethod
+    def Find(root : str = './gen') -> Dict[str, str]:
+        # backend or backend/variant -> archive directory
+        found = {}
+        try:
+            backends = sorted(os.listdir(root))
+        except OSError:
+            return found
+        for backend in backends:
+            path = os.path.join(root, backend)
+            if not os.path.isdir(path):
+                continue
+            if LogArchive(os.path.join(path, 'logs')).Builds():
+                found[backend] = os.path.join(path, 'logs')
+            for variant in sorted(os.listdir(path)):
+                if variant != 'logs' and LogArchive(os.path.join(path, variant, 'logs')).Builds():
+                    found[backend + '/' + variant] = os.path.join(path, variant, 'logs')
+        return found
@@ -0,0 +1,89 @@
+import re
+import logging
+
+from typing import Iterable, Iterator, Optional
+
+class LogMessage():
+    __slots__ = ('severity', 'id', 'text', 'level', 'fatal', 'ignored')
+
+    def __init__(self, severity : str, id : str, text : str, level : int, fatal : bool, ignored : bool = False):
+        self.severity = severity
+        self.id = id
+        self.text = text
+        self.level = level
+        self.fatal = fatal
+        self.ignored = ignored
+
+class LogParser():
+    """Streaming parser for vendor tool output.
+
+    Lines are consumed one at a time from any iterable of bytes (a pipe, a file
+    or a tool session) and matched as bytes, only the captured fields of a
+    matching line are decoded. Every pattern is compiled once per parser and the
+    ignore list is merged into a single alternation. Warnings on the ignore list
+    are dropped, or yielded marked as ignored when keep_ignored is set.
+    """
+
+    # regex with (severity, id, text) groups, matched against raw bytes
+    PATTERN = None
+
+    # tool severity -> (logging level, fatal)
+    SEVERITIES = {}
+
+    def __init__(self, ignore : list = [], keep_ignored : bool = False):
+        self._pattern = re.compile(self.PATTERN)
+        self._keep_ignored = keep_ignored
+        self._ignore = None
+        if ignore:
+            self._ignore = re.compile('|'.join(['(?:' + i + ')' for i in ignore]))
+
+    def Feed(self, line : bytes) -> Optional[LogMessage]:
+        match = self._pattern.match(line.rstrip(b'\r\n'))
+        if not match:
+            return None
+
+        severity = match.group(1).decode()
+        level, fatal = self.SEVERITIES[severity]
+        id = match.group(2)
+        id = id.decode(errors='replace') if id else ''
+        ignored = level == logging.WARNING and id and self._ignore and self._ignore.match(id) is not None
+        if ignored and not self._keep_ignored:
+            return None
+
+        return LogMessage(severity, id, match.group(3).decode(errors='replace'), level, fatal, bool(ignored))
+
+    def Parse(self, stream : Iterable[bytes]) -> Iterator[LogMessage]:
+        feed = self.Feed
+        for line in stream:
+            message = feed(line)
+            if message:
+                yield message
+
+class VivadoLog(LogParser):
+    PATTERN = rb'(INFO|WARNING|ERROR|CRITICAL): \[(.*)] (.*)'
+
+    # bring tool info level messages downto debug for PLDude
+    SEVERITIES = {
+        'INFO': (logging.DEBUG, False),
+        'WARNING': (logging.WARNING, False),
+        'ERROR': (logging.ERROR, True),
+        'CRITICAL': (logging.CRITICAL, True)
+    }
+
+class QuartusLog(LogParser):
+    PATTERN = rb'^(Info|(?:Critical )?Warning|Error|Critical)[:]? (?:\((.*)\): )?(.*)'
+
+    SEVERITIES = {
+        'Info': (logging.DEBUG, False),
+        'Warning': (logging.WARNING, False),
+        'Critical Warning': (logging.WARNING, False),
+        'Error': (logging.ERROR, True),
+        'Critical': (logging.CRITICAL, True)
+    }
+
+    def Feed(self, line : bytes) -> Optional[LogMessage]:
+        message = super().Feed(line)
+        # banner lines
+        if message and message.severity == 'Info' and message.text[0:5] == '*****':
+            return None
+        return message
@@ -0,0 +1,214 @@
+import os
+import sys
+import queue
+import signal
+import threading
+import subprocess
+
+from typing import Callable, Iterator, List, Optional, TYPE_CHECKING
+from pldude.utils.profile import WaitProcess
+
+if TYPE_CHECKING:
+    import asyncio
+
+def GroupArgs() -> dict:
+    # every tool gets its own process group so wrapper scripts and their children die together
+    if os.name == 'posix':
+        return {'start_new_session': True}
+    return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+
+def SignalGroup(popen : subprocess.Popen, kill : bool = False):
+    if os.name == 'posix':
+        try:
+            os.killpg(popen.pid, signal.SIGKILL if kill else signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+    elif kill:
+        subprocess.call(['taskkill', '/F', '/T', '/PID', str(popen.pid)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elif popen.returncode is None:
+        try:
+            popen.send_signal(signal.CTRL_BREAK_EVENT)
+        except OSError:
+            pass
+
+class ManagedProcess():
+    """A tool process whose stdout and stderr are drained by the ProcessManager.
+
+    Output lines are queued in batches as they arrive, iterating the process
+    yields them until both pipes are closed. When a sink was given the lines go
+    to the sink instead and nothing has to be consumed.
+    """
+
+    def __init__(self, popen : subprocess.Popen, name : str, timeout : Optional[float]):
+        self.popen = popen
+        self.name = name
+        self.timeout = timeout
+        self.timed_out = False
+        self.cancelled = False
+        self.rusage = None
+        self.stdin = popen.stdin
+        self.pid = popen.pid
+        self.done = threading.Event()
+        self._lines = queue.Queue()
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.popen.returncode
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            batch = self._lines.get()
+            if batch is None:
+                return
+            yield from batch
+
+    def Wait(self, timeout : Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+class ProcessManager():
+    """Runs tool processes with an asyncio loop on a private thread.
+
+    The loop drains the pipes of every child concurrently, so a chatty process
+    that nobody reads (hw_server) can never block on a full pipe, reaps children
+    with wait4 to keep their resource usage, and enforces per process timeouts
+    by killing the whole process group.
+    """
+
+    GRACE = 5.0
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._procs : List[ManagedProcess] = []
+        self._adopted : List[subprocess.Popen] = []
+
+    def __getstate__(self) -> dict:
+        # matrix jobs each start their own loop in their worker
+        return {}
+
+    def __setstate__(self, state : dict):
+        self.__init__()
+
+    def Loop(self) -> 'asyncio.AbstractEventLoop':
+        # asyncio is only imported once the first tool starts, runs that never launch one skip it
+        import asyncio
+        with self._lock:
+            if self._loop is None:
+                if sys.platform == 'win32':
+                    self._loop = asyncio.ProactorEventLoop()
+                else:
+                    self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='pldude-procman', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def Start(self, args : list, cwd : str, stdin : bool = False, sink : Callable[[bytes], None] = None, timeout : Optional[float] = None, env : dict = None) -> ManagedProcess:
+        popen = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.PIPE if stdin else subprocess.DEVNULL,
+            **GroupArgs()
+        )
+        proc = ManagedProcess(popen, os.path.basename(args[0]), timeout)
+        with self._lock:
+            self._procs = [i for i in self._procs if not i.done.is_set()]
+            self._procs.append(proc)
+        loop = self.Loop()
+        import asyncio
+        asyncio.run_coroutine_threadsafe(self.Supervise(proc, sink), loop)
+        return proc
+
+    def Adopt(self, popen : subprocess.Popen):
+        # processes driven directly (tool sessions) are only killed and reaped on Terminate
+        with self._lock:
+            self._adopted = [i for i in self._adopted if i.returncode is None]
+            self._adopted.append(popen)
+
+    async def Drain(self, pipe, emit : Callable[[list], None]):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=self.CHUNK_SIZE)
+        transport = (await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe))[0]
+        rest = b''
+        try:
+            while True:
+                chunk = await reader.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines = (rest + chunk).split(b'\n')
+                rest = lines.pop()
+                if lines:
+                    emit([i + b'\n' for i in lines])
+            if rest:
+                emit([rest])
+        finally:
+            transport.close()
+
+    async def Supervise(self, proc : ManagedProcess, sink : Callable[[bytes], None]):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if sink is None:
+            emit = proc._lines.put
+        else:
+            emit = lambda lines: [sink(i) for i in lines]
+
+        try:
+            drains = asyncio.gather(self.Drain(proc.popen.stdout, emit), self.Drain(proc.popen.stderr, emit), return_exceptions=True)
+            reaped = loop.run_in_executor(None, WaitProcess, proc.popen)
+            try:
+                await asyncio.wait_for(asyncio.shield(reaped), proc.timeout)
+            except asyncio.TimeoutError:
+                proc.timed_out = True
+                SignalGroup(proc.popen)
+                try:
+                    await asyncio.wait_for(asyncio.shield(reaped), self.GRACE)
+                except asyncio.TimeoutError:
+                    SignalGroup(proc.popen, True)
+            proc.rusage = await reaped
+
+            # children left behind by the tool may still hold the pipes open
+            try:
+                await asyncio.wait_for(drains, self.GRACE if proc.timed_out or proc.cancelled else None)
+            except asyncio.TimeoutError:
+                SignalGroup(proc.popen, True)
+        finally:
+            if sink is None:
+                proc._lines.put(None)
+            proc.done.set()
+
+    def Running(self) -> List[ManagedProcess]:
+        with self._lock:
+            return [i for i in self._procs if not i.done.is_set()]
+
+    def Cancel(self, proc : ManagedProcess):
+        proc.cancelled = True
+        SignalGroup(proc.popen)
+        if not proc.Wait(self.GRACE):
+            SignalGroup(proc.popen, True)
+            proc.Wait()
+
+    def Terminate(self):
+        procs = self.Running()
+        with self._lock:
+            adopted = [i for i in self._adopted if i.returncode is None]
+        for i in procs:
+            i.cancelled = True
+            SignalGroup(i.popen)
+        for i in adopted:
+            SignalGroup(i)
+
+        for i in procs:
+            if not i.Wait(self.GRACE):
+                SignalGroup(i.popen, True)
+                i.Wait()
+        for i in adopted:
+            try:
+                i.wait(self.GRACE)
+            except subprocess.TimeoutExpired:
+                SignalGroup(i, True)
+                i.wait()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+import subprocess
+
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def MaxRSS(rusage) -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if rusage is None:
+        return 0
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+def SelfUsage():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF)
+
+def WaitProcess(proc : subprocess.Popen):
+    """Reaps proc and returns its resource usage, None where wait4 is unavailable."""
+    if hasattr(os, 'wait4') and proc.returncode is None:
+        try:
+            status, rusage = os.wait4(proc.pid, 0)[1:]
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return rusage
+        except ChildProcessError:
+            pass
+    proc.wait()
+    return None
+
+class Profiler():
+    """Records wall time, CPU time and peak RSS of PLDude's own phases and of
+    every tool process, and writes them as a Chrome trace-event file."""
+
+    def __init__(self):
+        self.events = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # matrix builds ship their configuration to pool workers
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state : dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def Record(self, name : str, category : str, start : float, end : float, cpu : Optional[float], maxrss : Optional[int], tid : int, args : dict = {}):
+        event = {
+            'name': name,
+            'cat': category,
+            'start': start - self._origin,
+            'wall': end - start,
+            'cpu': cpu,
+            'maxrss': maxrss,
+            'tid': tid
+        }
+        event.update(args)
+        with self._lock:
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def Phase(self, name : str, category : str = 'pldude'):
+        start = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.Record(name, category, start, time.perf_counter(), time.process_time() - cpu, MaxRSS(SelfUsage()), threading.get_ident())
+
+    def RecordProcess(self, name : str, start : float, proc : subprocess.Popen, rusage):
+        cpu = 0.0
+        if rusage is not None:
+            cpu = rusage.ru_utime + rusage.ru_stime
+        self.Record(name, 'tool', start, time.perf_counter(), cpu, MaxRSS(rusage), proc.pid, {'returncode': proc.returncode})
+
+    def WriteTrace(self, path : str):
+        pid = os.getpid()
+        trace = []
+        for i in self.events:
+            args = dict([(x, y) for x, y in i.items() if not x in ('name', 'cat', 'start', 'wall', 'tid')])
+            trace.append({
+                'name': i['name'],
+                'cat': i['cat'],
+                'ph': 'X',
+                'ts': int(i['start'] * 1e6),
+                'dur': int(i['wall'] * 1e6),
+                'pid': pid,
+                'tid': i['tid'],
+                'args': args
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+    def Summary(self) -> list:
+        width = max([len(i['name']) for i in self.events] + [5])
+        lines = ['Phase'.ljust(width) + '       Wall        CPU   Peak RSS']
+        for i in sorted(self.events, key=lambda x: x['start']):
+            # commands sent to a running session only have a wall time
+            cpu = '%9.3fs' % i['cpu'] if i['cpu'] is not None else '-'.rjust(10)
+            rss = '%6d MB' % (i['maxrss'] // 1024) if i['maxrss'] is not None else '-'.rjust(9)
+            lines.append(i['name'].ljust(width) + '  %8.3fs ' % i['wall'] + cpu + '  ' + rss)
+        return lines
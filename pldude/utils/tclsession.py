@@ -0,0 +1,73 @@
+import re
+import time
+import subprocess
+
+from typing import Iterator
+from pldude.utils.error import PLDudeError
+from pldude.utils.profile import WaitProcess
+from pldude.utils.procman import GroupArgs
+
+class TclSession():
+    """A long-lived tool process driven over stdin/stdout.
+
+    Every command is wrapped in a catch and followed by a PLDUDE:END sentinel
+    carrying a sequence number and the catch result, output is handed back line
+    by line until the matching sentinel is seen.
+    """
+
+    SENTINEL = re.compile(b'PLDUDE:END ([0-9]+) ([0-9]+)')
+    ERROR = re.compile(b'PLDUDE:ERROR (.*)')
+
+    def __init__(self, args : list, cwd : str, prompt : bytes = b'', env : dict = None):
+        self._prompt = prompt
+        self._count = 0
+        self.status = 0
+        self.error = ''
+        self.start = time.perf_counter()
+        self.proc = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.PIPE,
+            **GroupArgs()
+        )
+
+    def Execute(self, command : str) -> Iterator[bytes]:
+        self._count += 1
+        self.status = 0
+        self.error = ''
+        self.proc.stdin.write((
+            'set pldude_rc [catch {' + command + '} pldude_err]\n'
+            'if {$pldude_rc} { puts "PLDUDE:ERROR $pldude_err" }\n'
+            'puts "PLDUDE:END ' + str(self._count) + ' $pldude_rc"\n'
+        ).encode())
+        self.proc.stdin.flush()
+
+        for line in self.proc.stdout:
+            # interactive prompts are not newline terminated and prefix the next line
+            while self._prompt and line.startswith(self._prompt):
+                line = line[len(self._prompt):]
+            sentinel = self.SENTINEL.search(line)
+            if sentinel and int(sentinel.group(1)) == self._count:
+                self.status = int(sentinel.group(2))
+                return
+            error = self.ERROR.match(line)
+            if error:
+                self.error = error.group(1).decode(errors='replace').strip()
+                continue
+            yield line
+
+        raise PLDudeError('Tool session exited unexpectedly', 2)
+
+    def Close(self):
+        # returns the resource usage of the whole session where available
+        if self.proc.returncode is not None:
+            return None
+        try:
+            self.proc.stdin.write(b'exit\n')
+            self.proc.stdin.close()
+        except OSError:
+            self.proc.kill()
+        return WaitProcess(self.proc)
@@ -0,0 +1,54 @@
+import os
+import json
+import time
+
+from typing import Optional
+
+class TopologyCache():
+    """Remembers the JTAG target and device picked for a programming remote.
+
+    Entries expire after ttl seconds, so a board that was unplugged or swapped
+    is rescanned soon after, while repeated programming of the same board skips
+    both the chain scan and the selection prompt.
+    """
+
+    def __init__(self, path : str, ttl : float):
+        self.path = path
+        self.ttl = ttl
+
+    def Load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if type(data) == dict else {}
+
+    def Save(self, data : dict):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def Get(self, remote : str) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        entry = self.Load().get(remote, None)
+        if entry is None or time.time() - entry.get('time', 0) > self.ttl:
+            return None
+        return entry
+
+    def Put(self, remote : str, entry : dict):
+        if self.ttl <= 0:
+            return
+        data = self.Load()
+        entry = dict(entry)
+        entry['time'] = time.time()
+        data[remote] = entry
+        self.Save(data)
+
+    def Invalidate(self, remote : str):
+        data = self.Load()
+        if remote in data:
+            del data[remote]
+            self.Save(data)
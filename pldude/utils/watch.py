@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from typing import Optional, Set
+
+class PollingWatcher():
+    """Portable fallback, compares a stat() snapshot of the watched trees."""
+
+    def __init__(self, dirs : list, files : list, extensions : tuple, prune : list = [], interval : float = 0.5):
+        self._dirs = [os.path.abspath(i) for i in dirs]
+        self._files = set([os.path.abspath(i) for i in files])
+        self._extensions = tuple(extensions)
+        self._prune = set([os.path.abspath(i) for i in prune])
+        self._interval = interval
+        self._snapshot = self.Snapshot()
+
+    def Relevant(self, path : str) -> bool:
+        return path in self._files or os.path.splitext(path)[1] in self._extensions
+
+    def Snapshot(self) -> dict:
+        snapshot = {}
+        for i in self._files:
+            try:
+                st = os.stat(i)
+                snapshot[i] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+
+        stack = list(self._dirs)
+        seen = set()
+        while stack:
+            directory = stack.pop()
+            if directory in seen:
+                continue
+            seen.add(directory)
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for i in entries:
+                    if i.is_dir():
+                        if not i.name in ('.git', '.svn', '.hg') and not i.path in self._prune:
+                            stack.append(i.path)
+                    elif self.Relevant(i.path):
+                        try:
+                            st = i.stat()
+                            snapshot[i.path] = (st.st_mtime_ns, st.st_size)
+                        except OSError:
+                            pass
+        return snapshot
+
+    def Wait(self, timeout : Optional[float]) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.Snapshot()
+            changed = set([i for i in snapshot if snapshot[i] != self._snapshot.get(i)])
+            changed |= set([i for i in self._snapshot if not i in snapshot])
+            self._snapshot = snapshot
+            if changed:
+                return changed
+
+            wait = self._interval
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return set()
+            time.sleep(wait)
+
+    def Close(self):
+        pass
+
+class InotifyWatcher(PollingWatcher):
+    """Linux inotify through libc, every directory of the watched trees gets a
+    watch and directories created later are added as they appear."""
+
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, dirs : list, files : list, extensions : tuple, prune : list = []):
+        self._dirs = [os.path.abspath(i) for i in dirs]
+        self._files = set([os.path.abspath(i) for i in files])
+        self._extensions = tuple(extensions)
+        self._prune = set([os.path.abspath(i) for i in prune])
+        self._watches = {}
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        for i in self._dirs:
+            self.AddTree(i)
+        for i in set([os.path.dirname(i) for i in self._files]):
+            self.AddWatch(i)
+
+    def AddWatch(self, directory : str):
+        if directory in self._watches.values():
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+
+    def AddTree(self, root : str):
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            self.AddWatch(directory)
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for i in entries:
+                    if i.is_dir(follow_symlinks=False) and not i.name in ('.git', '.svn', '.hg') and not i.path in self._prune:
+                        stack.append(i.path)
+
+    def Wait(self, timeout : Optional[float]) -> Set[str]:
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+                name = data[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b'\0')
+                offset += self.EVENT.size + length
+
+                if mask & self.IN_Q_OVERFLOW:
+                    changed.update(self._dirs)
+                    continue
+
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not path in self._prune:
+                        self.AddTree(path)
+                        changed.add(path)
+                elif self.Relevant(path):
+                    changed.add(path)
+
+        return changed
+
+    def Close(self):
+        os.close(self._fd)
+
+def CreateWatcher(dirs : list, files : list, extensions : tuple, prune : list = []) -> PollingWatcher:
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(dirs, files, extensions, prune)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(dirs, files, extensions, prune)
+
+def Debounce(watcher : PollingWatcher, quiet : float) -> Set[str]:
+    # collect the rest of a burst of saves until nothing changed for 'quiet' seconds
+    changed = set()
+    while True:
+        more = watcher.Wait(quiet)
+        if not more:
+            return changed
+        changed |= more
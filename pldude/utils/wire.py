@@ -0,0 +1,100 @@
+import json
+import socket
+import struct
+import threading
+
+from typing import Optional, Tuple
+from pldude.utils.error import PLDudeError
+
+# header length, payload length
+FRAME = struct.Struct('>II')
+
+PORT = 7878
+
+# marks the log lines of a worker job's PLDude, followed by the logging level
+WIRE_MARK = '\x1e'
+
+class Connection():
+    """Framed messages between the farm client and a build worker.
+
+    Every frame is a JSON header followed by an optional binary payload, both
+    length prefixed. Sending is serialized so several threads can share one
+    connection, receiving is left to a single reader.
+    """
+
+    VERSION = 1
+    MAX_HEADER = 64 * 1024 * 1024
+    MAX_PAYLOAD = 1024 * 1024 * 1024
+
+    def __init__(self, sock : socket.socket):
+        self.sock = sock
+        self._lock = threading.Lock()
+        self._file = sock.makefile('rb')
+
+    @staticmethod
+    def Connect(address : str, timeout : float = None) -> 'Connection':
+        host, port = ParseAddress(address)
+        sock = socket.create_connection((host, port), timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return Connection(sock)
+
+    def Send(self, kind : str, payload : bytes = b'', **fields):
+        fields['type'] = kind
+        header = json.dumps(fields, separators=(',', ':')).encode()
+        with self._lock:
+            self.sock.sendall(FRAME.pack(len(header), len(payload)) + header + payload)
+
+    def Receive(self) -> Tuple[Optional[dict], bytes]:
+        """The next header and payload, (None, b'') once the peer closed the connection."""
+        prefix = self._file.read(FRAME.size)
+        if len(prefix) < FRAME.size:
+            return None, b''
+        size, length = FRAME.unpack(prefix)
+        if size > self.MAX_HEADER or length > self.MAX_PAYLOAD:
+            raise PLDudeError('Malformed frame from ' + self.Peer(), 2)
+        header = self._file.read(size)
+        payload = self._file.read(length) if length else b''
+        if len(header) < size or len(payload) < length:
+            return None, b''
+        try:
+            header = json.loads(header)
+        except ValueError:
+            raise PLDudeError('Malformed frame from ' + self.Peer(), 2)
+        if type(header) != dict or not 'type' in header:
+            raise PLDudeError('Malformed frame from ' + self.Peer(), 2)
+        return header, payload
+
+    def Expect(self, *kinds : str) -> Tuple[dict, bytes]:
+        header, payload = self.Receive()
+        if header is None:
+            raise PLDudeError('Connection to ' + self.Peer() + ' closed', 2)
+        if header['type'] == 'error':
+            raise PLDudeError(self.Peer() + ': ' + str(header.get('reason', 'unknown error')), 2)
+        if not header['type'] in kinds:
+            raise PLDudeError('Unexpected ' + str(header['type']) + ' from ' + self.Peer(), 2)
+        return header, payload
+
+    def Peer(self) -> str:
+        try:
+            host, port = self.sock.getpeername()[:2]
+            return host + ':' + str(port)
+        except OSError:
+            return 'peer'
+
+    def Close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._file.close()
+        self.sock.close()
+
+def ParseAddress(address : str, port : int = PORT) -> Tuple[str, int]:
+    host, sep, rest = address.rpartition(':')
+    if not sep:
+        return address, port
+    try:
+        return host.strip('[]') or '127.0.0.1', int(rest)
+    except ValueError:
+        raise PLDudeError('Invalid worker address: ' + address, 2)
@@ -0,0 +1,377 @@
+import os
+import re
+import sys
+import json
+import hmac
+import time
+import zlib
+import socket
+import hashlib
+import logging
+import threading
+import socketserver
+
+from typing import Dict, List
+from pldude.utils.error import PLDudeError
+from pldude.utils.wire import Connection, ParseAddress, WIRE_MARK
+from pldude.utils.artifacts import Materialize
+from pldude.utils.procman import ProcessManager
+
+def SafePath(path : str) -> bool:
+    # project relative, never above the workspace
+    if not path or os.path.isabs(path) or '\\' in path:
+        return False
+    parts = path.split('/')
+    return not '..' in parts and parts[0] != ''
+
+class ObjectStore():
+    """Content-addressed copies of the files clients shipped, objects/<digest[:2]>/<digest>.
+
+    Objects are verified against their digest on arrival and made read-only, the
+    project workspaces hardlink them.
+    """
+
+    def __init__(self, root : str):
+        self.root = root
+
+    def Path(self, digest : str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def Has(self, digest : str) -> bool:
+        return os.path.exists(self.Path(digest))
+
+    def Put(self, digest : str, data : bytes):
+        if hashlib.blake2b(data, digest_size=16).hexdigest() != digest:
+            raise PLDudeError('Object ' + digest + ' does not match its digest', 2)
+        path = self.Path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.' + str(threading.get_ident()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, path)
+
+    def Collect(self, referenced : set) -> int:
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            for name in os.listdir(directory):
+                if not name in referenced:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+        return removed
+
+class WorkerJob():
+    def __init__(self, project : str, brand : str, peer : str):
+        self.project = project
+        self.brand = brand
+        self.peer = peer
+        self.cancelled = threading.Event()
+        self.proc = None
+
+class FarmWorker():
+    """Build worker serving `pldude worker`.
+
+    Clients ship the source set of a project as content-addressed objects, the
+    worker only asks for the ones it does not hold yet and keeps one workspace
+    per project, so ./gen and its fingerprints survive between submissions and
+    remote builds are incremental too. At most 'slots' jobs run at once and no
+    more of one brand than its license limit, the others wait in order.
+    """
+
+    WORKSPACE_MANIFEST = '.pldude-farm.json'
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, root : str, slots : int, licenses : Dict[str, int], logger : logging.Logger):
+        self.root = os.path.abspath(root)
+        self._slots = max(1, slots)
+        self._licenses = licenses
+        self._logging = logger
+        self._store = ObjectStore(os.path.join(self.root, 'objects'))
+        self._procman = ProcessManager()
+        self._token = os.environ.get('PLDUDE_FARM_TOKEN', '')
+        self._cond = threading.Condition()
+        self._queue : List[WorkerJob] = []
+        self._running : List[WorkerJob] = []
+        self._projects : Dict[str, threading.Lock] = {}
+
+    def Status(self) -> dict:
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            load = 0.0
+        with self._cond:
+            usage = {}
+            for i in self._running:
+                usage[i.brand] = usage.get(i.brand, 0) + 1
+            return {
+                'name': socket.gethostname(),
+                'slots': self._slots,
+                'running': len(self._running),
+                'queued': len(self._queue),
+                'licenses': self._licenses,
+                'usage': usage,
+                'load': load,
+                'cpus': os.cpu_count() or 1
+            }
+
+    def Collect(self):
+        # objects no workspace refers to any more
+        referenced = set()
+        projects = os.path.join(self.root, 'projects')
+        for name in os.listdir(projects) if os.path.isdir(projects) else []:
+            try:
+                with open(os.path.join(projects, name, self.WORKSPACE_MANIFEST), 'r') as f:
+                    referenced.update(json.load(f).values())
+            except (OSError, ValueError):
+                pass
+        removed = self._store.Collect(referenced)
+        if removed:
+            self._logging.info('Removed ' + str(removed) + ' unreferenced objects')
+
+    def Serve(self, address : str):
+        worker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                worker.Handle(Connection(self.request))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        os.makedirs(self.root, exist_ok=True)
+        self.Collect()
+        host, port = ParseAddress(address)
+        with Server((host, port), Handler) as server:
+            self._logging.info('Worker listening on ' + host + ':' + str(server.server_address[1]) + ', ' + str(self._slots) + ' slots, workspace ' + self.root)
+            try:
+                server.serve_forever()
+            finally:
+                self._procman.Terminate()
+
+    def Handle(self, conn : Connection):
+        try:
+            header, payload = conn.Expect('hello')
+            if header.get('version') != Connection.VERSION:
+                raise PLDudeError('Protocol version ' + str(header.get('version')) + ' is not supported, the worker speaks ' + str(Connection.VERSION), 2)
+            if self._token and not hmac.compare_digest(str(header.get('token', '')), self._token):
+                raise PLDudeError('Invalid farm token', 2)
+            conn.Send('status', **self.Status())
+
+            header, payload = conn.Receive()
+            if header is None or header['type'] == 'bye':
+                return
+            if header['type'] != 'submit':
+                raise PLDudeError('Unexpected ' + str(header['type']), 2)
+            self.Submit(conn, header)
+        except PLDudeError as err:
+            self._logging.warning(conn.Peer() + ': ' + err.reason)
+            try:
+                conn.Send('error', reason=err.reason)
+            except OSError:
+                pass
+        except OSError as err:
+            self._logging.warning(conn.Peer() + ': ' + str(err))
+        except (ValueError, TypeError, KeyError, AttributeError) as err:
+            self._logging.warning(conn.Peer() + ': malformed request, ' + repr(err))
+            try:
+                conn.Send('error', reason='Malformed request')
+            except OSError:
+                pass
+        finally:
+            conn.Close()
+
+    def Submit(self, conn : Connection, header : dict):
+        project = str(header.get('project', ''))
+        brand = str(header.get('brand', ''))
+        files = header.get('files', [])
+        if not re.fullmatch('[0-9a-f]{8,64}', project):
+            raise PLDudeError('Invalid project key', 2)
+        if self._licenses.get(brand, 1) <= 0:
+            raise PLDudeError('No ' + brand + ' license on this worker', 2)
+        for path, digest in files:
+            if not SafePath(path) or not re.fullmatch('[0-9a-f]{32}', digest):
+                raise PLDudeError('Invalid file entry ' + str(path), 2)
+        fetch = header.get('fetch', []) + header.get('always', [])
+        if not all([SafePath(i) for i in fetch]):
+            raise PLDudeError('Invalid output path', 2)
+
+        job = WorkerJob(project, brand, conn.Peer())
+        with self._cond:
+            # queued from here on, so the next client already sees the slot taken
+            self._queue.append(job)
+            if not header.get('wait', True) and not self.Runnable(job):
+                self._queue.remove(job)
+                conn.Send('busy', running=len(self._running), queued=len(self._queue))
+                return
+        try:
+            self.Run(conn, job, header)
+        finally:
+            self.Release(job)
+
+    def Run(self, conn : Connection, job : WorkerJob, header : dict):
+        project = job.project
+        brand = job.brand
+        files = header['files']
+        missing = sorted(set([d for p, d in files if not self._store.Has(d)]))
+        conn.Send('need', digests=missing)
+        received = 0
+        while True:
+            part, payload = conn.Expect('blob', 'sent')
+            if part['type'] == 'sent':
+                break
+            self._store.Put(str(part.get('digest', '')), zlib.decompress(payload) if part.get('zlib') else payload)
+            received += len(payload)
+        if [i for i in missing if not self._store.Has(i)]:
+            raise PLDudeError('Source objects missing after upload', 2)
+
+        self._logging.info(job.peer + ': ' + brand + ' job for project ' + project + ', ' + str(len(files)) + ' files, ' + str(len(missing)) + ' shipped (' + str(received // 1024) + ' KB)')
+
+        # the client only speaks again to cancel, or by hanging up
+        def Watch():
+            try:
+                while True:
+                    part = conn.Receive()[0]
+                    if part is None or part['type'] == 'cancel':
+                        break
+            except (OSError, ValueError, PLDudeError):
+                pass
+            job.cancelled.set()
+            with self._cond:
+                self._cond.notify_all()
+            if job.proc is not None and not job.proc.done.is_set():
+                self._procman.Cancel(job.proc)
+        threading.Thread(target=Watch, daemon=True).start()
+
+        self.Acquire(conn, job)
+        start = time.monotonic()
+        workspace = os.path.join(self.root, 'projects', project)
+        with self._cond:
+            lock = self._projects.setdefault(project, threading.Lock())
+        with lock:
+            self.Sync(workspace, files)
+        code = self.Execute(conn, job, workspace, header)
+        if job.cancelled.is_set():
+            self._logging.info(job.peer + ': job cancelled')
+            return
+        self.SendOutputs(conn, workspace, (header.get('fetch', []) if code == 0 else []) + header.get('always', []))
+        conn.Send('done', code=code, elapsed=time.monotonic() - start)
+        self._logging.info(job.peer + ': job finished with ' + str(code) + ' after %.1fs' % (time.monotonic() - start))
+
+    def Runnable(self, job : WorkerJob) -> bool:
+        # the jobs queued ahead get the free slots first
+        if len(self._running) + self._queue.index(job) >= self._slots:
+            return False
+        limit = self._licenses.get(job.brand, None)
+        if limit is not None and len([i for i in self._running if i.brand == job.brand]) >= limit:
+            return False
+        # jobs of one brand start in the order they arrived
+        return [i for i in self._queue if i.brand == job.brand][0] is job
+
+    def Acquire(self, conn : Connection, job : WorkerJob):
+        with self._cond:
+            announced = False
+            while not self.Runnable(job):
+                if job.cancelled.is_set():
+                    self._queue.remove(job)
+                    self._cond.notify_all()
+                    raise PLDudeError('Cancelled while queued', 0, logging.INFO)
+                if not announced:
+                    conn.Send('queued', position=self._queue.index(job), running=len(self._running))
+                    announced = True
+                self._cond.wait()
+            self._queue.remove(job)
+            self._running.append(job)
+
+    def Release(self, job : WorkerJob):
+        with self._cond:
+            if job in self._running:
+                self._running.remove(job)
+            if job in self._queue:
+                self._queue.remove(job)
+            self._cond.notify_all()
+
+    def Sync(self, workspace : str, files : list):
+        manifest_path = os.path.join(workspace, self.WORKSPACE_MANIFEST)
+        try:
+            with open(manifest_path, 'r') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+
+        current = dict([(p, d) for p, d in files])
+        for path in previous:
+            if not path in current:
+                try:
+                    os.remove(os.path.join(workspace, path))
+                except OSError:
+                    pass
+        for path, digest in files:
+            target = os.path.join(workspace, path)
+            if previous.get(path) == digest and os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            Materialize(self._store.Path(digest), target)
+
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(current, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def Execute(self, conn : Connection, job : WorkerJob, workspace : str, header : dict) -> int:
+        # the command line is built here, a client never passes raw arguments
+        verbosity = str(header.get('verbosity', 'INFO'))
+        if not verbosity in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+            verbosity = 'INFO'
+        args = [sys.executable, '-m', 'pldude', '-v', verbosity]
+        if header.get('compile'):
+            args.append('-c')
+        if header.get('simulate_all') is not None:
+            args += ['-S', str(header['simulate_all'])]
+        if header.get('device'):
+            args += ['-d', str(header['device'])]
+
+        env = dict(os.environ, PLDUDE_WORKER_JOB='1')
+        job.proc = self._procman.Start(args, workspace, env=env)
+        if job.cancelled.is_set():
+            self._procman.Cancel(job.proc)
+        try:
+            for line in job.proc:
+                text = line.decode(errors='replace').rstrip('\r\n')
+                level = logging.INFO
+                if text.startswith(WIRE_MARK):
+                    level, _, text = text[1:].partition(' ')
+                    level = int(level) if level.isdigit() else logging.INFO
+                conn.Send('log', level=level, text=text)
+        except OSError:
+            # the client is gone, its build goes with it
+            job.cancelled.set()
+            self._procman.Cancel(job.proc)
+            for line in job.proc:
+                pass
+        job.proc.Wait()
+        return job.proc.returncode
+
+    def SendOutputs(self, conn : Connection, workspace : str, paths : list):
+        files = []
+        for path in paths:
+            full = os.path.join(workspace, path)
+            if os.path.isfile(full):
+                files.append(path)
+            elif os.path.isdir(full):
+                for root, dirs, names in os.walk(full):
+                    for name in sorted(names):
+                        files.append(os.path.relpath(os.path.join(root, name), workspace).replace(os.sep, '/'))
+
+        for path in files:
+            with open(os.path.join(workspace, path), 'rb') as f:
+                offset = 0
+                while True:
+                    chunk = f.read(self.CHUNK_SIZE)
+                    last = len(chunk) < self.CHUNK_SIZE
+                    conn.Send('artifact', zlib.compress(chunk, 1), path=path, offset=offset, last=last, zlib=True)
+                    offset += len(chunk)
+                    if last:
+                        break
@@ -9,6 +9,10 @@ setuptools.setup(
     entry_points={
         'console_scripts':[
             'pldude=pldude.__main__:main'
+        ],
+        'pldude.backends':[
+            'Xilinx7=pldude.bconfigs.xilinx7:Xilinx7',
+            'Altera=pldude.bconfigs.altera:Altera'
         ]
     }
 )
\ No newline at end of file
@@ -0,0 +1,85 @@
+import os
+import threading
+
+import pytest
+
+from pldude.utils import artifacts
+from pldude.utils.artifacts import ArtifactCache, Materialize
+
+def Write(path, content : bytes = b'bitstream'):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+def Leftovers(directory) -> list:
+    return [i for i in os.listdir(directory) if i.endswith('.tmp')]
+
+def test_materialize_twice_leaves_no_tmp(tmp_path):
+    src = Write(tmp_path / 'entry.bit')
+    dst = str(tmp_path / 'project.bit')
+    Materialize(src, dst)
+    Materialize(src, dst)
+    assert Leftovers(tmp_path) == []
+    assert os.path.samefile(src, dst)
+
+def test_materialize_replaces_other_file(tmp_path):
+    src = Write(tmp_path / 'entry.bit', b'new')
+    dst = Write(tmp_path / 'project.bit', b'old')
+    Materialize(src, dst)
+    with open(dst, 'rb') as f:
+        assert f.read() == b'new'
+    assert Leftovers(tmp_path) == []
+
+def test_fetch_twice_leaves_no_tmp(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), 1 << 20)
+    gen = tmp_path / 'gen'
+    gen.mkdir()
+    source = Write(gen / 'project.bit')
+    assert cache.Store('k', {'project.bit': source})
+
+    target = str(tmp_path / 'checkout' / 'project.bit')
+    assert cache.Fetch('k', {'project.bit': target})
+    assert cache.Fetch('k', {'project.bit': target})
+    assert Leftovers(tmp_path / 'checkout') == []
+
+def test_fetch_miss_and_missing_names(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), 1 << 20)
+    assert cache.Fetch('absent', {'project.bit': str(tmp_path / 'x')}) is None
+    cache.Store('k', {'project.bit': Write(tmp_path / 'project.bit'), 'post_par.dcp': str(tmp_path / 'missing.dcp')})
+    placed = cache.Fetch('k', {'project.bit': str(tmp_path / 'a.bit'), 'post_par.dcp': str(tmp_path / 'a.dcp')})
+    assert [i.split(' ')[0] for i in placed] == ['project.bit']
+
+def test_store_keeps_first_writer(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), 1 << 20)
+    assert cache.Store('k', {'project.bit': Write(tmp_path / 'a', b'first')})
+    assert not cache.Store('k', {'project.bit': Write(tmp_path / 'b', b'second')})
+    cache.Fetch('k', {'project.bit': str(tmp_path / 'out')})
+    with open(tmp_path / 'out', 'rb') as f:
+        assert f.read() == b'first'
+
+def test_evict_least_recently_used(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), 250)
+    cache.Store('old', {'f': Write(tmp_path / 'a', b'a' * 100)})
+    os.utime(cache.EntryDir('old'), (1, 1))
+    cache.Store('new', {'f': Write(tmp_path / 'b', b'b' * 100)})
+    cache.Store('newest', {'f': Write(tmp_path / 'c', b'c' * 100)})
+    assert cache.Lookup('old') is None
+    assert cache.Lookup('new') is not None
+    assert cache.Lookup('newest') is not None
+
+@pytest.mark.skipif(artifacts.fcntl is None, reason='Claim needs fcntl')
+def test_claim_waits_for_holder(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), 1 << 20)
+    waited = []
+    order = []
+    with cache.Claim('k'):
+        def Other():
+            with cache.Claim('k', lambda: waited.append(True)):
+                order.append('other')
+        thread = threading.Thread(target=Other)
+        thread.start()
+        thread.join(0.2)
+        order.append('holder')
+    thread.join()
+    assert waited == [True]
+    assert order == ['holder', 'other']
@@ -0,0 +1,83 @@
+import os
+import time
+
+from pldude.utils import discovery
+from pldude.utils.discovery import ExcludeRules, SourceWalker
+
+EXTENSIONS = ('.vhd', '.v')
+
+def Age(*directories):
+    mtime = time.time_ns() - 60 * 1000 * 1000 * 1000
+    for i in directories:
+        os.utime(i, ns=(mtime, mtime))
+
+def Tree(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'sub').mkdir(parents=True)
+    (src / 'top.vhd').write_text('')
+    (src / 'notes.txt').write_text('')
+    (src / 'sub' / 'mod.v').write_text('')
+    Age(src, src / 'sub')
+    return src
+
+def Walk(tmp_path, src, **args) -> list:
+    walker = SourceWalker(str(tmp_path / 'discovery.bin'), EXTENSIONS, **args)
+    walker.Load()
+    found = walker.Walk(str(src))
+    walker.Save()
+    return sorted([os.path.relpath(i, src) for i in found])
+
+def CountScans(monkeypatch) -> list:
+    scanned = []
+    original = os.scandir
+    def Counting(path):
+        scanned.append(os.path.basename(path))
+        return original(path)
+    monkeypatch.setattr(discovery.os, 'scandir', Counting)
+    return scanned
+
+def test_unchanged_directories_are_not_listed_again(tmp_path, monkeypatch):
+    src = Tree(tmp_path)
+    assert Walk(tmp_path, src) == ['sub/mod.v', 'top.vhd']
+    scanned = CountScans(monkeypatch)
+    assert Walk(tmp_path, src) == ['sub/mod.v', 'top.vhd']
+    assert scanned == []
+
+def test_new_file_bumps_the_directory(tmp_path, monkeypatch):
+    src = Tree(tmp_path)
+    Walk(tmp_path, src)
+    (src / 'sub' / 'new.vhd').write_text('')
+    scanned = CountScans(monkeypatch)
+    assert Walk(tmp_path, src) == ['sub/mod.v', 'sub/new.vhd', 'top.vhd']
+    assert scanned == ['sub']
+
+def test_racy_directory_is_listed_again(tmp_path, monkeypatch):
+    src = Tree(tmp_path)
+    # modified just now, a second change within the same mtime tick would go unseen
+    os.utime(src / 'sub')
+    Walk(tmp_path, src)
+    scanned = CountScans(monkeypatch)
+    Walk(tmp_path, src)
+    assert scanned == ['sub']
+
+def test_symlink_loop_is_walked_once(tmp_path):
+    src = Tree(tmp_path)
+    os.symlink(str(src), str(src / 'sub' / 'loop'))
+    assert Walk(tmp_path, src) == ['sub/mod.v', 'top.vhd']
+
+def test_excluded_and_pruned_directories(tmp_path):
+    src = Tree(tmp_path)
+    (src / 'gen').mkdir()
+    (src / 'gen' / 'out.vhd').write_text('')
+    assert Walk(tmp_path, src, exclude=['sub/'], prune=[str(src / 'gen')]) == ['top.vhd']
+
+def test_exclude_rules():
+    rules = ExcludeRules(['tb/', '*_old.vhd', '!keep_old.vhd', '/root.v', 'a/**/b.v'])
+    assert rules.Match('tb', True)
+    assert not rules.Match('tb', False)
+    assert rules.Match('x/y_old.vhd', False)
+    assert not rules.Match('x/keep_old.vhd', False)
+    assert rules.Match('root.v', False)
+    assert not rules.Match('x/root.v', False)
+    assert rules.Match('a/x/y/b.v', False)
+    assert rules.Match('a/b.v', False)
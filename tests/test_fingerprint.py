@@ -0,0 +1,75 @@
+import os
+import time
+
+from pldude.utils import fingerprint
+from pldude.utils.fingerprint import FingerprintStore
+
+def Write(path, content : str, age : float = 0):
+    with open(path, 'w') as f:
+        f.write(content)
+    if age:
+        mtime = time.time_ns() - int(age * 1e9)
+        os.utime(path, ns=(mtime, mtime))
+    return str(path)
+
+def Reload(tmp_path) -> FingerprintStore:
+    store = FingerprintStore(str(tmp_path / 'fingerprint.bin'))
+    store.Load()
+    return store
+
+def CountHashes(monkeypatch) -> list:
+    calls = []
+    original = fingerprint.HashFile
+    def Counting(path):
+        calls.append(path)
+        return original(path)
+    monkeypatch.setattr(fingerprint, 'HashFile', Counting)
+    return calls
+
+def test_stat_fast_path_skips_hashing(tmp_path, monkeypatch):
+    path = Write(tmp_path / 'a.vhd', 'entity a', age=60)
+    store = Reload(tmp_path)
+    store.CommitStage('synth', b'digest', [path])
+    expected = fingerprint.HashFile(path)
+
+    calls = CountHashes(monkeypatch)
+    store = Reload(tmp_path)
+    assert store.StageDigest('synth') == b'digest'
+    assert store.Digest(path) == expected
+    assert calls == []
+
+def test_racy_file_is_hashed_again(tmp_path, monkeypatch):
+    path = Write(tmp_path / 'a.vhd', 'aaaa')
+    st = os.stat(path)
+    store = Reload(tmp_path)
+    store.CommitStage('synth', b'digest', [path])
+    first = store.Digest(path)
+
+    # same size and mtime, different content: only the racy marker catches it
+    Write(path, 'bbbb')
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    calls = CountHashes(monkeypatch)
+    store = Reload(tmp_path)
+    assert store.Digest(path) != first
+    assert calls == [path]
+
+def test_touch_refreshes_fast_path(tmp_path):
+    path = Write(tmp_path / 'a.vhd', 'entity a', age=60)
+    store = Reload(tmp_path)
+    store.CommitStage('synth', b'digest', [path])
+    digest = store.Digest(path)
+
+    Write(path, 'entity a', age=30)
+    store = Reload(tmp_path)
+    assert store.Digest(path) == digest
+    assert store.IsDirty()
+
+def test_missing_file_has_no_digest(tmp_path):
+    assert Reload(tmp_path).Digest(str(tmp_path / 'missing.vhd')) is None
+
+def test_other_version_is_ignored(tmp_path):
+    store = Reload(tmp_path)
+    store.CommitStage('synth', b'digest', [])
+    store.VERSION = FingerprintStore.VERSION + 1
+    store.Save()
+    assert Reload(tmp_path).StageDigest('synth') is None
@@ -0,0 +1,86 @@
+from pldude.utils.fingerprint import HashFile
+from pldude.utils.hdlindex import HdlIndex
+
+def Entity(name : str, *children : str) -> str:
+    body = 'entity ' + name + ' is\n    port (clk : in std_logic);\nend entity;\n\n'
+    body += 'architecture rtl of ' + name + ' is\nbegin\n'
+    for n, child in enumerate(children):
+        body += '    u' + str(n) + ' : entity work.' + child + ' port map (clk => clk);\n'
+    return body + 'end architecture;\n'
+
+def Tree(tmp_path, files : dict) -> tuple:
+    paths = []
+    for name, content in files.items():
+        path = tmp_path / name
+        path.write_text(content)
+        paths.append(str(path))
+    index = HdlIndex(str(tmp_path / 'hdlindex.bin'), HashFile)
+    return index, paths
+
+def Names(paths : list) -> list:
+    return [i.rsplit('/', 1)[-1] for i in paths]
+
+def test_closure_prunes_unreachable_files(tmp_path):
+    index, paths = Tree(tmp_path, {
+        'top.vhd': Entity('top', 'mid'),
+        'mid.vhd': Entity('mid', 'leaf'),
+        'leaf.vhd': Entity('leaf'),
+        'unused.vhd': Entity('unused', 'leaf')
+    })
+    assert Names(index.Closure('top', paths)) == ['leaf.vhd', 'mid.vhd', 'top.vhd']
+    assert Names(index.Closure('mid', paths)) == ['leaf.vhd', 'mid.vhd']
+
+def test_closure_follows_packages_and_split_architectures(tmp_path):
+    index, paths = Tree(tmp_path, {
+        'top_rtl.vhd': 'use work.types.all;\n' + Entity('top', 'child').split('\n\n', 1)[1],
+        'top.vhd': 'entity top is\nend entity;\n',
+        'types.vhd': 'package types is\nend package;\n',
+        'child.vhd': Entity('child')
+    })
+    order = Names(index.Closure('TOP', paths))
+    assert sorted(order) == ['child.vhd', 'top.vhd', 'top_rtl.vhd', 'types.vhd']
+    assert order.index('types.vhd') < order.index('top_rtl.vhd')
+    assert order.index('child.vhd') < order.index('top_rtl.vhd')
+
+def test_closure_of_undeclared_top(tmp_path):
+    index, paths = Tree(tmp_path, {'a.vhd': Entity('a')})
+    assert index.Closure('missing', paths) is None
+
+def test_verilog_instances_and_comments(tmp_path):
+    index, paths = Tree(tmp_path, {
+        'top.v': 'module Top(input clk);\n  UartTx #(.W(8)) tx (.clk(clk));\n  // Unused u (.clk(clk));\nendmodule\n',
+        'uart.v': 'module UartTx(input clk);\nendmodule\n',
+        'unused.v': 'module Unused(input clk);\nendmodule\n'
+    })
+    assert Names(index.Closure('Top', paths)) == ['uart.v', 'top.v']
+
+def test_index_is_reused_until_content_changes(tmp_path):
+    index, paths = Tree(tmp_path, {'a.vhd': Entity('a', 'b'), 'b.vhd': Entity('b')})
+    index.Closure('a', paths)
+    index.Save()
+
+    index = HdlIndex(str(tmp_path / 'hdlindex.bin'), HashFile)
+    index.Load()
+    assert index.Get(paths[0])[2] == set(['b'])
+    (tmp_path / 'a.vhd').write_text(Entity('a'))
+    assert index.Get(paths[0])[2] == set()
+
+def test_children_and_provider_keep_declared_spelling(tmp_path):
+    index, paths = Tree(tmp_path, {
+        'top.v': 'module Top(input clk);\n  UartTx tx (.clk(clk));\n  Fifo f (.clk(clk));\nendmodule\n',
+        'uart.v': 'module UartTx(input clk);\n  Fifo f (.clk(clk));\nendmodule\n',
+        'fifo.v': 'module Fifo(input clk);\nendmodule\n'
+    })
+    assert index.Children('top', paths) == ['Fifo', 'UartTx']
+    assert index.Provider('uarttx', paths) == (paths[1], 'UartTx')
+    assert index.Provider('missing', paths) is None
+
+def test_closure_stops_at_leaves(tmp_path):
+    index, paths = Tree(tmp_path, {
+        'top.vhd': Entity('top', 'block', 'shared'),
+        'block.vhd': Entity('block', 'inner'),
+        'inner.vhd': Entity('inner'),
+        'shared.vhd': Entity('shared')
+    })
+    # out-of-context blocks are linked in as checkpoints, their sources are not followed
+    assert sorted(Names(index.Closure('top', paths, set(['Block'])))) == ['shared.vhd', 'top.vhd']
@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from pldude.utils.logarchive import LogArchive, Pack, Unpack
+from pldude.utils.logparse import LogMessage
+
+def Message(id : str, text : str, severity : str = 'WARNING', ignored : bool = False) -> LogMessage:
+    return LogMessage(severity, id, text, logging.WARNING, False, ignored)
+
+def Build(archive : LogArchive, messages : dict, status : str = 'ok') -> int:
+    writer = archive.Open({'device': 'xc7a35t'})
+    for stage, batch in messages.items():
+        writer.Extend(stage, batch)
+    writer.Close(status)
+    return archive.Builds()[-1]
+
+def test_pack_round_trip():
+    columns = (['synth', 'par'], ['WARNING', 'ERROR'], ['Synth 8-3331', ''], ['first', 'second\nline'], [False, True])
+    records = list(Unpack(Pack(columns), 2))
+    assert records == [('synth', 'WARNING', 'Synth 8-3331', 'first', False), ('par', 'ERROR', '', 'second line', True)]
+
+def test_query_round_trip_across_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogArchive, 'BLOCK', 3)
+    archive = LogArchive(str(tmp_path))
+    build = Build(archive, {
+        'synth': [Message('Synth 8-3331', 'unconnected port ' + str(i)) for i in range(5)],
+        'par': [Message('Place 30-58', 'infeasible', 'ERROR'), Message('Route 35-39', 'skipped', ignored=True)]
+    })
+
+    index = archive.Index(build)
+    assert index['records'] == 7
+    assert index['ignored'] == 1
+    # a batch is flushed whole once the block is full
+    assert [i[2] for i in index['blocks']] == [5, 2]
+    assert index['stages']['par']['blocks'] == [1]
+    assert index['ids']['Synth 8-3331']['count'] == 5
+
+    assert [i[3] for i in archive.Query(build, stages=['par'])] == ['infeasible']
+    assert len(list(archive.Query(build, stages=['par'], ignored=True))) == 2
+    assert [i[3] for i in archive.Query(build, pattern='port [34]')] == ['unconnected port 3', 'unconnected port 4']
+    assert [i[2] for i in archive.Query(build, severities=['error'])] == ['Place 30-58']
+
+def test_diff_history_and_prune(tmp_path):
+    archive = LogArchive(str(tmp_path), history=2)
+    Build(archive, {'synth': [Message('Synth 8-3331', 'a')]})
+    old = Build(archive, {'synth': [Message('Synth 8-3331', 'a')]})
+    new = Build(archive, {'synth': [Message('Synth 8-3331', 'a')] * 3 + [Message('Synth 8-7129', 'b')]})
+
+    assert archive.Builds() == [old, new]
+    assert archive.Resolve('prev') == old
+    assert archive.Diff(old, new) == [('Synth 8-3331', 'WARNING', 1, 3, 'a'), ('Synth 8-7129', 'WARNING', 0, 1, 'b')]
+    assert [i[2] for i in archive.History('Synth 8-7129')] == [0, 1]
+
+def test_resolve_errors(tmp_path):
+    archive = LogArchive(str(tmp_path))
+    with pytest.raises(ValueError):
+        archive.Resolve('last')
+    Build(archive, {})
+    with pytest.raises(ValueError):
+        archive.Resolve('-2')
+    with pytest.raises(ValueError):
+        archive.Query(1, pattern='(').__next__()
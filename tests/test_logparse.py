@@ -0,0 +1,48 @@
+import logging
+
+from pldude.utils.logparse import QuartusLog, VivadoLog
+
+VIVADO = [
+    b'INFO: [Synth 8-6157] synthesizing module \'top\'\n',
+    b'WARNING: [Synth 8-3331] design top has unconnected port led[3]\r\n',
+    b'ERROR: [Place 30-58] IO placement is infeasible\n',
+    b'Phase 1 Placer Initialization\n'
+]
+
+QUARTUS = [
+    b'Info: *******************************************************************\n',
+    b'Info (12021): Found 1 design units, including 1 entities, in source file top.vhd\n',
+    b'Warning (10541): VHDL Signal Declaration warning at top.vhd(12)\n',
+    b'Critical Warning (332012): Synopsys Design Constraints File file not found\n',
+    b'Error (12007): Top-level design entity "top" is undefined\n',
+    b'    Info: Peak virtual memory: 4752 megabytes\n'
+]
+
+def Levels(messages) -> list:
+    return [(i.id, i.level, i.fatal) for i in messages]
+
+def test_vivado_classification():
+    assert Levels(VivadoLog().Parse(VIVADO)) == [
+        ('Synth 8-6157', logging.DEBUG, False),
+        ('Synth 8-3331', logging.WARNING, False),
+        ('Place 30-58', logging.ERROR, True)
+    ]
+
+def test_vivado_text_without_line_end():
+    message = VivadoLog().Feed(VIVADO[1])
+    assert message.severity == 'WARNING'
+    assert message.text == 'design top has unconnected port led[3]'
+
+def test_quartus_classification():
+    assert Levels(QuartusLog().Parse(QUARTUS)) == [
+        ('12021', logging.DEBUG, False),
+        ('10541', logging.WARNING, False),
+        ('332012', logging.WARNING, False),
+        ('12007', logging.ERROR, True)
+    ]
+
+def test_ignored_warnings():
+    ignore = ['Synth 8-33\\d\\d', 'Place 30-58']
+    assert [i.id for i in VivadoLog(ignore).Parse(VIVADO)] == ['Synth 8-6157', 'Place 30-58']
+    kept = list(VivadoLog(ignore, True).Parse(VIVADO))
+    assert [i.ignored for i in kept] == [False, True, False]
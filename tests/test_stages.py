@@ -0,0 +1,100 @@
+import os
+import logging
+
+import pytest
+
+from pldude.bconfigs.stages import Stage, StageGraph, Unshare
+from pldude.utils.fingerprint import FingerprintStore
+
+def Write(path, content : str = 'x'):
+    with open(path, 'w') as f:
+        f.write(content)
+
+def Flow(tmp_path, ran : list, **volatile) -> StageGraph:
+    """synth -> par -> bit, every action writes its output and records that it ran."""
+    store = FingerprintStore(str(tmp_path / 'fingerprint.bin'))
+    store.Load()
+    graph = StageGraph(store, logging.getLogger('test'))
+    source = str(tmp_path / 'top.vhd')
+    if not os.path.exists(source):
+        Write(source)
+    previous = []
+    for name, inputs in (('synth', [source]), ('par', []), ('bit', [])):
+        output = str(tmp_path / (name + '.out'))
+        def Action(name=name, output=output):
+            ran.append(name)
+            Write(output, str(len(ran)))
+        graph.Add(Stage(name, Action, inputs=inputs, outputs=[] if volatile.get(name) else [output], deps=previous, volatile=volatile.get(name, False)))
+        previous = [name]
+    return graph
+
+def Names(plan : list) -> list:
+    return [i.name for i in plan]
+
+def test_restored_leaf_keeps_intermediates_built(tmp_path):
+    ran = []
+    Flow(tmp_path, ran).Run()
+    assert ran == ['synth', 'par', 'bit']
+
+    # a cache restore only brings back the bitstream
+    os.remove(tmp_path / 'synth.out')
+    os.remove(tmp_path / 'par.out')
+    assert Names(Flow(tmp_path, []).Plan()) == []
+
+def test_missing_leaf_pulls_missing_intermediates(tmp_path):
+    Flow(tmp_path, []).Run()
+    os.remove(tmp_path / 'par.out')
+    os.remove(tmp_path / 'bit.out')
+    assert Names(Flow(tmp_path, []).Plan()) == ['par', 'bit']
+
+def test_changed_input_reruns_dependents(tmp_path):
+    Flow(tmp_path, []).Run()
+    Write(str(tmp_path / 'top.vhd'), 'edited')
+    assert Names(Flow(tmp_path, []).Plan()) == ['synth', 'par', 'bit']
+
+def test_volatile_stages_rerun_with_their_dependents(tmp_path):
+    ran = []
+    Flow(tmp_path, ran, synth=True, par=True).Run()
+    assert ran == ['synth', 'par', 'bit']
+    assert Names(Flow(tmp_path, []).Plan()) == []
+
+    os.remove(tmp_path / 'bit.out')
+    assert Names(Flow(tmp_path, [], synth=True, par=True).Plan()) == ['synth', 'par', 'bit']
+
+def test_volatile_stage_alone_is_reused(tmp_path):
+    Flow(tmp_path, [], synth=True).Run()
+    os.remove(tmp_path / 'bit.out')
+    # par kept its checkpoint, the volatile synth is not needed to resume
+    assert Names(Flow(tmp_path, [], synth=True).Plan()) == ['bit']
+
+def test_undeclared_dependency(tmp_path):
+    graph = StageGraph(FingerprintStore(str(tmp_path / 'fingerprint.bin')), logging.getLogger('test'))
+    with pytest.raises(ValueError):
+        graph.Add(Stage('par', lambda: None, deps=['synth']))
+
+def test_unshare_breaks_links_only(tmp_path):
+    cached = tmp_path / 'entry.bit'
+    Write(str(cached), 'cached')
+    linked = str(tmp_path / 'project.bit')
+    os.link(cached, linked)
+    own = str(tmp_path / 'post_par.dcp')
+    Write(own)
+
+    Unshare([linked, own, str(tmp_path / 'missing.dcp')])
+    assert not os.path.exists(linked)
+    assert os.path.exists(own)
+    with open(cached) as f:
+        assert f.read() == 'cached'
+
+def test_execute_never_writes_through_a_link(tmp_path):
+    ran = []
+    Flow(tmp_path, ran).Run()
+    cached = str(tmp_path / 'entry.bit')
+    os.link(tmp_path / 'bit.out', cached)
+
+    Write(str(tmp_path / 'top.vhd'), 'edited')
+    Flow(tmp_path, ran).Run()
+    with open(cached) as f:
+        assert f.read() == '3'
+    with open(tmp_path / 'bit.out') as f:
+        assert f.read() == '6'
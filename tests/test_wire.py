@@ -0,0 +1,68 @@
+import socket
+import logging
+
+import pytest
+
+from pldude.bconfigs.buildconf import WireFormatter
+from pldude.utils.error import PLDudeError
+from pldude.utils.wire import Connection, FRAME, ParseAddress, WIRE_MARK
+
+@pytest.fixture
+def pair():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    left = Connection.Connect('127.0.0.1:' + str(server.getsockname()[1]))
+    right = Connection(server.accept()[0])
+    server.close()
+    yield left, right
+    left.Close()
+    right.Close()
+
+def test_frame_round_trip(pair):
+    left, right = pair
+    left.Send('submit', b'\0payload\xff', project='top', jobs=[1, 2])
+    left.Send('done')
+    header, payload = right.Receive()
+    assert header == {'type': 'submit', 'project': 'top', 'jobs': [1, 2]}
+    assert payload == b'\0payload\xff'
+    assert right.Expect('done') == ({'type': 'done'}, b'')
+
+def test_closed_connection(pair):
+    left, right = pair
+    left.sock.shutdown(socket.SHUT_WR)
+    assert right.Receive() == (None, b'')
+    with pytest.raises(PLDudeError):
+        right.Expect('done')
+
+def test_error_and_unexpected_frames(pair):
+    left, right = pair
+    left.Send('error', reason='no license')
+    left.Send('log', text='x')
+    with pytest.raises(PLDudeError, match='no license'):
+        right.Expect('done')
+    with pytest.raises(PLDudeError, match='Unexpected log'):
+        right.Expect('done')
+
+def test_malformed_frames(pair):
+    left, right = pair
+    left.sock.sendall(FRAME.pack(Connection.MAX_HEADER + 1, 0))
+    with pytest.raises(PLDudeError):
+        right.Receive()
+
+    left.sock.sendall(FRAME.pack(2, 0) + b'[]')
+    with pytest.raises(PLDudeError):
+        right.Receive()
+
+def test_parse_address():
+    assert ParseAddress('build01') == ('build01', 7878)
+    assert ParseAddress('build01:9000') == ('build01', 9000)
+    assert ParseAddress('[::1]:9000') == ('::1', 9000)
+    assert ParseAddress(':9000') == ('127.0.0.1', 9000)
+    with pytest.raises(PLDudeError):
+        ParseAddress('build01:http')
+
+def test_wire_formatter_keeps_level_per_line():
+    record = logging.LogRecord('pldude', logging.WARNING, __file__, 1, 'first\nsecond', None, None)
+    lines = WireFormatter('(dev) ').format(record).split('\n')
+    assert lines == [WIRE_MARK + '30 (dev) first', WIRE_MARK + '30 (dev) second']